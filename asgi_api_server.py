@@ -0,0 +1,501 @@
+"""
+MaBiS Time Series API - Asyncio Server (ASGI)
+
+Asyncio-Variante des Mock-Servers mit denselben Routen und demselben Speicher
+wie mock_api_server.py. Wartende Verbindungen belegen keinen Thread; die
+CPU-lastige Formelauswertung läuft in einem Executor (standardmäßig ein
+Prozess-Pool, damit Berechnungen alle Kerne nutzen), die übrigen blockierenden
+Operationen (JSON-Verarbeitung, Speicherzugriffe, Kompilieren der Formeln) im
+Thread-Pool der Ereignisschleife.
+
+Verwendung:
+    pip install uvicorn
+    python asgi_api_server.py
+    # oder: uvicorn asgi_api_server:app --port 8000
+
+    Server läuft auf: http://localhost:8000
+
+Konfiguration:
+    MABIS_CALC_EXECUTOR   process (Standard) oder thread
+    MABIS_CALC_WORKERS    Anzahl Executor-Worker (Standard: Anzahl CPU-Kerne)
+    MABIS_CALC_BACKGROUND 1 = POST /v1/calculations antwortet sofort mit PENDING
+    MABIS_CALC_LARGE_WORKERS  Worker für teure Berechnungen (Warteschlange 'large', Standard: 1)
+    MABIS_STORE_POLL_SECONDS  Abfrageintervall für Statusänderungen anderer Worker bei
+                              gemeinsamem Speicher (MABIS_STORE_ADDRESS, Standard: 0.25)
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Pattern, Set, Tuple
+from urllib.parse import parse_qs
+
+import mock_api_server as api
+
+
+def create_calculation_executor(workers: int) -> Executor:
+    """Executor for CPU-bound formula evaluation"""
+    if os.environ.get('MABIS_CALC_EXECUTOR', 'process') == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='calc')
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+# One executor per admission queue (see mock_api_server.admit_calculation), so
+# expensive calculations cannot occupy the workers of small ones
+calculation_executors = {
+    'small': create_calculation_executor(int(os.environ.get('MABIS_CALC_WORKERS', 0)) or os.cpu_count() or 1),
+    'large': create_calculation_executor(api.CALC_LARGE_WORKERS),
+}
+
+
+# Calculations finished by other workers of a shared store (MABIS_STORE_ADDRESS)
+# never notify this process; waiters check the store at this interval instead
+STORE_POLL_SECONDS = float(os.environ.get('MABIS_STORE_POLL_SECONDS', 0.25))
+
+
+def notifier_timeout(remaining: float) -> float:
+    """How long to wait for a local notification before checking the shared store"""
+    return min(remaining, STORE_POLL_SECONDS) if api.STORE_ADDRESS else remaining
+
+
+class CalculationNotifier:
+    """
+    Wakes coroutines waiting for calculation status changes
+
+    Calculations run in this process and finish on the event loop, which then
+    calls notify(). Long-polls wait on one asyncio.Event per calculation; event
+    streams wait on a shared event that is replaced at every notification and
+    then read the new events from api.calculation_events without blocking.
+    """
+
+    def __init__(self):
+        # calculation_id -> [event, number of coroutines waiting on it]
+        self._calculations: Dict[str, List[Any]] = {}
+        self._changed = asyncio.Event()
+
+    def notify(self, calculation_id: str):
+        entry = self._calculations.pop(calculation_id, None)
+        if entry is not None:
+            entry[0].set()
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_calculation(self, calculation_id: str, timeout: float) -> bool:
+        """Wait until the calculation is notified; False on timeout"""
+        entry = self._calculations.get(calculation_id)
+        if entry is None:
+            entry = self._calculations[calculation_id] = [asyncio.Event(), 0]
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            # The last waiter of a timed out or abandoned wait removes the event
+            entry[1] -= 1
+            if not entry[1] and self._calculations.get(calculation_id) is entry:
+                del self._calculations[calculation_id]
+        return True
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+calculation_notifier = CalculationNotifier()
+# Calculations evaluated after the 202 response (MABIS_CALC_BACKGROUND=1)
+background_calculations: Set[asyncio.Task] = set()
+
+
+class Request:
+    """Minimal request wrapper around an ASGI HTTP scope and its body"""
+
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {
+            name.decode('latin-1').lower(): value.decode('latin-1')
+            for name, value in scope.get('headers', [])
+        }
+        self.args = {
+            key: values[0]
+            for key, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()
+        }
+        self.body = body
+
+    @property
+    def authorization(self) -> Optional[str]:
+        return self.headers.get('authorization')
+
+    def json(self) -> Any:
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            raise api.ApiError(400, {
+                'type': 'https://api.mabis-hub.de/problems/bad-request',
+                'title': 'Bad Request',
+                'status': 400,
+                'detail': 'Request body is not valid JSON'
+            })
+
+    def form(self) -> Dict[str, str]:
+        return {key: values[0] for key, values in parse_qs(self.body.decode('utf-8')).items()}
+
+
+Handler = Callable[..., Awaitable[Tuple[Dict[str, Any], int]]]
+
+
+async def blocking(operation: Callable[[], Any]) -> Any:
+    """
+    Run a synchronous operation of mock_api_server in the loop's thread pool
+
+    Parsing bodies, store access (IPC with a shared store), formula compilation
+    and materializing series can take milliseconds per request. They must not
+    stall the other connections. Token checks stay on the loop, because
+    their accounting lives in the request's context.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, operation)
+
+
+# ==================== OAUTH2 ENDPOINTS ====================
+
+async def oauth_token(request: Request):
+    """Mock OAuth2 token endpoint"""
+    return api.issue_token(request.form())
+
+
+# ==================== TIME SERIES ENDPOINTS ====================
+
+async def submit_time_series(request: Request):
+    """Submit time series data"""
+    api.require_token(request.authorization)
+    return await blocking(lambda: api.accept_time_series(request.json()))
+
+
+async def query_time_series(request: Request):
+    """Query time series data"""
+    api.require_token(request.authorization)
+    return await blocking(lambda: api.find_time_series(request.args.get('marketLocationId')))
+
+
+async def get_time_series(request: Request, time_series_id: str):
+    """Get specific time series"""
+    api.require_token(request.authorization)
+    return await blocking(lambda: api.lookup_time_series(time_series_id))
+
+
+async def update_time_series_intervals(request: Request, time_series_id: str):
+    """Update selected intervals of a time series"""
+    api.require_token(request.authorization)
+    return await blocking(lambda: api.patch_time_series(time_series_id, request.json()))
+
+
+# ==================== METERING VALUES ENDPOINTS ====================
+
+async def submit_metering_values(request: Request, metering_point_id: str):
+    """Append metering values of one metering point"""
+    api.require_token(request.authorization)
+    return await blocking(lambda: api.accept_metering_values(metering_point_id, request.json()))
+
+
+# ==================== FORMULA ENDPOINTS ====================
+
+async def submit_formula(request: Request):
+    """Submit formula definition"""
+    api.require_token(request.authorization)
+    return await blocking(lambda: api.accept_formulas(request.json()))
+
+
+async def list_formulas(request: Request):
+    """List all formulas"""
+    api.require_token(request.authorization)
+    return await blocking(api.list_formula_definitions)
+
+
+async def get_formula(request: Request, formula_id: str):
+    """Get specific formula"""
+    api.require_token(request.authorization)
+    return await blocking(lambda: api.lookup_formula(formula_id))
+
+
+# ==================== CALCULATION ENDPOINTS ====================
+
+async def evaluate_calculation(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluate a prepared calculation in the executor of its queue and store its outcome"""
+    loop = asyncio.get_running_loop()
+    try:
+        result_intervals, stats = await loop.run_in_executor(
+            calculation_executors[job['queue']], api.calculate_formula_with_stats,
+            job['formula'], job['columns'], job['count'], job['profile'], job['bindings'], job['timestamps'])
+    except Exception as e:
+        calculation = await blocking(lambda: api.complete_calculation(job, error=e))
+    else:
+        calculation = await blocking(lambda: api.complete_calculation(job, result_intervals, stats=stats))
+
+    calculation_notifier.notify(calculation['calculationId'])
+    return calculation
+
+
+async def execute_calculation(request: Request):
+    """Execute calculation, evaluating the formula in the executor"""
+    api.require_token(request.authorization)
+    job = await blocking(lambda: api.prepare_calculation(request.json()))
+    calculation_notifier.notify(job['calculationId'])
+
+    if api.CALC_BACKGROUND:
+        task = asyncio.ensure_future(evaluate_calculation(job))
+        background_calculations.add(task)
+        task.add_done_callback(background_calculations.discard)
+        return await blocking(lambda: api.calculation_accepted(api.calculation_store.get(job['calculationId'])))
+
+    return api.calculation_accepted(await evaluate_calculation(job))
+
+
+async def execute_scenarios(request: Request):
+    """Evaluate one formula for many parameter variants in the executor of its queue"""
+    api.require_token(request.authorization)
+    job = await blocking(lambda: api.prepare_scenarios(request.json()))
+    loop = asyncio.get_running_loop()
+    quantities = await loop.run_in_executor(calculation_executors[job['queue']], api.evaluate_scenarios,
+                                            job['groups'], job['count'])
+    return api.scenario_result(job, quantities)
+
+
+async def get_calculation(request: Request, calculation_id: str):
+    """Get calculation result (?wait=<seconds> waits for completion without blocking the loop)"""
+    api.require_token(request.authorization)
+    wait = api.parse_wait_seconds(request.args.get('wait'))
+    calculation, status = await blocking(lambda: api.lookup_calculation(calculation_id))
+    if wait and calculation['status'] not in api.TERMINAL_CALCULATION_STATUSES:
+        deadline = time.monotonic() + wait
+        remaining = wait
+        while remaining > 0:
+            if (await calculation_notifier.wait_for_calculation(calculation_id, notifier_timeout(remaining))
+                    or await blocking(lambda: api.calculation_events.wait(calculation_id, 0))):
+                calculation, status = await blocking(lambda: api.lookup_calculation(calculation_id))
+                break
+            remaining = deadline - time.monotonic()
+    return calculation, status
+
+
+async def calculation_event_stream(since: Optional[int], calculation_id: Optional[str]) -> AsyncIterator[str]:
+    """Asyncio counterpart of api.calculation_event_stream"""
+    events = api.calculation_events
+    sequence = await blocking(events.latest_sequence) if since is None else since
+    yield 'retry: 2000\n\n'
+    keepalive_at = time.monotonic() + api.EVENT_KEEPALIVE_SECONDS
+    while True:
+        new_events = await blocking(lambda: events.events_since(sequence, 0))
+        if not new_events:
+            remaining = keepalive_at - time.monotonic()
+            if remaining <= 0:
+                yield ': keep-alive\n\n'
+                keepalive_at = time.monotonic() + api.EVENT_KEEPALIVE_SECONDS
+            else:
+                await calculation_notifier.wait_for_change(notifier_timeout(remaining))
+            continue
+        keepalive_at = time.monotonic() + api.EVENT_KEEPALIVE_SECONDS
+        sequence = new_events[-1]['id']
+        chunk = ''.join(api.format_sse_event(event) for event in new_events
+                        if calculation_id is None or event['calculationId'] == calculation_id)
+        if chunk:
+            yield chunk
+
+
+async def calculation_events_stream(request: Request):
+    """Stream calculation status transitions as server-sent events"""
+    api.require_token(request.authorization)
+    since = api.parse_event_cursor(request.headers.get('last-event-id') or request.args.get('since'))
+    return calculation_event_stream(since, request.args.get('calculationId')), 200
+
+
+async def get_calculation_profile(request: Request, calculation_id: str):
+    """Get the evaluation profile of a calculation (EXPLAIN ANALYZE)"""
+    api.require_token(request.authorization)
+    return await blocking(lambda: api.lookup_calculation_profile(calculation_id))
+
+
+# ==================== HEALTH CHECK ====================
+
+async def health_check(request: Request):
+    """Health check endpoint"""
+    return await blocking(api.health_status)
+
+
+async def metrics(request: Request):
+    """Prometheus metrics endpoint (plain text)"""
+    return await blocking(api.metrics_exposition), 200
+
+
+async def root(request: Request):
+    """Root endpoint with API info"""
+    return api.api_info()
+
+
+ROUTES: List[Tuple[str, str, Handler]] = [
+    ('POST', '/oauth/token', oauth_token),
+    ('POST', '/v1/time-series', submit_time_series),
+    ('GET', '/v1/time-series', query_time_series),
+    ('GET', '/v1/time-series/{time_series_id}', get_time_series),
+    ('PATCH', '/v1/time-series/{time_series_id}', update_time_series_intervals),
+    ('POST', '/v1/metering-points/{metering_point_id}/values', submit_metering_values),
+    ('POST', '/v1/formulas', submit_formula),
+    ('GET', '/v1/formulas', list_formulas),
+    ('GET', '/v1/formulas/{formula_id}', get_formula),
+    ('POST', '/v1/calculations', execute_calculation),
+    ('POST', '/v1/calculations/scenarios', execute_scenarios),
+    ('GET', '/v1/calculations/events', calculation_events_stream),
+    ('GET', '/v1/calculations/{calculation_id}', get_calculation),
+    ('GET', '/v1/calculations/{calculation_id}/profile', get_calculation_profile),
+    ('GET', '/health', health_check),
+    ('GET', '/metrics', metrics),
+    ('GET', '/', root),
+]
+
+
+def _compile_route(path: str) -> Pattern:
+    """Turn '/v1/formulas/{formula_id}' into a regex with named groups"""
+    return re.compile('^' + re.sub(r'\{(\w+)\}', r'(?P<\1>[^/]+)', path) + '$')
+
+
+_COMPILED_ROUTES = [(method, path, _compile_route(path), handler) for method, path, handler in ROUTES]
+
+
+def resolve_route(method: str, path: str) -> Tuple[Optional[Handler], Dict[str, str], str, int]:
+    """Find the handler and route template for a request; status is 404/405 when there is none"""
+    path_matched = False
+    for route_method, route, pattern, handler in _COMPILED_ROUTES:
+        match = pattern.match(path)
+        if match:
+            if route_method == method:
+                return handler, match.groupdict(), route, 200
+            path_matched = True
+    return None, {}, 'unmatched', 405 if path_matched else 404
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(chunks)
+
+
+async def _send(send, payload: bytes, content_type: bytes, status: int,
+                headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(payload)).encode('ascii')),
+        ] + (headers or []),
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def _send_json(send, body: Any, status: int, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    await _send(send, json.dumps(body).encode('utf-8'), b'application/json', status, headers)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_event_stream(send, receive, stream: AsyncIterator[str], status: int,
+                             headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    """Send server-sent events until the stream ends or the client disconnects"""
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+        ] + (headers or []),
+    })
+
+    async def pump():
+        async for chunk in stream:
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    pump_task = asyncio.ensure_future(pump())
+    disconnect_task = asyncio.ensure_future(_wait_for_disconnect(receive))
+    done, pending = await asyncio.wait({pump_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if pump_task in done:
+        pump_task.result()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for executor in calculation_executors.values():
+                executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    started = time.perf_counter()
+    api.begin_auth_accounting()
+    request = Request(scope, await _read_body(receive))
+    handler, path_params, route, status = resolve_route(request.method, request.path)
+    if handler is None:
+        body = {'error': 'Not found' if status == 404 else 'Method not allowed'}
+    else:
+        try:
+            body, status = await handler(request, **path_params)
+        except api.ApiError as e:
+            body, status = e.body, e.status
+        except Exception:
+            body, status = {'error': 'Internal Server Error'}, 500
+
+    auth_header = (b'x-auth-checks', str(api.finish_auth_accounting()).encode('ascii'))
+    if hasattr(body, '__aiter__'):
+        await _send_event_stream(send, receive, body, status, [auth_header])
+    elif isinstance(body, str):
+        await _send(send, body.encode('utf-8'), api.METRICS_CONTENT_TYPE.encode('ascii'), status, [auth_header])
+    else:
+        await _send_json(send, body, status, [auth_header])
+
+    if api.METRICS.enabled:
+        api.REQUEST_LATENCY.observe(time.perf_counter() - started, (request.method, route, str(status)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MaBiS Time Series API - Asyncio Server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn fehlt: pip install uvicorn")
+
+    print(f"MaBiS Asyncio-Server startet auf: http://localhost:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
@@ -0,0 +1,443 @@
+"""
+MaBiS Time Series API - Formel-Benchmark in Produktionsgröße
+
+Lädt alle Formeln aus formula-examples.json und real-world-formula-examples.json,
+erzeugt synthetische PT15M-Eingangszeitreihen (1 Tag, 1 Monat, 1 Jahr) für
+1 bis 10.000 Marktlokationen und misst je Formel:
+
+    compile    Aufbereitung der Formel (FormulaPlan: kanonische Form, Validierung),
+               zusätzlich die Zeit für eine bereits internierte Gestalt
+    evaluate   Auswertung aller Intervalle wie im Server (PlanRegistry.intern,
+               bind_inputs, calculate_plan)
+    serialize  Ausgabezeitreihe als JSON-Antwort (Zeitstempel + json.dumps)
+    http       Ende-zu-Ende gegen den Mock-Server: Zeitreihen übermitteln,
+               Berechnung ausführen, Ergebnis abrufen
+
+Die Ergebnisse werden als JSON geschrieben und können mit einer gespeicherten
+Baseline verglichen werden, um Änderungen an der Engine zu bewerten.
+
+Verwendung:
+    python benchmark_formulas.py --scale default --json bench.json
+    python benchmark_formulas.py --scale smoke --baseline bench.json --fail-on-regression
+    python benchmark_formulas.py --scale production --phases compile,evaluate,serialize
+
+Die Stufe "production" (bis 10.000 Marktlokationen x 1 Jahr) läuft mehrere Stunden;
+Eingangsdaten werden je Marktlokation erzeugt und wieder verworfen.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+
+import formula_engine as engine
+from benchmark_servers import percentile, start_server
+from interval_calendar import interval_timestamps
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FORMULA_FILES = ('formula-examples.json', 'real-world-formula-examples.json')
+
+# PT15M intervals per period
+PERIODS = {
+    'day': 96,
+    'month': 30 * 96,
+    'year': 365 * 96,
+}
+
+SCALES = {
+    'smoke': {'periods': ['day'], 'locations': [1, 10]},
+    'default': {'periods': ['day', 'month', 'year'], 'locations': [1, 10, 100]},
+    'production': {'periods': ['day', 'month', 'year'], 'locations': [1, 100, 1000, 10000]},
+}
+
+PHASES = ('compile', 'evaluate', 'serialize', 'http')
+
+PERIOD_START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+STEP_SECONDS = 900
+
+
+def load_formulas() -> List[Dict[str, Any]]:
+    """All formula definitions of the example files, in file order"""
+    formulas = []
+    for filename in FORMULA_FILES:
+        with open(os.path.join(HERE, filename)) as f:
+            examples = json.load(f)['examples']
+        for example in examples:
+            if 'formula' in example:
+                formulas.append(example['formula'])
+            else:
+                formulas.extend(example.get('payload', {}).get('formulas', []))
+    return formulas
+
+
+def referenced_series(expression: Dict[str, Any]) -> Set[str]:
+    """Names of all time series referenced by an expression, nested ones included"""
+    names = set()
+    for param in expression.get('parameters', []):
+        value = param.get('value')
+        if param.get('type') == 'timeseries_ref':
+            names.add(value)
+        elif isinstance(value, dict) and 'function' in value:
+            names |= referenced_series(value)
+        elif 'function' in param:
+            names |= referenced_series(param)
+    return names
+
+
+def resolved_expression(formula: Dict[str, Any]) -> Dict[str, Any]:
+    """Expression with typed parameters resolved, as the server compiles it"""
+    expression, _ = engine.resolve_parameters(formula['expression'], formula.get('inputMeteringPoints'),
+                                              formula.get('lossFactor'))
+    return expression
+
+
+def evaluate(registry: engine.PlanRegistry, expression: Dict[str, Any],
+             input_data: Dict[str, List[Dict]], count: int) -> List[Dict]:
+    """The server's evaluation path: interned plan, slots bound to float columns, columnar evaluation"""
+    plan, bindings = registry.intern(expression)
+    columns = engine.bind_inputs(bindings, input_data, count)
+    evaluation = engine.Evaluation(plan.expression)
+    return engine.calculate_plan(plan.expression, columns, count, evaluation)
+
+
+def make_series(ts_id: str, market_location_id: str, intervals: int, rng: random.Random) -> Dict[str, Any]:
+    """Synthetic input series in the compact form the server stores"""
+    return {
+        'timeSeriesId': ts_id,
+        'marketLocationId': market_location_id,
+        'measurementType': 'CONSUMPTION',
+        'unit': 'KWH',
+        'resolution': 'PT15M',
+        'intervals': [
+            {'position': idx + 1, 'quantity': f"{rng.uniform(0, 500):.3f}", 'quality': 'VALIDATED'}
+            for idx in range(intervals)
+        ],
+        '_timeline': {'start': int(PERIOD_START.timestamp()), 'step': STEP_SECONDS},
+    }
+
+
+def location_inputs(formula: Dict[str, Any], names: List[str], location: int, intervals: int,
+                    seed: int) -> Dict[str, Dict[str, Any]]:
+    """Input series of one market location, keyed by the parameter name used in the formula"""
+    rng = random.Random(f"{seed}:{formula['formulaId']}:{location}")
+    market_location_id = f"DE-BENCH-{location:05d}"
+    return {
+        name: make_series(f"TS-BENCH-{location:05d}-{idx}", market_location_id, intervals, rng)
+        for idx, name in enumerate(names)
+    }
+
+
+def output_series(formula: Dict[str, Any], result_intervals: List[Dict], first_input: Dict[str, Any]) -> Dict[str, Any]:
+    """Output series as complete_calculation stores it"""
+    return {
+        'timeSeriesId': 'TS-CALC-BENCH',
+        'marketLocationId': first_input['marketLocationId'],
+        'measurementType': formula.get('outputUnit', 'KWH'),
+        'unit': formula.get('outputUnit', 'KWH'),
+        'resolution': formula.get('outputResolution', 'PT15M'),
+        'intervals': result_intervals,
+        'metadata': {'calculatedBy': formula['formulaId']},
+        '_timeline': first_input['_timeline'],
+    }
+
+
+def materialize(ts: Dict[str, Any]) -> Dict[str, Any]:
+    """Response representation of a compact series (interval timestamps generated from '_timeline')"""
+    timeline = ts['_timeline']
+    boundaries = interval_timestamps(timeline['start'], timeline['step'], len(ts['intervals']))
+    materialized = {key: value for key, value in ts.items() if key != '_timeline'}
+    materialized['intervals'] = [
+        dict(interval, start=boundaries[idx], end=boundaries[idx + 1])
+        for idx, interval in enumerate(ts['intervals'])
+    ]
+    return materialized
+
+
+def result_record(formula_id: str, phase: str, period: Optional[str], locations: int,
+                  seconds: float, intervals: int = 0, **extra) -> Dict[str, Any]:
+    record = {
+        'formula': formula_id,
+        'phase': phase,
+        'period': period,
+        'locations': locations,
+        'seconds': seconds,
+        'per_location_ms': seconds / locations * 1000 if locations else 0.0,
+    }
+    if intervals:
+        record['intervals_per_second'] = intervals * locations / seconds if seconds else 0.0
+    record.update(extra)
+    return record
+
+
+def bench_compile(formula: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    """Best of several plan compilations into an empty registry, and of lookups of the interned plan"""
+    best = float('inf')
+    best_interned = float('inf')
+    expression = resolved_expression(formula)
+    for _ in range(repeat):
+        registry = engine.PlanRegistry()
+        started = time.perf_counter()
+        registry.intern(expression)
+        best = min(best, time.perf_counter() - started)
+        started = time.perf_counter()
+        registry.intern(expression)
+        best_interned = min(best_interned, time.perf_counter() - started)
+    return result_record(formula['formulaId'], 'compile', None, 1, best, interned_seconds=best_interned)
+
+
+def bench_engine(formula: Dict[str, Any], names: List[str], period: str, locations: int,
+                 phases: List[str], seed: int) -> List[Dict[str, Any]]:
+    """Evaluate and serialize the formula for every market location; input generation is not timed"""
+    intervals = PERIODS[period]
+    evaluate_seconds = 0.0
+    serialize_seconds = 0.0
+    response_bytes = 0
+    registry = engine.PlanRegistry()
+    expression = resolved_expression(formula)
+
+    for location in range(locations):
+        inputs = location_inputs(formula, names, location, intervals, seed)
+        input_data = {name: series['intervals'] for name, series in inputs.items()}
+
+        started = time.perf_counter()
+        result_intervals = evaluate(registry, expression, input_data, intervals)
+        evaluate_seconds += time.perf_counter() - started
+
+        if 'serialize' in phases:
+            output = output_series(formula, result_intervals, inputs[names[0]])
+            started = time.perf_counter()
+            payload = json.dumps(materialize(output))
+            serialize_seconds += time.perf_counter() - started
+            response_bytes += len(payload)
+
+    records = []
+    if 'evaluate' in phases:
+        records.append(result_record(formula['formulaId'], 'evaluate', period, locations,
+                                     evaluate_seconds, intervals))
+    if 'serialize' in phases:
+        records.append(result_record(formula['formulaId'], 'serialize', period, locations,
+                                     serialize_seconds, intervals, bytes=response_bytes))
+    return records
+
+
+def bench_http(session: requests.Session, base_url: str, headers: Dict[str, str], formula: Dict[str, Any], names: List[str],
+               period: str, locations: int, seed: int) -> Dict[str, Any]:
+    """Submit inputs, run the calculation and fetch the output series, per market location"""
+    intervals = PERIODS[period]
+    session.post(f'{base_url}/v1/formulas', headers=headers,
+                 json={'messageId': 'MSG-BENCH-F', 'formulas': [formula]}).raise_for_status()
+
+    latencies = []
+    for location in range(locations):
+        inputs = location_inputs(formula, names, location, intervals, seed)
+        series = [materialize(ts) for ts in inputs.values()]
+        calculation_id = f"CALC-BENCH-{formula['formulaId']}-{period}-{location}"
+
+        started = time.perf_counter()
+        session.post(f'{base_url}/v1/time-series', headers=headers,
+                     json={'messageId': 'MSG-BENCH', 'timeSeries': series}).raise_for_status()
+        session.post(f'{base_url}/v1/calculations', headers=headers, json={
+            'calculationId': calculation_id,
+            'formulaId': formula['formulaId'],
+            'inputTimeSeries': {name: ts['timeSeriesId'] for name, ts in inputs.items()},
+        }).raise_for_status()
+        calculation = session.get(f'{base_url}/v1/calculations/{calculation_id}', headers=headers,
+                                  params={'wait': 60}).json()
+        if calculation.get('status') != 'COMPLETED':
+            raise RuntimeError(f"calculation {calculation_id} ended as {calculation.get('status')}")
+        session.get(f"{base_url}/v1/time-series/{calculation['outputTimeSeriesId']}",
+                    headers=headers).raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    return result_record(formula['formulaId'], 'http', period, locations, sum(latencies), intervals,
+                         p50_ms=percentile(latencies, 50) * 1000, p95_ms=percentile(latencies, 95) * 1000)
+
+
+def run_suite(args) -> Dict[str, Any]:
+    scale = SCALES[args.scale]
+    periods = args.periods.split(',') if args.periods else scale['periods']
+    locations_list = [int(value) for value in args.locations.split(',')] if args.locations else scale['locations']
+    phases = args.phases.split(',')
+
+    formulas = load_formulas()
+    if args.formulas:
+        wanted = set(args.formulas.split(','))
+        formulas = [formula for formula in formulas if formula['formulaId'] in wanted]
+
+    server = session = headers = None
+    base_url = f'http://127.0.0.1:{args.port}'
+    if 'http' in phases:
+        server = start_server('flask', args.port)
+        session = requests.Session()
+        token = session.post(f'{base_url}/oauth/token', data={
+            'grant_type': 'client_credentials', 'client_id': 'bench', 'client_secret': 'bench'
+        }).json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+    results: List[Dict[str, Any]] = []
+    skipped: List[Dict[str, str]] = []
+    try:
+        for formula in formulas:
+            formula_id = formula['formulaId']
+            names = sorted(referenced_series(resolved_expression(formula)))
+            if not names:
+                skipped.append({'formula': formula_id, 'reason': 'no time series references'})
+                continue
+            # Like the server, formulas with validation errors are not evaluated
+            errors = engine.validate_expression(resolved_expression(formula))
+            if errors:
+                skipped.append({'formula': formula_id, 'reason': 'invalid: ' + '; '.join(errors)})
+                continue
+
+            # One small evaluation first: formulas the engine cannot evaluate are reported, not timed
+            try:
+                sample = location_inputs(formula, names, 0, 4, args.seed)
+                evaluate(engine.PlanRegistry(), resolved_expression(formula),
+                         {name: ts['intervals'] for name, ts in sample.items()}, 4)
+            except Exception as e:
+                skipped.append({'formula': formula_id, 'reason': f'{type(e).__name__}: {e}'})
+                continue
+
+            if 'compile' in phases:
+                results.append(bench_compile(formula, args.repeat))
+
+            for period in periods:
+                for locations in locations_list:
+                    print(f"  {formula_id:<34} {period:<6} {locations:>6} Marktlokationen", flush=True)
+                    if 'evaluate' in phases or 'serialize' in phases:
+                        results.extend(bench_engine(formula, names, period, locations, phases, args.seed))
+                    if 'http' in phases:
+                        http_locations = min(locations, args.http_locations)
+                        results.append(bench_http(session, base_url, headers, formula, names,
+                                                  period, http_locations, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'commit': git_commit(),
+            'scale': args.scale,
+            'periods': periods,
+            'locations': locations_list,
+            'phases': phases,
+            'seed': args.seed,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(record: Dict[str, Any]) -> Tuple:
+    return record['formula'], record['phase'], record['period'], record['locations']
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Compare per-location times with a stored report
+
+    Returns:
+        Rows (key, baseline/current ms, ratio) for all results present in both
+        reports; rows slower than baseline * (1 + tolerance) are marked as regressions
+    """
+    previous = {result_key(record): record for record in baseline.get('results', [])}
+    rows = []
+    for record in report['results']:
+        old = previous.get(result_key(record))
+        if old is None or not old['per_location_ms']:
+            continue
+        ratio = record['per_location_ms'] / old['per_location_ms']
+        rows.append({
+            'key': result_key(record),
+            'baseline_ms': old['per_location_ms'],
+            'current_ms': record['per_location_ms'],
+            'ratio': ratio,
+            'regression': ratio > 1 + tolerance,
+        })
+    return rows
+
+
+def iter_report_lines(report: Dict[str, Any]) -> Iterator[str]:
+    yield f"{'Formel':<34} {'Phase':<9} {'Periode':<7} {'MaLo':>6} {'ms/MaLo':>10} {'Intervalle/s':>14}"
+    yield "-" * 86
+    for record in report['results']:
+        rate = record.get('intervals_per_second')
+        yield (f"{record['formula']:<34} {record['phase']:<9} {record['period'] or '-':<7} "
+               f"{record['locations']:>6} {record['per_location_ms']:>10.3f} "
+               f"{(f'{rate:,.0f}' if rate else '-'):>14}")
+    for entry in report['skipped']:
+        yield f"{entry['formula']:<34} übersprungen: {entry['reason']}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the MaBiS formula engine at production scale')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='default', help='Größenstufe')
+    parser.add_argument('--periods', help='Kommagetrennt: day, month, year (überschreibt --scale)')
+    parser.add_argument('--locations', help='Kommagetrennte Anzahl Marktlokationen (überschreibt --scale)')
+    parser.add_argument('--phases', default=','.join(PHASES), help='Kommagetrennt: ' + ', '.join(PHASES))
+    parser.add_argument('--formulas', help='Nur diese formulaIds (kommagetrennt)')
+    parser.add_argument('--repeat', type=int, default=20, help='Wiederholungen für compile')
+    parser.add_argument('--http-locations', type=int, default=10,
+                        help='Höchstzahl Marktlokationen je HTTP-Messung')
+    parser.add_argument('--port', type=int, default=8150, help='Port des Mock-Servers für die HTTP-Phase')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Ergebnisse als JSON-Datei schreiben')
+    parser.add_argument('--baseline', help='Mit gespeicherter JSON-Baseline vergleichen')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Erlaubte Verlangsamung gegenüber der Baseline (Standard: 0.10)')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Exit-Code 1, wenn eine Messung die Toleranz überschreitet')
+    args = parser.parse_args()
+
+    invalid = set(args.phases.split(',')) - set(PHASES)
+    if invalid:
+        parser.error(f"unbekannte Phasen: {', '.join(sorted(invalid))}")
+
+    print(f"Formel-Benchmark ({args.scale}) ...")
+    report = run_suite(args)
+    print()
+    for line in iter_report_lines(report):
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nErgebnisse geschrieben: {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare_to_baseline(report, json.load(f), args.tolerance)
+        print()
+        print(f"Vergleich mit Baseline {args.baseline} (Toleranz {args.tolerance:.0%}):")
+        for row in rows:
+            formula_id, phase, period, locations = row['key']
+            marker = '  REGRESSION' if row['regression'] else ''
+            print(f"  {formula_id:<34} {phase:<9} {period or '-':<7} {locations:>6} "
+                  f"{row['baseline_ms']:>10.3f} -> {row['current_ms']:>10.3f} ms  x{row['ratio']:.2f}{marker}")
+        if args.fail_on_regression and any(row['regression'] for row in rows):
+            sys.exit(1)
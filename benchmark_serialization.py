@@ -0,0 +1,126 @@
+"""
+MaBiS Time Series API - Serialisierungs-Benchmark
+
+Vergleicht die Serialisierung einer TimeSeriesSubmission im Python-Client:
+    asdict     json.dumps(dataclasses.asdict(submission))  (bisheriger Weg)
+    encoder    encode_json_bytes(submission)                (generierte Encoder)
+    chunks     encode_time_series_chunks(...)               (Upload-Chunks)
+
+Beide Varianten müssen byte-identisches JSON liefern; der Benchmark prüft das
+vor der Messung.
+
+Verwendung:
+    python benchmark_serialization.py
+    python benchmark_serialization.py --series 2000 --repeat 5 --json serialization.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict
+
+CLIENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python-client-example.py')
+
+
+def load_client():
+    """Import python-client-example.py (the file name is not a valid module name)"""
+    spec = importlib.util.spec_from_file_location('python_client_example', CLIENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    # dataclasses resolves the defining module through sys.modules
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_submission(client, series: int):
+    """Submission with the given number of daily 15-minute series"""
+    sender = client.MarketParticipant(id="9900123456789", role="MSB", name="Benchmark MSB")
+    receiver = client.MarketParticipant(id="9900987654321", role="NB", name="Benchmark NB")
+    day = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    time_series = []
+    for idx in range(series):
+        malo_id = f"DE{idx:011d}"
+        time_series.append(client.TimeSeries(
+            timeSeriesId=f"TS-BENCH-{idx:06d}",
+            marketLocationId=malo_id,
+            measurementType="CONSUMPTION",
+            unit="KWH",
+            resolution="PT15M",
+            period={'start': "2025-01-01T00:00:00Z", 'end': "2025-01-02T00:00:00Z"},
+            intervals=client.generate_15min_intervals(day, malo_id),
+            meteringPointId=f"DE0001234567890000000000000{idx:06d}",
+        ))
+    return client.TimeSeriesSubmission(
+        messageId="MSG-BENCH-001",
+        messageDate="2025-01-02T06:00:00Z",
+        sender=sender,
+        receiver=receiver,
+        timeSeries=time_series,
+    )
+
+
+def measure(func: Callable[[], Any], repeat: int) -> float:
+    """Best wall time of repeat runs in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_benchmark(series: int, repeat: int) -> Dict[str, Any]:
+    client = load_client()
+    submission = build_submission(client, series)
+
+    baseline = json.dumps(asdict(submission)).encode('utf-8')
+    encoded = client.encode_json_bytes(submission)
+    if encoded != baseline:
+        raise SystemExit("Encoder-Ausgabe weicht von json.dumps(asdict(...)) ab")
+
+    max_bytes = 4 * 1024 * 1024
+    results = {
+        'asdict': measure(lambda: json.dumps(asdict(submission)).encode('utf-8'), repeat),
+        'encoder': measure(lambda: client.encode_json_bytes(submission), repeat),
+        'chunks': measure(lambda: client.encode_time_series_chunks(submission, max_bytes, 500), repeat),
+    }
+    return {
+        'series': series,
+        'intervals': sum(len(ts.intervals) for ts in submission.timeSeries),
+        'bytes': len(baseline),
+        'repeat': repeat,
+        'seconds': results,
+        'speedup': {name: results['asdict'] / seconds for name, seconds in results.items() if seconds},
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['series']} Zeitreihen, {report['intervals']} Intervalle, "
+          f"{report['bytes'] / 1024 / 1024:.1f} MiB JSON (bestes von {report['repeat']})")
+    print(f"{'Variante':<10} {'ms':>10} {'MiB/s':>10} {'Faktor':>8}")
+    print("-" * 41)
+    for name, seconds in report['seconds'].items():
+        throughput = report['bytes'] / 1024 / 1024 / seconds if seconds else 0.0
+        print(f"{name:<10} {seconds * 1000:>10.1f} {throughput:>10.1f} {report['speedup'][name]:>7.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark client-side JSON serialization')
+    parser.add_argument('--series', type=int, default=1000, help='Anzahl Zeitreihen (je 96 Intervalle)')
+    parser.add_argument('--repeat', type=int, default=3, help='Wiederholungen je Variante')
+    parser.add_argument('--json', help='Ergebnisse zusätzlich als JSON-Datei schreiben')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.series, args.repeat)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,221 @@
+"""
+MaBiS Time Series API - Server Benchmark (Flask vs. Asyncio)
+
+Startet mock_api_server.py (Flask, threaded) und asgi_api_server.py (uvicorn)
+jeweils als eigenen Prozess und belastet beide mit derselben gemischten Last:
+viele Clients fragen den Berechnungsstatus ab, übermitteln Zeitreihen und
+starten Berechnungen. Ausgegeben werden Durchsatz und Latenzen (p50/p95/p99).
+
+Verwendung:
+    pip install uvicorn
+    python benchmark_servers.py --clients 64 --duration 10
+    python benchmark_servers.py --json benchmark-servers.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import requests
+
+from demo_client import MaBiSDemoClient
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    'flask': [sys.executable, '-c',
+              'import sys, mock_api_server as m; '
+              'm.app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True)'],
+    'asgi': [sys.executable, os.path.join(HERE, 'asgi_api_server.py'), '--host', '127.0.0.1', '--port'],
+}
+
+# Share of each operation in the mixed workload
+WORKLOAD = [
+    ('poll_calculation', 0.7),
+    ('submit_time_series', 0.2),
+    ('execute_calculation', 0.1),
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def start_server(kind: str, port: int) -> subprocess.Popen:
+    """Start a server process and wait until /health answers"""
+    process = subprocess.Popen(SERVERS[kind] + [str(port)], cwd=HERE,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/health', timeout=0.5).status_code == 200:
+                return process
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start on port {port}')
+
+
+def setup_fixture(base_url: str) -> Dict[str, Any]:
+    """Token, three input series, the demo formula and one completed calculation"""
+    demo = MaBiSDemoClient(base_url)
+    token = requests.post(f'{base_url}/oauth/token', data={
+        'grant_type': 'client_credentials', 'client_id': 'bench', 'client_secret': 'bench'
+    }).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    series = [
+        {'timeSeriesId': f'TS-BENCH-{idx}', 'marketLocationId': 'DE-BENCH', 'resolution': 'PT15M',
+         'unit': 'KWH', 'measurementType': 'CONSUMPTION',
+         'intervals': demo._generate_intervals(start, [random.uniform(0, 500) for _ in range(96)])}
+        for idx in range(3)
+    ]
+    requests.post(f'{base_url}/v1/time-series', headers=headers,
+                  json={'messageId': 'MSG-BENCH', 'timeSeries': series}).raise_for_status()
+
+    grp_sum = {'type': 'expression', 'value': {'function': 'Grp_Sum', 'parameters': [
+        {'type': 'timeseries_ref', 'value': 'lineA', 'scalingFactor': 1.0},
+        {'type': 'timeseries_ref', 'value': 'lineB', 'scalingFactor': -1.0},
+        {'type': 'timeseries_ref', 'value': 'lineC', 'scalingFactor': -1.0}]}}
+    formula = {'formulaId': 'FORM-BENCH', 'name': 'Benchmark', 'outputUnit': 'KWH',
+               'expression': {'function': 'Wenn_Dann', 'parameters': [
+                   grp_sum, {'type': 'string', 'value': '>'}, {'type': 'constant', 'value': 0},
+                   grp_sum, {'type': 'constant', 'value': 0}]}}
+    requests.post(f'{base_url}/v1/formulas', headers=headers,
+                  json={'messageId': 'MSG-BENCH-F', 'formulas': [formula]}).raise_for_status()
+
+    calculation = {'formulaId': 'FORM-BENCH',
+                   'inputTimeSeries': {'lineA': 'TS-BENCH-0', 'lineB': 'TS-BENCH-1', 'lineC': 'TS-BENCH-2'},
+                   'period': {'start': '2025-01-01T00:00:00Z', 'end': '2025-01-02T00:00:00Z'}}
+    requests.post(f'{base_url}/v1/calculations', headers=headers,
+                  json=dict(calculation, calculationId='CALC-BENCH-0')).raise_for_status()
+
+    return {'headers': headers, 'series': series[0], 'calculation': calculation}
+
+
+def run_client(base_url: str, fixture: Dict[str, Any], stop_at: float, client_idx: int,
+               latencies: Dict[str, List[float]], errors: Dict[str, int], lock: threading.Lock):
+    """One simulated client issuing the mixed workload until stop_at"""
+    session = requests.Session()
+    headers = fixture['headers']
+    operations = [name for name, _ in WORKLOAD]
+    weights = [weight for _, weight in WORKLOAD]
+    local_latencies: Dict[str, List[float]] = {name: [] for name in operations}
+    local_errors = {name: 0 for name in operations}
+    counter = 0
+
+    while time.time() < stop_at:
+        operation = random.choices(operations, weights)[0]
+        counter += 1
+        started = time.perf_counter()
+        try:
+            if operation == 'poll_calculation':
+                response = session.get(f'{base_url}/v1/calculations/CALC-BENCH-0', headers=headers)
+            elif operation == 'submit_time_series':
+                series = dict(fixture['series'], timeSeriesId=f'TS-BENCH-C{client_idx}-{counter}')
+                response = session.post(f'{base_url}/v1/time-series', headers=headers,
+                                        json={'messageId': 'MSG-BENCH', 'timeSeries': [series]})
+            else:
+                response = session.post(f'{base_url}/v1/calculations', headers=headers,
+                                        json=dict(fixture['calculation'],
+                                                  calculationId=f'CALC-BENCH-C{client_idx}-{counter}'))
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        local_latencies[operation].append(time.perf_counter() - started)
+        if not ok:
+            local_errors[operation] += 1
+
+    with lock:
+        for name in operations:
+            latencies[name].extend(local_latencies[name])
+            errors[name] += local_errors[name]
+
+
+def benchmark_server(kind: str, port: int, clients: int, duration: float) -> Dict[str, Any]:
+    """Run the mixed workload against one server kind"""
+    process = start_server(kind, port)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        fixture = setup_fixture(base_url)
+
+        latencies: Dict[str, List[float]] = {name: [] for name, _ in WORKLOAD}
+        errors = {name: 0 for name, _ in WORKLOAD}
+        lock = threading.Lock()
+        stop_at = time.time() + duration
+        threads = [
+            threading.Thread(target=run_client,
+                             args=(base_url, fixture, stop_at, idx, latencies, errors, lock))
+            for idx in range(clients)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+    report = {'server': kind, 'clients': clients, 'duration': elapsed, 'operations': {}}
+    total = 0
+    for name, values in latencies.items():
+        values.sort()
+        total += len(values)
+        report['operations'][name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        }
+    report['throughput_rps'] = total / elapsed if elapsed else 0.0
+    return report
+
+
+def print_report(reports: List[Dict[str, Any]]):
+    print()
+    print(f"{'Server':<8} {'Operation':<22} {'Requests':>9} {'Errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print("-" * 79)
+    for report in reports:
+        for name, stats in report['operations'].items():
+            print(f"{report['server']:<8} {name:<22} {stats['requests']:>9} {stats['errors']:>7} "
+                  f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+        print(f"{report['server']:<8} {'throughput':<22} {report['throughput_rps']:>9.1f} req/s")
+        print("-" * 79)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Flask vs. asyncio MaBiS server')
+    parser.add_argument('--clients', type=int, default=64, help='Gleichzeitige Clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Dauer pro Server in Sekunden')
+    parser.add_argument('--servers', default='flask,asgi', help='Kommagetrennt: flask, asgi')
+    parser.add_argument('--port', type=int, default=8100, help='Erster Port')
+    parser.add_argument('--json', help='Ergebnisse zusätzlich als JSON-Datei schreiben')
+    args = parser.parse_args()
+
+    reports = []
+    for offset, kind in enumerate(args.servers.split(',')):
+        print(f"Benchmark {kind}: {args.clients} Clients, {args.duration:.0f}s ...")
+        reports.append(benchmark_server(kind, args.port + offset, args.clients, args.duration))
+
+    print_report(reports)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
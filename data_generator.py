@@ -0,0 +1,388 @@
+"""
+MaBiS Time Series API - Synthetische Messdaten
+
+Erzeugt realistische 15-Minuten-Zeitreihen (Haushaltslast, PV-Einspeisung,
+Batteriespeicher) für viele Zählpunkte über Monate oder Jahre, z.B. als Eingabe
+für Benchmarks und Lasttests.
+
+Die Liefertage sind Kalendertage in deutscher Ortszeit (Europe/Berlin): Am Tag
+der Umstellung auf Sommerzeit hat ein Tag 92, bei der Umstellung auf Winterzeit
+100 Viertelstunden (siehe interval_calendar.py). Kalender, Zeitstempel und
+Tagesprofile werden einmal je Lauf berechnet und von allen Zählpunkten geteilt; je Zählpunkt werden nur noch
+Skalierung und Rauschen angewendet.
+
+Ausgabeformate:
+    json     eine TimeSeriesSubmission (POST /v1/time-series)
+    ndjson   eine Zeitreihe je Zeile (streambar, geringer Speicherbedarf)
+    csv      spaltenweise: Zeitstempel plus eine Spalte je Zeitreihe
+
+Verwendung:
+    python data_generator.py --meters 100 --days 31 --output januar.json
+    python data_generator.py --meters 2000 --start 2025-01-01 --days 365 --profiles load,pv,bess \\
+        --format ndjson --output jahr.ndjson
+    python data_generator.py --meters 10 --days 7 --format csv --output woche.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, IO, Iterator, List, Sequence
+from zoneinfo import ZoneInfo
+
+from interval_calendar import DEFAULT_TIMEZONE, format_utc_instant, interval_timestamps, local_days
+
+PROFILES = ('load', 'pv', 'bess')
+
+# Measurement type and OBIS code per generated series kind
+SERIES_KINDS = {
+    'load': ('CONSUMPTION', '1-1:1.29.0'),
+    'pv': ('GENERATION', '1-1:2.29.0'),
+    'bess_charge': ('CONSUMPTION', '1-1:1.29.0'),
+    'bess_discharge': ('GENERATION', '1-1:2.29.0'),
+}
+
+# Solar noon in UTC hours for Berlin (13.4° E)
+SOLAR_NOON_UTC = 12.0 - 13.4 / 15.0
+
+
+# ==================== CALENDAR ====================
+
+def build_calendar(start_day: date, days: int, tz_name: str = DEFAULT_TIMEZONE,
+                   resolution: str = 'PT15M') -> Dict[str, Any]:
+    """
+    Interval calendar of consecutive local delivery days
+
+    Each local day runs from local midnight to the next local midnight, so
+    DST switch days have 23 or 25 hours. The intervals of all days form one
+    regular UTC timeline (start + position * step).
+
+    Returns:
+        start / end: UTC epoch seconds of the first and after the last interval
+        step: Interval length in seconds
+        count: Number of intervals
+        day_slots: Number of intervals per local day
+        day_of_year / weekday: Per local day
+        slot_day: Per interval, index of its local day
+        wall_hour: Per interval, local wall-clock hour of its start (0.0 - 24.0)
+        utc_hour: Per interval, UTC hour of its midpoint
+    """
+    span = local_days(start_day, days, resolution, tz_name)
+    step = span.step
+    tz = ZoneInfo(tz_name)
+
+    slot_day: List[int] = []
+    wall_hour: List[float] = []
+    for day_idx, day in enumerate(span.days):
+        slot_day.extend([day_idx] * day.count)
+        if day.end - day.start == 86400:
+            wall_hour.extend([idx * step / 3600 for idx in range(day.count)])
+        else:
+            # DST switch day: the wall clock jumps, so look up every interval
+            for idx in range(day.count):
+                local = datetime.fromtimestamp(day.start + idx * step, tz)
+                wall_hour.append(local.hour + local.minute / 60)
+
+    start = span.start
+    count = span.count
+    return {
+        'timezone': tz_name,
+        'start': start,
+        'end': span.end,
+        'step': step,
+        'count': count,
+        'day_slots': [day.count for day in span.days],
+        'day_of_year': [(start_day + timedelta(days=offset)).timetuple().tm_yday for offset in range(days)],
+        'weekday': [(start_day + timedelta(days=offset)).weekday() for offset in range(days)],
+        'slot_day': slot_day,
+        'wall_hour': wall_hour,
+        'utc_hour': [((start + idx * step + step / 2) % 86400) / 3600 for idx in range(count)],
+    }
+
+
+def calendar_timestamps(calendar: Dict[str, Any]) -> Sequence[str]:
+    """Interval boundaries as ISO strings (count + 1 entries), shared by all series"""
+    return interval_timestamps(calendar['start'], calendar['step'], calendar['count'])
+
+
+# ==================== PROFILES ====================
+
+def _bump(hour: float, center: float, width: float) -> float:
+    return math.exp(-((hour - center) / width) ** 2)
+
+
+def load_shape(calendar: Dict[str, Any]) -> List[float]:
+    """
+    Household load shape per interval (mean 1.0 over a year)
+
+    Night base load, morning and evening peaks by local wall-clock time (later
+    morning on weekends), plus a seasonal factor that is highest in winter.
+    """
+    weekday = calendar['weekday']
+    seasonal = [1.0 + 0.25 * math.cos(2 * math.pi * (doy - 15) / 365) for doy in calendar['day_of_year']]
+    shape = []
+    for hour, day in zip(calendar['wall_hour'], calendar['slot_day']):
+        weekend = weekday[day] >= 5
+        morning = _bump(hour, 9.0 if weekend else 7.25, 1.5)
+        value = 0.45 + 0.9 * morning + 0.5 * _bump(hour, 13.0, 2.0) + 1.3 * _bump(hour, 19.0, 2.0)
+        shape.append(value * (1.1 if weekend else 1.0) * seasonal[day])
+    mean = sum(shape) / len(shape) if shape else 1.0
+    return [value / mean for value in shape]
+
+
+def pv_shape(calendar: Dict[str, Any]) -> List[float]:
+    """
+    Clear-sky PV yield per interval as a share of peak power (0.0 - 1.0)
+
+    The sun follows UTC, so PV output is unaffected by the clock change. Day
+    length and peak height vary with the day of the year (Berlin latitude).
+    """
+    day_length = [12.0 + 4.3 * math.sin(2 * math.pi * (doy - 80) / 365) for doy in calendar['day_of_year']]
+    peak = [0.6 + 0.4 * math.sin(2 * math.pi * (doy - 80) / 365) for doy in calendar['day_of_year']]
+    shape = []
+    for hour, day in zip(calendar['utc_hour'], calendar['slot_day']):
+        offset = abs(hour - SOLAR_NOON_UTC)
+        half_day = day_length[day] / 2
+        if offset >= half_day:
+            shape.append(0.0)
+        else:
+            shape.append(peak[day] * math.cos(math.pi / 2 * offset / half_day) ** 1.5)
+    return shape
+
+
+def _scaled_with_noise(shape: Sequence[float], slot_day: Sequence[int], day_factors: Sequence[float],
+                       scale: float, noise: float, rng: random.Random) -> List[float]:
+    """shape * scale * day factor, with uniform multiplicative noise of +/- noise per interval"""
+    low = 1.0 - noise
+    spread = 2 * noise
+    uniform = rng.random
+    return [value * scale * day_factors[day] * (low + spread * uniform())
+            for value, day in zip(shape, slot_day)]
+
+
+def simulate_battery(pv: Sequence[float], wall_hour: Sequence[float], capacity: float,
+                     power: float, step: int) -> List[List[float]]:
+    """
+    Charge/discharge energy per interval of a PV-coupled battery
+
+    Charges from up to 60 % of the PV yield until full, discharges between
+    17:00 and 23:00 local time until empty.
+
+    Returns:
+        [charge, discharge] energy per interval in kWh (both non-negative)
+    """
+    max_energy = power * step / 3600
+    state = capacity * 0.2
+    charge = []
+    discharge = []
+    for pv_energy, hour in zip(pv, wall_hour):
+        charged = min(0.6 * pv_energy, max_energy, capacity - state)
+        state += charged
+        discharged = 0.0
+        if 17.0 <= hour < 23.0:
+            discharged = min(max_energy * 0.5, state)
+            state -= discharged
+        charge.append(charged)
+        discharge.append(discharged)
+    return [charge, discharge]
+
+
+# ==================== METERS ====================
+
+def generate_meter_series(calendar: Dict[str, Any], meters: int, profiles: Sequence[str] = PROFILES,
+                          seed: int = 42, first_meter: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Generate the series of each meter, one at a time
+
+    Yields dicts with timeSeriesId, marketLocationId, meteringPointId,
+    measurementType, obisCode, kind and quantities (kWh per interval).
+    Every meter uses its own random stream, so a meter's data does not depend
+    on how many meters are generated.
+    """
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        raise ValueError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+    slot_day = calendar['slot_day']
+    days = len(calendar['day_slots'])
+    shapes = {}
+    if 'load' in profiles:
+        shapes['load'] = load_shape(calendar)
+    if 'pv' in profiles or 'bess' in profiles:
+        shapes['pv'] = pv_shape(calendar)
+    step_hours = calendar['step'] / 3600
+
+    for meter in range(first_meter, first_meter + meters):
+        rng = random.Random(f"{seed}:{meter}")
+        market_location_id = f"DE{meter:031d}"
+        series: Dict[str, List[float]] = {}
+
+        if 'load' in profiles:
+            annual_kwh = rng.uniform(2000, 6000)
+            per_interval = annual_kwh / (365 * 24 / step_hours)
+            day_factors = [rng.uniform(0.85, 1.15) for _ in range(days)]
+            series['load'] = _scaled_with_noise(shapes['load'], slot_day, day_factors, per_interval, 0.25, rng)
+
+        if 'pv' in profiles or 'bess' in profiles:
+            peak_kw = rng.uniform(5, 30)
+            # Daily cloudiness
+            day_factors = [rng.choice((0.25, 0.6, 0.9, 1.0)) for _ in range(days)]
+            pv = _scaled_with_noise(shapes['pv'], slot_day, day_factors, peak_kw * step_hours, 0.1, rng)
+            if 'pv' in profiles:
+                series['pv'] = pv
+            if 'bess' in profiles:
+                capacity = peak_kw * rng.uniform(0.8, 1.5)
+                series['bess_charge'], series['bess_discharge'] = simulate_battery(
+                    pv, calendar['wall_hour'], capacity, capacity / 2, calendar['step'])
+
+        for kind, quantities in series.items():
+            measurement_type, obis_code = SERIES_KINDS[kind]
+            yield {
+                'timeSeriesId': f"TS-GEN-{meter:06d}-{kind.upper()}",
+                'marketLocationId': market_location_id,
+                'meteringPointId': f"{market_location_id}-{kind.upper()}",
+                'measurementType': measurement_type,
+                'obisCode': obis_code,
+                'kind': kind,
+                'quantities': quantities,
+            }
+
+
+def _series_head(meter_series: Dict[str, Any], timestamps: Sequence[str]) -> Dict[str, Any]:
+    return {
+        'timeSeriesId': meter_series['timeSeriesId'],
+        'marketLocationId': meter_series['marketLocationId'],
+        'meteringPointId': meter_series['meteringPointId'],
+        'measurementType': meter_series['measurementType'],
+        'unit': 'KWH',
+        'resolution': 'PT15M',
+        'obisCode': meter_series['obisCode'],
+        'period': {'start': timestamps[0], 'end': timestamps[-1]},
+    }
+
+
+def to_api_series(meter_series: Dict[str, Any], timestamps: Sequence[str]) -> Dict[str, Any]:
+    """TimeSeries in the API representation (intervals with start/end, quantities with 3 decimals)"""
+    series = _series_head(meter_series, timestamps)
+    series['intervals'] = [
+        {'position': idx + 1, 'start': timestamps[idx], 'end': timestamps[idx + 1],
+         'quantity': '%.3f' % quantity, 'quality': 'METERED'}
+        for idx, quantity in enumerate(meter_series['quantities'])
+    ]
+    return series
+
+
+# ==================== OUTPUT ====================
+
+class SeriesEncoder:
+    """
+    JSON encoding of API series over one calendar
+
+    The interval JSON around the quantity (position, start, end, quality) is
+    the same for every series of the calendar, so it is built once; encoding
+    a series then only formats its quantities. The output equals
+    json.dumps(to_api_series(...)).
+    """
+
+    def __init__(self, calendar: Dict[str, Any]):
+        self.timestamps = calendar_timestamps(calendar)
+        timestamps = self.timestamps
+        self._prefixes = [
+            '{"position": %d, "start": "%s", "end": "%s", "quantity": "' % (idx + 1, timestamps[idx], timestamps[idx + 1])
+            for idx in range(calendar['count'])
+        ]
+
+    def encode(self, meter_series: Dict[str, Any]) -> str:
+        head = json.dumps(_series_head(meter_series, self.timestamps))
+        suffix = '", "quality": "METERED"}'
+        intervals = ', '.join([prefix + '%.3f' % quantity + suffix
+                               for prefix, quantity in zip(self._prefixes, meter_series['quantities'])])
+        return head[:-1] + ', "intervals": [' + intervals + ']}'
+
+
+def write_json(out: IO[str], series: Iterator[Dict[str, Any]], calendar: Dict[str, Any], message_id: str) -> int:
+    """Write one TimeSeriesSubmission, streaming the series; returns the number of series"""
+    encoder = SeriesEncoder(calendar)
+    out.write(json.dumps({
+        'messageId': message_id,
+        'messageDate': format_utc_instant(int(time.time())),
+        'sender': {'id': '9900000000001', 'role': 'MSB', 'name': 'Synthetische Daten'},
+        'receiver': {'id': '9900000000002', 'role': 'NB'},
+    })[:-1] + ', "timeSeries": [')
+    written = 0
+    for meter_series in series:
+        if written:
+            out.write(', ')
+        out.write(encoder.encode(meter_series))
+        written += 1
+    out.write(']}\n')
+    return written
+
+
+def write_ndjson(out: IO[str], series: Iterator[Dict[str, Any]], calendar: Dict[str, Any]) -> int:
+    """Write one API TimeSeries per line; returns the number of series"""
+    encoder = SeriesEncoder(calendar)
+    written = 0
+    for meter_series in series:
+        out.write(encoder.encode(meter_series))
+        out.write('\n')
+        written += 1
+    return written
+
+
+def write_csv(out: IO[str], series: Iterator[Dict[str, Any]], calendar: Dict[str, Any]) -> int:
+    """Write interval start/end plus one quantity column per series; returns the number of series"""
+    timestamps = calendar_timestamps(calendar)
+    columns = list(series)
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['start', 'end'] + [column['timeSeriesId'] for column in columns])
+    quantities = [column['quantities'] for column in columns]
+    for idx, row in enumerate(zip(*quantities)):
+        writer.writerow([timestamps[idx], timestamps[idx + 1]] + ['%.3f' % value for value in row])
+    return len(columns)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic DST-aware metering data')
+    parser.add_argument('--meters', type=int, default=10, help='Anzahl Zählpunkte')
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2025, 1, 1),
+                        help='Erster Liefertag (Ortszeit, YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=31, help='Anzahl Liefertage')
+    parser.add_argument('--profiles', default='load,pv,bess',
+                        help=f"Kommagetrennt aus {', '.join(PROFILES)}")
+    parser.add_argument('--format', choices=('json', 'ndjson', 'csv'), default='json')
+    parser.add_argument('--output', help='Ausgabedatei (Standard: stdout)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timezone', default=DEFAULT_TIMEZONE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    calendar = build_calendar(args.start, args.days, args.timezone)
+    profiles = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    series = generate_meter_series(calendar, args.meters, profiles, args.seed)
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'json':
+            written = write_json(out, series, calendar, f"MSG-GEN-{args.start.isoformat()}")
+        elif args.format == 'ndjson':
+            written = write_ndjson(out, series, calendar)
+        else:
+            written = write_csv(out, series, calendar)
+    finally:
+        if args.output:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    switch_days = [(args.start + timedelta(days=idx)).isoformat() + f" ({slots})"
+                   for idx, slots in enumerate(calendar['day_slots']) if slots != 86400 // calendar['step']]
+    print(f"{written} Zeitreihen ({args.meters} Zählpunkte), je {calendar['count']} Intervalle, "
+          f"in {elapsed:.1f} s", file=sys.stderr)
+    if switch_days:
+        print(f"Zeitumstellung: {', '.join(switch_days)}", file=sys.stderr)
@@ -15,7 +15,7 @@ from __future__ import annotations
 
 import requests
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import json
 
 
@@ -59,14 +59,11 @@ class MaBiSDemoClient:
             'Content-Type': 'application/json'
         }
 
-    def submit_time_series(self) -> List[str]:
-        """Zeitreihendaten übermitteln"""
-        print("\n" + "=" * 60)
-        print("2. ZEITREIHENDATEN ÜBERMITTELN")
-        print("=" * 60)
-
-        # Zeitraum: heute, 96 Intervalle (15-Minuten-Werte für 24 Stunden)
-        start_time = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    def build_time_series_message(self, start_time: Optional[datetime] = None) -> Dict[str, Any]:
+        """Zeitreihen-Nachricht des BESS-Beispiels (3 Messstellen, 96 Intervalle)"""
+        if start_time is None:
+            # Zeitraum: heute, 96 Intervalle (15-Minuten-Werte für 24 Stunden)
+            start_time = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
 
         # Beispiel: BESS Batterieladung - 3 Messstellen
         time_series_data = {
@@ -144,49 +141,10 @@ class MaBiSDemoClient:
                 }
             ]
         }
+        return time_series_data
 
-        response = requests.post(
-            f"{self.base_url}/v1/time-series",
-            headers=self._get_headers(),
-            json=time_series_data
-        )
-
-        if response.status_code == 201:
-            result = response.json()
-            print(f"✅ Zeitreihen übermittelt:")
-            for ts_id in result['timeSeriesIds']:
-                print(f"   - {ts_id}")
-            print(f"   Status: {result['status']}")
-            print(f"   Akzeptiert am: {result['acceptanceTime']}")
-            return result['timeSeriesIds']
-        else:
-            print(f"❌ Fehler: {response.status_code}")
-            print(response.text)
-            return []
-
-    def _generate_intervals(self, start_time: datetime, quantities: List[float]) -> List[Dict]:
-        """Intervalle generieren"""
-        intervals = []
-        for i, qty in enumerate(quantities):
-            interval_start = start_time + timedelta(minutes=15 * i)
-            interval_end = interval_start + timedelta(minutes=15)
-
-            intervals.append({
-                "position": i + 1,
-                "start": interval_start.isoformat().replace('+00:00', 'Z'),
-                "end": interval_end.isoformat().replace('+00:00', 'Z'),
-                "quantity": f"{qty:.3f}",
-                "quality": "VALIDATED"
-            })
-
-        return intervals
-
-    def submit_formula(self) -> str:
-        """Formel übermitteln"""
-        print("\n" + "=" * 60)
-        print("3. FORMEL DEFINIEREN")
-        print("=" * 60)
-
+    def build_formula_message(self) -> Dict[str, Any]:
+        """Formel-Nachricht mit W+Batt1 oEV"""
         # Formel: W+Batt1 oEV (BESS Batterieladung ohne Eigenverbrauch)
         # wenn(W+Z1 – (W+ZEV1 + W+ZE_UW) > 0; W+Z1 – (W+ZEV1 + W+ZE_UW); 0)
         formula_data = {
@@ -292,6 +250,79 @@ class MaBiSDemoClient:
                 }
             ]
         }
+        return formula_data
+
+    def build_calculation_request(self, formula_id: str, time_series_ids: List[str]) -> Dict[str, Any]:
+        """Berechnungsauftrag für W+Batt1 oEV über die drei Zeitreihen"""
+        day_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        calculation_request = {
+            "calculationId": "CALC-DEMO-001",
+            "formulaId": formula_id,
+            "inputTimeSeries": {
+                "lineA": time_series_ids[0],  # W+Z1
+                "lineB": time_series_ids[1],  # W+ZEV1
+                "lineC": time_series_ids[2]   # W+ZE_UW
+            },
+            "period": {
+                "start": day_start.isoformat().replace('+00:00', 'Z'),
+                "end": (day_start + timedelta(days=1)).isoformat().replace('+00:00', 'Z')
+            },
+            "outputTimeSeriesId": "TS-RESULT-BATT1-OEV"
+        }
+        return calculation_request
+
+    def submit_time_series(self) -> List[str]:
+        """Zeitreihendaten übermitteln"""
+        print("\n" + "=" * 60)
+        print("2. ZEITREIHENDATEN ÜBERMITTELN")
+        print("=" * 60)
+
+        time_series_data = self.build_time_series_message()
+
+        response = requests.post(
+            f"{self.base_url}/v1/time-series",
+            headers=self._get_headers(),
+            json=time_series_data
+        )
+
+        if response.status_code == 201:
+            result = response.json()
+            print(f"✅ Zeitreihen übermittelt:")
+            for ts_id in result['timeSeriesIds']:
+                print(f"   - {ts_id}")
+            print(f"   Status: {result['status']}")
+            print(f"   Akzeptiert am: {result['acceptanceTime']}")
+            return result['timeSeriesIds']
+        else:
+            print(f"❌ Fehler: {response.status_code}")
+            print(response.text)
+            return []
+
+    def _generate_intervals(self, start_time: datetime, quantities: List[float]) -> List[Dict]:
+        """Intervalle generieren"""
+        intervals = []
+        for i, qty in enumerate(quantities):
+            interval_start = start_time + timedelta(minutes=15 * i)
+            interval_end = interval_start + timedelta(minutes=15)
+
+            intervals.append({
+                "position": i + 1,
+                "start": interval_start.isoformat().replace('+00:00', 'Z'),
+                "end": interval_end.isoformat().replace('+00:00', 'Z'),
+                "quantity": f"{qty:.3f}",
+                "quality": "VALIDATED"
+            })
+
+        return intervals
+
+    def submit_formula(self) -> str:
+        """Formel übermitteln"""
+        print("\n" + "=" * 60)
+        print("3. FORMEL DEFINIEREN")
+        print("=" * 60)
+
+        formula_data = self.build_formula_message()
 
         response = requests.post(
             f"{self.base_url}/v1/formulas",
@@ -319,20 +350,7 @@ class MaBiSDemoClient:
         print("4. BERECHNUNG AUSFÜHREN")
         print("=" * 60)
 
-        calculation_request = {
-            "calculationId": "CALC-DEMO-001",
-            "formulaId": formula_id,
-            "inputTimeSeries": {
-                "lineA": time_series_ids[0],  # W+Z1
-                "lineB": time_series_ids[1],  # W+ZEV1
-                "lineC": time_series_ids[2]   # W+ZE_UW
-            },
-            "period": {
-                "start": datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).isoformat().replace('+00:00', 'Z'),
-                "end": (datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).isoformat().replace('+00:00', 'Z')
-            },
-            "outputTimeSeriesId": "TS-RESULT-BATT1-OEV"
-        }
+        calculation_request = self.build_calculation_request(formula_id, time_series_ids)
 
         response = requests.post(
             f"{self.base_url}/v1/calculations",
@@ -352,15 +370,17 @@ class MaBiSDemoClient:
             print(response.text)
             return None
 
-    def get_calculation_result(self, calculation_id: str) -> Dict:
-        """Berechnungsergebnis abrufen"""
+    def get_calculation_result(self, calculation_id: str, wait: float = 30.0) -> Dict:
+        """Berechnungsergebnis abrufen (wartet per Long-Polling bis zu wait Sekunden)"""
         print("\n" + "=" * 60)
         print("5. BERECHNUNGSERGEBNIS ABRUFEN")
         print("=" * 60)
 
         response = requests.get(
             f"{self.base_url}/v1/calculations/{calculation_id}",
-            headers=self._get_headers()
+            headers=self._get_headers(),
+            params={'wait': wait},
+            timeout=wait + 10
         )
 
         if response.status_code == 200:
@@ -0,0 +1,766 @@
+"""
+MaBiS Time Series API - Formel-Engine
+
+Auswertung von Formelausdrücken (Wenn_Dann, Grp_Sum, Anteil_*, Quer_*) auf
+Intervallwerten. Der Mock-Server und der Python-Client nutzen dasselbe Modul,
+damit eine lokal ausgewertete Formel exakt dasselbe Ergebnis liefert wie eine
+Berechnung über POST /v1/calculations.
+
+Eingaben sind Formel-Dicts im JSON-Format der API und je Zeitreihen-Referenz
+die Intervall-Liste einer Zeitreihe (Dicts mit 'quantity', optional
+'start'/'end'). Nur Standardbibliothek.
+
+Formeln gleicher Gestalt (z.B. dieselbe Wenn_Dann(Grp_Sum(...))-Formel für
+tausende Marktlokationen) teilen sich über PlanRegistry einen FormulaPlan: die
+kanonische Form mit sortierten Argumenten kommutativer Funktionen und
+Zeitreihen-Referenzen als Slots ($0, $1, ...), samt Analyse gemeinsamer
+Teilausdrücke, Knotenzahl und Validierung. Eine Berechnung bindet die Slots
+einmalig an die Eingabe-Zeitreihen (bind_inputs) und wertet den Plan auf
+Float-Spalten aus (calculate_plan). Prozentwerte, Verlustfaktoren und
+Messlokations-/OBIS-Referenzen löst resolve_parameters vor dem Kompilieren in
+Konstanten, Skalierungsfaktoren und Zeitreihen-Referenzen auf.
+Szenario-Varianten einer Formel (apply_overrides) wertet calculate_sweep
+gemeinsam aus; unveränderte Teilausdrücke werden dabei je Intervall nur
+einmal berechnet.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# Functions whose result does not depend on the order of their arguments
+COMMUTATIVE_FUNCTIONS = frozenset({'Grp_Sum', 'Quer_Max', 'Quer_Min'})
+# Aggregations over all their arguments; they apply the scalingFactor of every
+# reference, so a loss factor among the arguments folds into those (see resolve_parameters)
+AGGREGATE_FUNCTIONS = frozenset({'Grp_Sum', 'Quer_Max', 'Quer_Min'})
+# Implemented functions and their minimum number of parameters
+FUNCTION_ARITY = {
+    'Wenn_Dann': 5,
+    'Grp_Sum': 0,
+    'Anteil_Groesser_Als': 2,
+    'Anteil_Kleiner_Als': 2,
+    'Quer_Max': 0,
+    'Quer_Min': 0,
+}
+COMPARATORS = ('>', '<', '>=', '<=', '==')
+PARAMETER_TYPES = frozenset({'constant', 'timeseries_ref', 'expression', 'string', 'percentage', 'loss_factor'})
+# Parameters whose value is a number
+NUMERIC_PARAMETER_TYPES = frozenset({'constant', 'percentage', 'loss_factor'})
+# Parameters that name a metered series instead of an input binding (see resolve_parameters)
+METERING_POINT_TYPES = frozenset({'obis_code', 'metering_point_ref'})
+
+# Bound float columns of a plan, indexed by slot (bind_inputs)
+InputData = List[List[float]]
+
+
+class Evaluation:
+    """
+    Per-calculation evaluation state
+
+    Subtrees that occur more than once in a plan (the same hash-consed node)
+    are evaluated once per interval; further occurrences reuse the value. With
+    timed=True every expression node also records [calls, shared hits,
+    inclusive seconds], keyed by id() of the node, for the metrics endpoint
+    and calculation profiles.
+    """
+
+    def __init__(self, expression: Dict[str, Any], timed: bool = False,
+                 shared: Optional[Dict[int, str]] = None):
+        self.shared = shared_nodes(expression) if shared is None else shared
+        self.memo: Dict[str, float] = {}
+        self.nodes: Optional[Dict[int, List[float]]] = {} if timed else None
+
+    def node_stats(self, expr: Dict[str, Any]) -> List[float]:
+        stats = self.nodes.get(id(expr))
+        if stats is None:
+            stats = self.nodes[id(expr)] = [0, 0, 0.0]
+        return stats
+
+
+def nested_expression(param: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The expression nested in a parameter, or None for a plain parameter
+
+    Nested expressions come wrapped ({"type": "expression", "value": {...}}) or
+    bare ({"function": ..., "parameters": [...]}), as the Python client
+    serializes FormulaExpression parameters.
+    """
+    if param.get('type') == 'expression':
+        return param['value']
+    if 'type' not in param and 'function' in param:
+        return param
+    return None
+
+
+def iter_expressions(expression: Dict[str, Any]):
+    """Yield an expression and all nested expressions, depth first"""
+    yield expression
+    for param in expression.get('parameters', []):
+        nested = nested_expression(param)
+        if nested is not None:
+            yield from iter_expressions(nested)
+
+
+def count_nodes(expression: Dict[str, Any]) -> int:
+    """Static size of a formula: function nodes plus their plain parameters"""
+    return sum(1 + sum(1 for param in node.get('parameters', []) if nested_expression(param) is None)
+               for node in iter_expressions(expression))
+
+
+# ==================== FORMULA PLANS ====================
+
+class FormulaPlan:
+    """
+    Compiled form shared by all formulas of one canonical shape
+
+    expression is the canonical expression: plain parameters reduced to
+    type/value/scalingFactor, nested expressions wrapped, arguments of
+    commutative functions sorted and time series references replaced by
+    slots '$0', '$1', ... in order of first use; a reference also carries its
+    slot index as 'slot'. Nodes are hash-consed, so identical subtrees are
+    one object (see shared_nodes).
+    """
+
+    def __init__(self, key: str, expression: Dict[str, Any], slots: int):
+        self.key = key
+        self.expression = expression
+        self.slots = slots
+        self.nodes = count_nodes(expression)
+        self.errors = validate_expression(expression)
+
+
+class PlanRegistry:
+    """Interned formula plans (one per canonical shape) and their hash-consed nodes"""
+
+    def __init__(self):
+        self._plans: Dict[str, FormulaPlan] = {}
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+        self._node_keys: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def get(self, key: str) -> Optional[FormulaPlan]:
+        return self._plans.get(key)
+
+    def intern(self, expression: Dict[str, Any]) -> Tuple[FormulaPlan, List[str]]:
+        """
+        Plan of an expression and its bindings
+
+        bindings[k] is the time series reference bound to slot '$k'.
+        """
+        plan, bindings, _ = self._intern(expression, None)
+        return plan, bindings
+
+    def trace(self, expression: Dict[str, Any]) -> Tuple[FormulaPlan, List[str], List[Dict[str, Any]]]:
+        """
+        intern() plus the plan node of every function node of expression
+
+        The nodes are in iter_expressions order of expression, so a profile
+        can follow the expression as given while reading the statistics of
+        the canonical plan nodes (see build_profile).
+        """
+        return self._intern(expression, [])
+
+    def _intern(self, expression: Dict[str, Any],
+                trace: Optional[List[Dict[str, Any]]]) -> Tuple[FormulaPlan, List[str], List[Dict[str, Any]]]:
+        with self._lock:
+            slots: Dict[str, int] = {}
+            interned: Optional[Dict[int, Dict[str, Any]]] = {} if trace is not None else None
+            key, canonical = _bind_slots(_sort_commutative(expression, trace)[1], slots, self._cons, interned)
+            plan = self._plans.get(key)
+            if plan is None:
+                plan = self._plans[key] = FormulaPlan(key, canonical, len(slots))
+            nodes = [interned[id(node)] for node in trace] if trace is not None else []
+            return plan, list(slots), nodes
+
+    def _cons(self, node: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        # Nested expressions are interned already, so their key stands in for their content
+        shape = [node['function']]
+        for param in node['parameters']:
+            if param['type'] == 'expression':
+                shape.append(self._node_keys[id(param['value'])])
+            else:
+                shape.append(json.dumps(param, sort_keys=True))
+        key = hashlib.sha1('\x1f'.join(shape).encode('utf-8')).hexdigest()
+        interned = self._nodes.get(key)
+        if interned is None:
+            interned = self._nodes[key] = node
+            self._node_keys[id(node)] = key
+        return key, interned
+
+
+def _plain_parameter(param: Dict[str, Any]) -> Dict[str, Any]:
+    plain = {'type': param.get('type', 'constant'), 'value': param.get('value')}
+    if param.get('scalingFactor') is not None:
+        plain['scalingFactor'] = param['scalingFactor']
+    return plain
+
+
+def _sort_commutative(expression: Dict[str, Any],
+                      trace: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    (shape without reference names, normalized expression with commutative arguments sorted)
+
+    trace, if given, receives the normalized node of every function node in
+    iter_expressions order of the input expression.
+    """
+    if trace is not None:
+        position = len(trace)
+        trace.append(None)
+    parameters = []
+    for param in expression.get('parameters', []):
+        nested = nested_expression(param)
+        if nested is not None:
+            shape, node = _sort_commutative(nested, trace)
+            parameters.append((shape, {'type': 'expression', 'value': node}))
+            continue
+        plain = _plain_parameter(param)
+        if plain['type'] == 'timeseries_ref':
+            shape = json.dumps(dict(plain, value=None), sort_keys=True)
+        else:
+            shape = json.dumps(plain, sort_keys=True)
+        parameters.append((shape, plain))
+
+    function = expression.get('function')
+    if function in COMMUTATIVE_FUNCTIONS:
+        parameters.sort(key=lambda item: item[0])
+    shape = '%s(%s)' % (function, ','.join(shape for shape, _ in parameters))
+    node = {'function': function, 'parameters': [param for _, param in parameters]}
+    if trace is not None:
+        trace[position] = node
+    return shape, node
+
+
+def _bind_slots(expression: Dict[str, Any], slots: Dict[str, int],
+                cons: Callable[[Dict[str, Any]], Tuple[str, Dict[str, Any]]],
+                interned: Optional[Dict[int, Dict[str, Any]]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Replace references by slots in order of first use and intern the nodes bottom-up
+
+    interned, if given, maps id() of every normalized node to its interned node.
+    """
+    parameters = []
+    for param in expression['parameters']:
+        if param['type'] == 'expression':
+            param = {'type': 'expression', 'value': _bind_slots(param['value'], slots, cons, interned)[1]}
+        elif param['type'] == 'timeseries_ref':
+            slot = slots.setdefault(param['value'], len(slots))
+            param = dict(param, value=f'${slot}', slot=slot)
+        parameters.append(param)
+    key, node = cons({'function': expression['function'], 'parameters': parameters})
+    if interned is not None:
+        interned[id(expression)] = node
+    return key, node
+
+
+def shared_nodes(expression: Dict[str, Any]) -> Dict[int, str]:
+    """
+    Evaluation.shared for a plan expression: nodes occurring more than once
+
+    Hash-consed subtrees are the same object, so counting id()s finds them
+    without comparing subtree contents. Counted per evaluation, as ids
+    change when a plan is pickled to an executor process (pickle keeps the
+    sharing itself).
+    """
+    counts: Dict[int, int] = {}
+    for node in iter_expressions(expression):
+        counts[id(node)] = counts.get(id(node), 0) + 1
+    return {node_id: f'#{node_id}' for node_id, count in counts.items() if count > 1}
+
+
+def validate_expression(expression: Dict[str, Any]) -> List[str]:
+    """Problems that make an expression evaluate differently than written (empty if valid)"""
+    errors = []
+    for node in iter_expressions(expression):
+        function = node.get('function')
+        parameters = node.get('parameters', [])
+        if function not in FUNCTION_ARITY:
+            errors.append(f'Unknown function {function!r} (evaluates to 0)')
+            continue
+        if len(parameters) < FUNCTION_ARITY[function]:
+            errors.append(f'{function} needs at least {FUNCTION_ARITY[function]} parameters, got {len(parameters)}')
+            continue
+        for param in parameters:
+            if nested_expression(param) is None and param.get('type', 'constant') not in PARAMETER_TYPES:
+                errors.append(f"{function}: unsupported parameter type {param.get('type')!r} (evaluates to 0)")
+        if function == 'Wenn_Dann' and parameters[1].get('value') not in COMPARATORS:
+            errors.append(f"Wenn_Dann: unknown comparator {parameters[1].get('value')!r}")
+        elif function in ('Anteil_Groesser_Als', 'Anteil_Kleiner_Als'):
+            if parameters[0].get('type') != 'timeseries_ref':
+                errors.append(f'{function}: first parameter must be a timeseries_ref')
+            if not isinstance(parameters[1].get('value'), (int, float)):
+                errors.append(f'{function}: threshold must be a numeric constant')
+    return errors
+
+
+# ==================== PARAMETER RESOLUTION ====================
+
+def metering_point_key(metering_point_id: str, obis_code: Optional[str]) -> str:
+    """Reference name of the series a metering point measures for an OBIS code"""
+    return f"{metering_point_id}|{obis_code or ''}"
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def resolve_parameters(expression: Dict[str, Any], metering_points: Optional[List[Dict[str, Any]]] = None,
+                       loss_factor: Optional[float] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Rewrite typed parameters into the constants and references plans evaluate
+
+    Applied once when a formula is compiled, so evaluation never sees them:
+
+        percentage          constant value / 100 (0.49 -> 0.0049)
+        loss_factor         value (1 - fVerluste, e.g. 0.9951; without a value
+                            1 - the formula's lossFactor). In an aggregation
+                            (Grp_Sum, Quer_Max, Quer_Min) folded into the
+                            scalingFactor of the time series references beside
+                            it, elsewhere the constant at its position
+        metering_point_ref  reference metering_point_key(value, obisCode); the
+                            OBIS code defaults to the one listed for the
+                            metering point in inputMeteringPoints
+        obis_code           reference to the metering point of
+                            inputMeteringPoints with that OBIS code
+
+    metering_points are the formula's inputMeteringPoints (meteringPointId or
+    id, obisCode). Calculations bind the references like any other, through
+    inputTimeSeries or the server's metering point index.
+
+    Returns:
+        (resolved expression, problems); a parameter that cannot be resolved
+        is left unchanged and reported
+    """
+    obis_by_point: Dict[str, Optional[str]] = {}
+    points_by_obis: Dict[str, List[str]] = {}
+    for point in metering_points or []:
+        point_id = point.get('meteringPointId') or point.get('id')
+        if point_id:
+            obis_by_point[point_id] = point.get('obisCode')
+            points_by_obis.setdefault(point.get('obisCode'), []).append(point_id)
+    errors: List[str] = []
+
+    def resolve(param: Dict[str, Any]) -> Dict[str, Any]:
+        param_type = param.get('type')
+        if param_type == 'percentage':
+            value = _number(param.get('value'))
+            if value is None:
+                errors.append(f"Percentage {param.get('name')!r} needs a numeric value")
+                return param
+            return dict(param, type='constant', value=value / 100)
+        if param_type == 'metering_point_ref':
+            point_id = param.get('value')
+            obis_code = param.get('obisCode') or obis_by_point.get(point_id)
+            return dict(param, type='timeseries_ref', value=metering_point_key(point_id, obis_code))
+        if param_type == 'obis_code':
+            candidates = points_by_obis.get(param.get('value'), [])
+            if len(candidates) != 1:
+                errors.append(f"OBIS code {param.get('value')!r} matches {len(candidates)} of the formula's "
+                              f"inputMeteringPoints; use a metering_point_ref instead")
+                return param
+            return dict(param, type='timeseries_ref', value=metering_point_key(candidates[0], param['value']))
+        return param
+
+    def rebuild(expr: Dict[str, Any]) -> Dict[str, Any]:
+        parameters = []
+        multiplier = 1.0
+        loss_params = []
+        for param in expr.get('parameters', []):
+            nested = nested_expression(param)
+            if nested is not None:
+                node = rebuild(nested)
+                parameters.append(dict(param, value=node) if nested is not param else node)
+            elif param.get('type') == 'loss_factor':
+                if param.get('value') is not None:
+                    value = _number(param['value'])
+                else:
+                    value = 1 - loss_factor if _number(loss_factor) is not None else None
+                if value is None:
+                    errors.append(f"Loss factor {param.get('name')!r} needs a numeric value or the formula's lossFactor")
+                    parameters.append(param)
+                    continue
+                if expr.get('function') not in AGGREGATE_FUNCTIONS:
+                    # Positional arguments keep their place; functions like Wenn_Dann read it as a number
+                    parameters.append(dict(param, type='constant', value=value))
+                    continue
+                multiplier *= value
+                loss_params.append(param)
+            else:
+                parameters.append(resolve(param))
+
+        if loss_params:
+            references = [idx for idx, param in enumerate(parameters) if param.get('type') == 'timeseries_ref']
+            if not references:
+                errors.append(f"{expr.get('function')}: loss factor without a time series reference to apply to")
+                parameters.extend(loss_params)
+            for idx in references:
+                scaling_factor = parameters[idx].get('scalingFactor')
+                parameters[idx] = dict(parameters[idx], scalingFactor=(
+                    scaling_factor if scaling_factor is not None else 1.0) * multiplier)
+        return dict(expr, parameters=parameters)
+
+    return rebuild(expression), errors
+
+
+class BindingError(ValueError):
+    """Time series references of a formula without a bound input series"""
+
+    def __init__(self, missing: List[str]):
+        super().__init__('No input time series bound to ' + ', '.join(repr(name) for name in missing))
+        self.missing = missing
+
+
+def bind_inputs(bindings: List[str], input_data: Dict[str, List[Dict]], count: int) -> List[List[float]]:
+    """
+    Quantities of the bound series as float columns, indexed by slot
+
+    Resolved once per calculation, so evaluation reads columns[slot][idx]
+    instead of looking up and parsing quantities per interval and node.
+    Columns are cut or padded with 0.0 to count intervals.
+
+    Raises:
+        BindingError: A referenced series is missing from input_data
+    """
+    missing = [name for name in bindings if name not in input_data]
+    if missing:
+        raise BindingError(missing)
+    columns = []
+    for name in bindings:
+        column = [float(interval['quantity']) for interval in input_data[name][:count]]
+        column.extend([0.0] * (count - len(column)))
+        columns.append(column)
+    return columns
+
+
+def calculate_plan(expression: Dict[str, Any], columns: List[List[float]], count: int,
+                   evaluation: Optional[Evaluation] = None,
+                   timestamps: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Evaluate a plan expression on bound columns (see bind_inputs)
+
+    Args:
+        expression: FormulaPlan.expression
+        columns: Float column per slot
+        count: Number of intervals
+        evaluation: Optional evaluation state (shared subtrees, timing)
+        timestamps: Intervals whose start/end the results copy (irregular inputs)
+
+    Returns:
+        List of calculated intervals
+    """
+    result_intervals = []
+    for i in range(count):
+        if evaluation is not None:
+            evaluation.memo.clear()
+        result_interval = {
+            'position': i + 1,
+            'quantity': f"{execute_expression(expression, columns, i, evaluation):.3f}",
+            'quality': 'VALIDATED'
+        }
+        if timestamps is not None:
+            result_interval['start'] = timestamps[i]['start']
+            result_interval['end'] = timestamps[i]['end']
+        result_intervals.append(result_interval)
+    return result_intervals
+
+
+# ==================== SCENARIOS ====================
+
+def apply_overrides(expression: Dict[str, Any], overrides: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Copy of an expression with parameter values replaced, for what-if variants
+
+    overrides maps a parameter name to {'value': number} (constants,
+    percentages and loss factors) and/or {'scalingFactor': number}; every
+    parameter of that name changes. Apply before resolve_parameters, so a
+    loss factor override is folded like a submitted one.
+
+    Raises:
+        ValueError: Unknown parameter name or an override the parameter cannot take
+    """
+    for name, override in overrides.items():
+        if not isinstance(override, dict) or not override or set(override) - {'value', 'scalingFactor'}:
+            raise ValueError(f'Override of {name!r} needs value and/or scalingFactor')
+        for field, number in override.items():
+            if isinstance(number, bool) or not isinstance(number, (int, float)):
+                raise ValueError(f'Override of {name!r}: {field} must be a number')
+
+    applied = set()
+
+    def rebuild(expr: Dict[str, Any]) -> Dict[str, Any]:
+        parameters = []
+        for param in expr.get('parameters', []):
+            nested = nested_expression(param)
+            if nested is not None:
+                node = rebuild(nested)
+                parameters.append(dict(param, value=node) if nested is not param else node)
+                continue
+            override = overrides.get(param.get('name'))
+            if override is not None:
+                if 'value' in override and param.get('type', 'constant') not in NUMERIC_PARAMETER_TYPES:
+                    raise ValueError(f"Parameter {param['name']!r} is a {param.get('type')}; only "
+                                     f"constants, percentages and loss factors take a value override")
+                param = dict(param, **override)
+                applied.add(param['name'])
+            parameters.append(param)
+        return dict(expr, parameters=parameters)
+
+    result = rebuild(expression)
+    unknown = [name for name in overrides if name not in applied]
+    if unknown:
+        raise ValueError('No parameter named ' + ', '.join(repr(name) for name in unknown))
+    return result
+
+
+def calculate_sweep(expressions: List[Dict[str, Any]], columns: List[List[float]], count: int) -> List[List[float]]:
+    """
+    Evaluate variants of one plan on the same bound columns (variants × intervals)
+
+    All expressions must come from one PlanRegistry with the same bindings.
+    Subtrees a variant does not change are the same interned node in every
+    variant, so they are evaluated once per interval for all variants.
+    """
+    counts: Dict[int, int] = {}
+    for expression in expressions:
+        for node in iter_expressions(expression):
+            counts[id(node)] = counts.get(id(node), 0) + 1
+    shared = {node_id: f'#{node_id}' for node_id, uses in counts.items() if uses > 1}
+    evaluation = Evaluation(expressions[0], shared=shared) if shared else None
+
+    rows: List[List[float]] = [[] for _ in expressions]
+    for i in range(count):
+        if evaluation is not None:
+            evaluation.memo.clear()
+        for row, expression in zip(rows, expressions):
+            row.append(execute_expression(expression, columns, i, evaluation))
+    return rows
+
+
+def function_timings(expression: Dict[str, Any], evaluation: Evaluation) -> Dict[str, List[float]]:
+    """Aggregate node statistics per function name: [evaluations, inclusive seconds]"""
+    timings: Dict[str, List[float]] = {}
+    for node in iter_expressions(expression):
+        stats = evaluation.nodes.get(id(node))
+        if stats is None:
+            continue
+        entry = timings.setdefault(node['function'], [0, 0.0])
+        entry[0] += stats[0] - stats[1]
+        entry[1] += stats[2]
+    return timings
+
+
+def build_profile(expr: Dict[str, Any], resolved: Dict[str, Any], nodes: List[Dict[str, Any]],
+                  evaluation: Evaluation, columns: InputData, bindings: List[str]) -> Dict[str, Any]:
+    """
+    Copy of a submitted expression annotated with the node statistics of an evaluation
+
+    expr is the expression as submitted, resolved the same expression after
+    resolve_parameters and nodes the plan nodes of its function nodes
+    (PlanRegistry.trace), so the profile keeps the submitted shape: parameter
+    names and order, bare or wrapped nesting. Every expression node gets a
+    'profile' with calls, evaluations, sharedHits (value reused from an
+    identical subtree), inclusive totalMs and selfMs (without nested
+    expressions), and the distinct series it reads directly with their
+    intervals. Time series references (metering point and OBIS references
+    included) are annotated with the interval count of their bound series.
+
+    An identical subtree is evaluated by one plan node, so its statistics
+    cover all of its occurrences: they are reported at the first one only,
+    later occurrences get 'profile': {'sharedReference': True} and add no
+    time to their parent. Summing totalMs over a profile counts each plan
+    node once.
+    """
+    slots = {name: slot for slot, name in enumerate(bindings)}
+    return _annotate_node(expr, resolved, iter(nodes), evaluation, columns, slots, set())
+
+
+def _annotate_node(expr: Dict[str, Any], resolved: Dict[str, Any], nodes: Iterator[Dict[str, Any]],
+                   evaluation: Evaluation, columns: InputData, slots: Dict[str, int],
+                   seen: Set[int]) -> Dict[str, Any]:
+    node_id = id(next(nodes))
+    reference = node_id in seen
+    seen.add(node_id)
+    calls, shared_hits, seconds = evaluation.nodes.get(node_id, [0, 0, 0.0])
+    parameters = []
+    nested_ms = 0.0
+    read_slots = set()
+
+    resolved_params = resolved.get('parameters', [])
+    position = 0
+    for param in expr.get('parameters', []):
+        # Loss factors folded into the references of an aggregation have no resolved counterpart
+        if (param.get('type') == 'loss_factor' and resolved.get('function') in AGGREGATE_FUNCTIONS
+                and (position >= len(resolved_params) or resolved_params[position] is not param)):
+            parameters.append(param)
+            continue
+        counterpart = resolved_params[position]
+        position += 1
+
+        nested_expr = nested_expression(param)
+        if nested_expr is not None:
+            nested = _annotate_node(nested_expr, nested_expression(counterpart), nodes, evaluation, columns, slots,
+                                    seen)
+            nested_ms += nested['profile'].get('totalMs', 0.0)
+            parameters.append(dict(param, value=nested) if nested_expr is not param else nested)
+        elif counterpart.get('type') == 'timeseries_ref':
+            slot = slots.get(counterpart['value'])
+            if slot is not None:
+                read_slots.add(slot)
+            intervals = len(columns[slot]) if slot is not None else 0
+            parameters.append(dict(param, profile={'intervals': intervals, 'found': slot is not None}))
+        else:
+            parameters.append(param)
+
+    annotated = dict(expr, parameters=parameters)
+    if reference:
+        annotated['profile'] = {'sharedReference': True}
+        return annotated
+
+    total_ms = round(seconds * 1000, 3)
+    annotated['profile'] = {
+        'calls': calls,
+        'evaluations': calls - shared_hits,
+        'sharedHits': shared_hits,
+        'totalMs': total_ms,
+        'selfMs': round(max(total_ms - nested_ms, 0.0), 3),
+        'inputSeries': len(read_slots),
+        'inputIntervals': sum(len(columns[slot]) for slot in read_slots)
+    }
+    return annotated
+
+
+def execute_expression(expr: Dict[str, Any], input_data: InputData, interval_idx: int,
+                       evaluation: Optional[Evaluation] = None) -> float:
+    """Execute a formula expression for a specific interval"""
+    if evaluation is None:
+        return _evaluate_function(expr, input_data, interval_idx, None)
+
+    shared_key = evaluation.shared.get(id(expr))
+    if shared_key is not None and shared_key in evaluation.memo:
+        if evaluation.nodes is not None:
+            stats = evaluation.node_stats(expr)
+            stats[0] += 1
+            stats[1] += 1
+        return evaluation.memo[shared_key]
+
+    if evaluation.nodes is None:
+        value = _evaluate_function(expr, input_data, interval_idx, evaluation)
+    else:
+        # Inclusive time of this node, nested expressions included
+        started = time.perf_counter()
+        value = _evaluate_function(expr, input_data, interval_idx, evaluation)
+        stats = evaluation.node_stats(expr)
+        stats[0] += 1
+        stats[2] += time.perf_counter() - started
+
+    if shared_key is not None:
+        evaluation.memo[shared_key] = value
+    return value
+
+
+def _evaluate_function(expr: Dict[str, Any], input_data: InputData, interval_idx: int,
+                       evaluation: Optional[Evaluation]) -> float:
+    function_name = expr['function']
+    parameters = expr['parameters']
+
+    if function_name == 'Wenn_Dann':
+        # If-Then-Else logic
+        line_a = get_parameter_value(parameters[0], input_data, interval_idx, evaluation)
+        comparator = parameters[1]['value']
+        line_b = get_parameter_value(parameters[2], input_data, interval_idx, evaluation)
+        then_value = get_parameter_value(parameters[3], input_data, interval_idx, evaluation)
+        else_value = get_parameter_value(parameters[4], input_data, interval_idx, evaluation)
+
+        if comparator == '>':
+            return then_value if line_a > line_b else else_value
+        elif comparator == '<':
+            return then_value if line_a < line_b else else_value
+        elif comparator == '>=':
+            return then_value if line_a >= line_b else else_value
+        elif comparator == '<=':
+            return then_value if line_a <= line_b else else_value
+        elif comparator == '==':
+            return then_value if line_a == line_b else else_value
+        else:
+            return else_value
+
+    elif function_name == 'Grp_Sum':
+        # Sum multiple time series with optional scaling factors; fsum is exact,
+        # so the result does not depend on the argument order
+        return math.fsum([get_parameter_value(param, input_data, interval_idx, evaluation)
+                          for param in parameters])
+
+    elif function_name == 'Anteil_Groesser_Als':
+        # Portion above threshold
+        value = _series_value(parameters[0], input_data, interval_idx)
+        threshold = parameters[1]['value']
+        return value if value is not None and value > threshold else 0.0
+
+    elif function_name == 'Anteil_Kleiner_Als':
+        # Portion below threshold
+        value = _series_value(parameters[0], input_data, interval_idx)
+        threshold = parameters[1]['value']
+        return value if value is not None and value < threshold else 0.0
+
+    elif function_name == 'Quer_Max':
+        # Maximum across series
+        values = [get_parameter_value(param, input_data, interval_idx, evaluation) for param in parameters]
+        return max(values) if values else 0.0
+
+    elif function_name == 'Quer_Min':
+        # Minimum across series
+        values = [get_parameter_value(param, input_data, interval_idx, evaluation) for param in parameters]
+        return min(values) if values else 0.0
+
+    else:
+        # Default: return 0
+        return 0.0
+
+
+def _series_value(param: Dict[str, Any], input_data: InputData, interval_idx: int) -> Optional[float]:
+    """Unscaled value of a referenced series, None if the parameter is no reference"""
+    slot = param.get('slot')
+    return input_data[slot][interval_idx] if slot is not None else None
+
+
+def get_parameter_value(param: Dict[str, Any], input_data: InputData, interval_idx: int,
+                        evaluation: Optional[Evaluation] = None) -> float:
+    """Get parameter value for calculation"""
+    slot = param.get('slot')
+    if slot is not None:
+        # Time series reference: input_data are the bound columns
+        value = input_data[slot][interval_idx]
+        # Apply scaling factor if present (the Python client sends null when unset)
+        scaling_factor = param.get('scalingFactor')
+        return value * scaling_factor if scaling_factor is not None else value
+
+    param_type = param.get('type', 'constant')
+
+    if param_type == 'constant':
+        return float(param['value'])
+
+    elif param_type == 'expression':
+        # Nested expression
+        return execute_expression(param['value'], input_data, interval_idx, evaluation)
+
+    elif param_type == 'string':
+        # String values (like comparators) are handled separately
+        return 0.0
+
+    elif param_type == 'percentage':
+        return float(param['value']) / 100
+
+    elif param_type == 'loss_factor':
+        return float(param['value'])
+
+    else:
+        return 0.0
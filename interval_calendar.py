@@ -0,0 +1,207 @@
+"""
+MaBiS Time Series API - Intervallkalender
+
+Liefertage und Abrechnungsperioden sind in deutscher Ortszeit (Europe/Berlin)
+definiert, Zeitreihen werden dagegen in UTC übertragen. Ein Ortstag hat daher
+96 Viertelstunden, am Tag der Umstellung auf Sommerzeit 92 und am Tag der
+Umstellung auf Winterzeit 100.
+
+Der Kalender berechnet je Auflösung und Ortstag bzw. Ortsmonat einmalig die
+UTC-Grenzen, die Anzahl der Intervalle und die Positionsbereiche der Tage und
+hält sie im Cache; ebenso die Zeitstempel je UTC-Tag, aus denen längere
+Zeitstempel-Tabellen zusammengesetzt werden. Die
+Zuordnung Zeitraum → Intervallindex und die Zeitstempel der Intervalle sind
+danach Tabellenzugriffe. Genutzt von:
+
+    mock_api_server.py        Annahme (compact_time_series), Zeitraum einer
+                              Berechnung, Ausgabe (materialize_time_series)
+    data_generator.py         Kalender der erzeugten Zeitreihen
+    python-client-example.py  generate_15min_intervals
+
+Beispiel:
+    >>> month = local_month(2025, 3)
+    >>> month.count, month.days[29].count, month.days[29].positions()
+    (2972, 92, range(2785, 2877))
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+DEFAULT_TIMEZONE = 'Europe/Berlin'
+
+# Fixed-length resolutions: interval timestamps of a regular series are fully
+# determined by the first interval start and the position
+RESOLUTION_SECONDS = {
+    'PT1M': 60,
+    'PT5M': 300,
+    'PT15M': 900,
+    'PT30M': 1800,
+    'PT1H': 3600,
+}
+
+
+class Span(NamedTuple):
+    """
+    Contiguous intervals of one resolution on the UTC timeline
+
+    start / end are UTC epoch seconds of the first interval start and of the
+    end of the last interval. first_position is the position of the first
+    interval within the enclosing span (1 for a day on its own); a month
+    lists its local days in days, numbered relative to the month.
+    """
+    start: int
+    end: int
+    step: int
+    count: int
+    first_position: int = 1
+    days: Tuple['Span', ...] = ()
+
+    def positions(self) -> range:
+        """Positions of the intervals within the enclosing span"""
+        return range(self.first_position, self.first_position + self.count)
+
+    def timestamps(self) -> Tuple[str, ...]:
+        """Interval boundaries as ISO strings (count + 1 entries)"""
+        return interval_timestamps(self.start, self.step, self.count)
+
+    def period_indices(self, period_start: int, period_end: int) -> Tuple[int, int]:
+        """Index range [first, stop) of a period within this span"""
+        return period_indices(self.start, self.step, self.count, period_start, period_end)
+
+
+# ==================== TIMESTAMPS ====================
+
+def _iso_utc(epoch_seconds: int) -> str:
+    return datetime.fromtimestamp(epoch_seconds, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+@lru_cache(maxsize=1 << 16)
+def format_utc_instant(epoch_seconds: int) -> str:
+    """Format UTC epoch seconds as ISO 8601 with 'Z' suffix (cached per instant)"""
+    return _iso_utc(epoch_seconds)
+
+
+def parse_utc_instant(value: Any) -> Optional[int]:
+    """Parse an ISO 8601 timestamp to UTC epoch seconds, None if it cannot be parsed"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        return None
+    return int(parsed.timestamp())
+
+
+# Timestamp tables are cached per UTC day: a year of PT15M is about 35k
+# strings, so whole tables are assembled from the days they cover instead
+DAY_SECONDS = 86400
+
+
+@lru_cache(maxsize=366)
+def _day_timestamps(day: int, step: int, phase: int) -> Tuple[str, ...]:
+    """ISO strings of the instants day * DAY_SECONDS + phase + k * step within that UTC day"""
+    first = day * DAY_SECONDS + phase
+    return tuple(_iso_utc(first + idx * step) for idx in range((DAY_SECONDS - phase + step - 1) // step))
+
+
+def interval_timestamps(start: int, step: int, count: int) -> Tuple[str, ...]:
+    """
+    Boundaries start, start + step, ... of count intervals as ISO strings
+
+    Interval idx runs from entry idx to entry idx + 1. The strings come from
+    per-day tables shared by all series on the same grid.
+    """
+    if DAY_SECONDS % step:
+        return tuple(_iso_utc(start + idx * step) for idx in range(count + 1))
+    boundaries = []
+    instant, last = start, start + count * step
+    while instant <= last:
+        day, offset = divmod(instant, DAY_SECONDS)
+        table = _day_timestamps(day, step, offset % step)
+        first = offset // step
+        taken = table[first:first + (last - instant) // step + 1]
+        boundaries.extend(taken)
+        instant += len(taken) * step
+    return tuple(boundaries)
+
+
+# ==================== PERIODS ====================
+
+def resolution_step(resolution: str) -> int:
+    """Interval length in seconds of a fixed-length resolution"""
+    try:
+        return RESOLUTION_SECONDS[resolution]
+    except KeyError:
+        raise ValueError(f'Unsupported resolution {resolution!r}') from None
+
+
+def boundary_index(start: int, step: int, count: int, instant: int) -> int:
+    """Index of the interval boundary at instant (0 .. count); ValueError if it is none"""
+    index, offset = divmod(instant - start, step)
+    if offset or not 0 <= index <= count:
+        raise ValueError(f'{format_utc_instant(instant)} is not an interval boundary between '
+                         f'{format_utc_instant(start)} and {format_utc_instant(start + count * step)}')
+    return index
+
+
+def period_indices(start: int, step: int, count: int, period_start: int, period_end: int) -> Tuple[int, int]:
+    """
+    Index range [first, stop) of the intervals a period covers on a regular timeline
+
+    Raises ValueError when a bound is not an interval boundary of the timeline
+    or the period is empty.
+    """
+    first = boundary_index(start, step, count, period_start)
+    stop = boundary_index(start, step, count, period_end)
+    if stop <= first:
+        raise ValueError(f'Period end {format_utc_instant(period_end)} is not after its start '
+                         f'{format_utc_instant(period_start)}')
+    return first, stop
+
+
+# ==================== LOCAL DAYS ====================
+
+@lru_cache(maxsize=4096)
+def local_midnight(day: date, tz_name: str = DEFAULT_TIMEZONE) -> int:
+    """UTC epoch seconds of local midnight starting day"""
+    return int(datetime.combine(day, datetime.min.time(), ZoneInfo(tz_name)).timestamp())
+
+
+def local_date(instant: int, tz_name: str = DEFAULT_TIMEZONE) -> date:
+    """Local calendar day of a UTC instant"""
+    return datetime.fromtimestamp(instant, ZoneInfo(tz_name)).date()
+
+
+@lru_cache(maxsize=4096)
+def local_day(day: date, resolution: str = 'PT15M', tz_name: str = DEFAULT_TIMEZONE) -> Span:
+    """Intervals of one local delivery day (local midnight to local midnight)"""
+    step = resolution_step(resolution)
+    start = local_midnight(day, tz_name)
+    end = local_midnight(day + timedelta(days=1), tz_name)
+    return Span(start, end, step, (end - start) // step)
+
+
+@lru_cache(maxsize=32)
+def local_days(first_day: date, days: int, resolution: str = 'PT15M',
+               tz_name: str = DEFAULT_TIMEZONE) -> Span:
+    """Intervals of consecutive local days; days lists each day with its position range"""
+    step = resolution_step(resolution)
+    spans = []
+    position = 1
+    for offset in range(days):
+        span = local_day(first_day + timedelta(days=offset), resolution, tz_name)
+        spans.append(span._replace(first_position=position))
+        position += span.count
+    return Span(spans[0].start, spans[-1].end, step, position - 1, days=tuple(spans))
+
+
+@lru_cache(maxsize=32)
+def local_month(year: int, month: int, resolution: str = 'PT15M', tz_name: str = DEFAULT_TIMEZONE) -> Span:
+    """Intervals of a local calendar month (settlement period); days[d - 1] is day d"""
+    first_day = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return local_days(first_day, (next_month - first_day).days, resolution, tz_name)
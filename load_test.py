@@ -0,0 +1,296 @@
+"""
+MaBiS Time Series API - Lastgenerator
+
+Spielt den Ablauf von demo_client.py (Authentifizierung → Zeitreihen → Formel →
+Berechnung → Ergebnis abrufen) mit vielen gleichzeitigen virtuellen
+Messstellenbetreibern (MSB) gegen einen laufenden Server ab. Die Last wird in
+Stufen gesteigert: Stufe k von K nutzt k/K der MSB und k/K der Ziel-Rate.
+
+Je Stufe und Endpunkt werden Durchsatz, Latenzen (p50/p95/p99) und Fehlerquote
+ausgegeben. Die erste Stufe, die die Ziel-Rate nicht mehr erreicht oder mehr als
+1 % Fehler liefert, wird als Sättigungspunkt gemeldet.
+
+Verwendung:
+    python mock_api_server.py --workers 4
+    python load_test.py --users 50 --rate 400 --steps 5 --step-duration 20
+    python load_test.py --users 20 --rate 0 --steps 1 --json load.json   # ohne Ratenbegrenzung
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmark_servers import percentile
+from demo_client import MaBiSDemoClient
+
+# A stage counts as saturated below this share of its target rate or above this error rate
+SATURATION_THROUGHPUT_SHARE = 0.9
+SATURATION_ERROR_RATE = 0.01
+
+
+class RateLimiter:
+    """Spaces requests of all virtual MSBs evenly at a target rate (0 = unlimited)"""
+
+    def __init__(self):
+        self.rate = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self.rate = rate
+            self._next_slot = time.perf_counter()
+
+    def wait(self):
+        with self._lock:
+            if not self.rate:
+                return
+            now = time.perf_counter()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LoadRun:
+    """Shared state of a run: current stage, active MSBs and the recorded samples"""
+
+    def __init__(self, base_url: str, poll_timeout: float):
+        self.base_url = base_url
+        self.poll_timeout = poll_timeout
+        self.limiter = RateLimiter()
+        self.stage = 0
+        self.active_users = 0
+        self.stop = threading.Event()
+        # (stage, endpoint) -> latencies in seconds / error count
+        self.latencies: Dict[Tuple[int, str], List[float]] = defaultdict(list)
+        self.errors: Dict[Tuple[int, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage: int, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies[(stage, endpoint)].append(seconds)
+            if not ok:
+                self.errors[(stage, endpoint)] += 1
+
+
+class VirtualMsb:
+    """One virtual Messstellenbetreiber replaying the demo flow in a loop"""
+
+    def __init__(self, run: LoadRun, index: int):
+        self.run = run
+        self.index = index
+        self.session = requests.Session()
+        self.demo = MaBiSDemoClient(run.base_url)
+        # Payloads are built once; every iteration only renames the IDs
+        self.time_series_message = self.demo.build_time_series_message()
+        self.formula_message = self.demo.build_formula_message()
+        self.formula_message['formulas'][0]['formulaId'] += f"-VU{index:03d}"
+
+    def request(self, endpoint: str, method: str, path: str, ok_status: int, **kwargs) -> Optional[requests.Response]:
+        """Send one paced request and record its latency under the endpoint template"""
+        self.run.limiter.wait()
+        stage = self.run.stage
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.run.base_url + path, **dict({'timeout': 30}, **kwargs))
+        except requests.RequestException:
+            self.run.record(stage, endpoint, time.perf_counter() - started, False)
+            return None
+        self.run.record(stage, endpoint, time.perf_counter() - started, response.status_code == ok_status)
+        return response if response.status_code == ok_status else None
+
+    def run_flow(self, iteration: int) -> bool:
+        """authenticate → submit series → submit formula → calculate → fetch result"""
+        suffix = f"VU{self.index:03d}-{iteration}"
+
+        response = self.request('POST /oauth/token', 'POST', '/oauth/token', 200, data={
+            'grant_type': 'client_credentials',
+            'client_id': f'load-{self.index}',
+            'client_secret': 'load-secret'
+        })
+        if response is None:
+            return False
+        self.demo.token = response.json()['access_token']
+        headers = self.demo._get_headers()
+
+        time_series_message = dict(self.time_series_message, messageId=f"MSG-LOAD-{suffix}", timeSeries=[
+            dict(ts, timeSeriesId=f"{ts['timeSeriesId']}-{suffix}")
+            for ts in self.time_series_message['timeSeries']
+        ])
+        response = self.request('POST /v1/time-series', 'POST', '/v1/time-series', 201,
+                                headers=headers, json=time_series_message)
+        if response is None:
+            return False
+        ts_ids = response.json()['timeSeriesIds']
+
+        response = self.request('POST /v1/formulas', 'POST', '/v1/formulas', 201,
+                                headers=headers, json=self.formula_message)
+        if response is None:
+            return False
+        formula_id = response.json()['formulaIds'][0]
+
+        calculation_request = self.demo.build_calculation_request(formula_id, ts_ids)
+        calculation_request['calculationId'] = f"CALC-LOAD-{suffix}"
+        # Let the server generate the output ID so retention can evict old results
+        calculation_request.pop('outputTimeSeriesId', None)
+        response = self.request('POST /v1/calculations', 'POST', '/v1/calculations', 202,
+                                headers=headers, json=calculation_request)
+        if response is None:
+            return False
+        calculation_id = response.json()['calculationId']
+
+        # Long-poll: the server holds the request until the calculation finishes
+        deadline = time.perf_counter() + self.run.poll_timeout
+        while True:
+            remaining = max(0.0, deadline - time.perf_counter())
+            response = self.request('GET /v1/calculations/{id}', 'GET', f'/v1/calculations/{calculation_id}',
+                                    200, headers=headers, params={'wait': remaining}, timeout=remaining + 30)
+            if response is None:
+                return False
+            calculation = response.json()
+            if calculation['status'] in ('COMPLETED', 'FAILED'):
+                break
+            if time.perf_counter() > deadline:
+                return False
+
+        if 'outputTimeSeriesId' not in calculation:
+            return False
+        response = self.request('GET /v1/time-series/{id}', 'GET',
+                                f"/v1/time-series/{calculation['outputTimeSeriesId']}", 200, headers=headers)
+        return response is not None
+
+    def loop(self):
+        iteration = 0
+        while not self.run.stop.is_set():
+            if self.index >= self.run.active_users:
+                # Not yet ramped in
+                self.run.stop.wait(0.05)
+                continue
+            iteration += 1
+            self.run_flow(iteration)
+
+
+def stage_plan(users: int, rate: float, steps: int) -> List[Tuple[int, float]]:
+    """(active MSBs, target rate) per stage, increasing linearly to the full load"""
+    return [(max(1, math.ceil(users * step / steps)), rate * step / steps) for step in range(1, steps + 1)]
+
+
+def run_load(base_url: str, users: int, rate: float, steps: int, step_duration: float,
+             poll_timeout: float) -> Dict[str, Any]:
+    run = LoadRun(base_url, poll_timeout)
+    plan = stage_plan(users, rate, steps)
+    msbs = [VirtualMsb(run, idx) for idx in range(users)]
+    threads = [threading.Thread(target=msb.loop, daemon=True) for msb in msbs]
+    for thread in threads:
+        thread.start()
+
+    durations = []
+    try:
+        for stage, (active_users, target_rate) in enumerate(plan):
+            target = f"Ziel {target_rate:.0f} req/s" if target_rate else "unbegrenzt"
+            print(f"Stufe {stage + 1}/{len(plan)}: {active_users} MSB, {target}", flush=True)
+            run.stage = stage
+            run.active_users = active_users
+            run.limiter.set_rate(target_rate)
+            started = time.perf_counter()
+            time.sleep(step_duration)
+            durations.append(time.perf_counter() - started)
+    finally:
+        run.stop.set()
+        for thread in threads:
+            thread.join(timeout=poll_timeout + 30)
+
+    return build_report(run, plan, durations)
+
+
+def build_report(run: LoadRun, plan: List[Tuple[int, float]], durations: List[float]) -> Dict[str, Any]:
+    stages = []
+    saturation = None
+    for stage, ((active_users, target_rate), duration) in enumerate(zip(plan, durations)):
+        endpoints = {}
+        total_requests = 0
+        total_errors = 0
+        for (sample_stage, endpoint), values in sorted(run.latencies.items()):
+            if sample_stage != stage:
+                continue
+            values = sorted(values)
+            errors = run.errors.get((stage, endpoint), 0)
+            total_requests += len(values)
+            total_errors += errors
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': errors,
+                'error_rate': errors / len(values) if values else 0.0,
+                'throughput_rps': len(values) / duration if duration else 0.0,
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+            }
+
+        throughput = total_requests / duration if duration else 0.0
+        error_rate = total_errors / total_requests if total_requests else 0.0
+        saturated = (error_rate > SATURATION_ERROR_RATE
+                     or (target_rate and throughput < SATURATION_THROUGHPUT_SHARE * target_rate))
+        if saturated and saturation is None:
+            saturation = stage + 1
+        stages.append({
+            'stage': stage + 1,
+            'users': active_users,
+            'target_rps': target_rate,
+            'throughput_rps': throughput,
+            'error_rate': error_rate,
+            'saturated': bool(saturated),
+            'endpoints': endpoints,
+        })
+
+    return {'base_url': run.base_url, 'stages': stages, 'saturation_stage': saturation}
+
+
+def print_report(report: Dict[str, Any]):
+    print()
+    print(f"{'Stufe':<6} {'Endpunkt':<28} {'req/s':>8} {'Fehler':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print("-" * 82)
+    for stage in report['stages']:
+        for endpoint, stats in stage['endpoints'].items():
+            print(f"{stage['stage']:<6} {endpoint:<28} {stats['throughput_rps']:>8.1f} "
+                  f"{stats['error_rate']:>6.1%} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+        target = f"{stage['target_rps']:.0f}" if stage['target_rps'] else 'unbegrenzt'
+        marker = '  GESÄTTIGT' if stage['saturated'] else ''
+        print(f"{stage['stage']:<6} {'gesamt (' + str(stage['users']) + ' MSB)':<28} {stage['throughput_rps']:>8.1f} "
+              f"{stage['error_rate']:>6.1%}   Ziel: {target}{marker}")
+        print("-" * 82)
+
+    if report['saturation_stage'] is None:
+        print("Keine Sättigung erreicht.")
+    else:
+        print(f"Sättigung ab Stufe {report['saturation_stage']}.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load generator replaying the MaBiS demo flow')
+    parser.add_argument('--url', default='http://localhost:8000', help='Basis-URL des Servers')
+    parser.add_argument('--users', type=int, default=20, help='Virtuelle MSB bei voller Last')
+    parser.add_argument('--rate', type=float, default=200.0,
+                        help='Ziel-Rate in req/s bei voller Last (0 = unbegrenzt)')
+    parser.add_argument('--steps', type=int, default=5, help='Anzahl Laststufen')
+    parser.add_argument('--step-duration', type=float, default=10.0, help='Dauer je Stufe in Sekunden')
+    parser.add_argument('--poll-timeout', type=float, default=30.0,
+                        help='Maximale Wartezeit auf eine Berechnung in Sekunden')
+    parser.add_argument('--json', help='Ergebnisse zusätzlich als JSON-Datei schreiben')
+    args = parser.parse_args()
+
+    report = run_load(args.url, args.users, args.rate, args.steps, args.step_duration, args.poll_timeout)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
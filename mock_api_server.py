@@ -6,488 +6,1757 @@ Er speichert Daten im Speicher (nicht persistent) und führt echte Formelberechn
 
 Verwendung:
     python mock_api_server.py
+    python mock_api_server.py --workers 4   # mehrere Prozesse, gemeinsamer Store-Prozess
 
     Server läuft auf: http://localhost:5000
 """
 
 from __future__ import annotations
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Tuple, Union
+import argparse
+import hashlib
+import multiprocessing
+import os
+import socket
+import threading
+import time
 import uuid
 import json
-from decimal import Decimal
+import math
+import bisect
+from decimal import Decimal, InvalidOperation
+
+from formula_engine import (Evaluation, FormulaPlan, PlanRegistry, apply_overrides, bind_inputs, build_profile,
+                            calculate_plan, calculate_sweep, function_timings, metering_point_key,
+                            resolve_parameters, shared_nodes)
+from interval_calendar import (RESOLUTION_SECONDS, format_utc_instant, interval_timestamps, parse_utc_instant,
+                               period_indices)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS
+from store import (BUFFER_QUALITIES, TERMINAL_CALCULATION_STATUSES, CalculationEvents, LockedCollection,
+                   MeteringBuffers, RetentionTracker, TokenRegistry, connect_store, parse_store_address,
+                   start_store_process)
 
 app = Flask(__name__)
 
-# In-Memory Speicher
-time_series_store: Dict[str, Dict[str, Any]] = {}
-formula_store: Dict[str, Dict[str, Any]] = {}
-calculation_store: Dict[str, Dict[str, Any]] = {}
-
-# Mock OAuth2 Tokens
-valid_tokens = set()
+# In-Memory Speicher (thread-safe, ein Readers-Writer-Lock pro Collection)
+time_series_store = LockedCollection()
+formula_store = LockedCollection()
+calculation_store = LockedCollection()
+# Per-node evaluation profiles of calculations submitted with "profile": true
+profile_store = LockedCollection()
+
+# Messlokation|OBIS-Kennzahl (metering_point_key) -> {timeSeriesId: [start, end]} der
+# übermittelten Zeitreihen; bindet metering_point_ref-/obis_code-Parameter
+metering_point_index = LockedCollection()
+
+# Per Messlokation und OBIS-Kennzahl gepushte Messwerte (POST /v1/metering-points/{id}/values),
+# gepuffert je Liefertag; abgeschlossene Tage werden als Zeitreihe gespeichert
+metering_buffers = MeteringBuffers()
+# Umrechnung der Einheiten von Messwerten in kWh
+METERING_UNIT_FACTORS = {'KWH': 1.0, 'MWH': 1000.0}
+# Datenstatus eines Intervalls (PATCH /v1/time-series/{id})
+INTERVAL_STATUSES = ('CONFIRMED', 'ESTIMATED', 'PRELIMINARY', 'CORRECTED')
+
+# Kompilierte Formeln, eine je kanonischer Gestalt (pro Worker-Prozess)
+formula_plans = PlanRegistry()
+
+# Mock OAuth2 Tokens (mit Ablaufzeit)
+TOKEN_EXPIRES_IN = int(os.environ.get('MABIS_TOKEN_EXPIRES_IN', 3600))
+valid_tokens = TokenRegistry(max_tokens=int(os.environ.get('MABIS_MAX_TOKENS', 100_000)))
+
+# validate_token calls made while handling the current request (reported as X-Auth-Checks)
+auth_checks: ContextVar[int] = ContextVar('auth_checks', default=0)
+auth_check_totals = {'requests': 0, 'checks': 0}
+auth_check_lock = threading.Lock()
+
+# Aufbewahrung von Berechnungsergebnissen (TTL / Anzahl / Bytes, siehe RetentionTracker)
+retention = RetentionTracker.from_env()
+MEASURE_RESULT_BYTES = bool(os.environ.get('MABIS_CALC_MAX_BYTES'))
+# Verdrängte Ergebnisse werden hierhin ausgelagert und bei Bedarf wieder geladen
+SPILL_DIR = os.environ.get('MABIS_CALC_SPILL_DIR')
+
+# Status transitions of calculations for ?wait= long-polling and the event stream
+calculation_events = CalculationEvents()
+MAX_WAIT_SECONDS = float(os.environ.get('MABIS_MAX_WAIT_SECONDS', 30))
+EVENT_KEEPALIVE_SECONDS = 15
+
+# Mit MABIS_CALC_BACKGROUND=1 laufen Berechnungen in einem Thread-Pool;
+# POST /v1/calculations antwortet sofort mit PENDING
+CALC_BACKGROUND = os.environ.get('MABIS_CALC_BACKGROUND', '0') == '1'
+calculation_pools: Dict[str, ThreadPoolExecutor] = {}
+calculation_pool_lock = threading.Lock()
+
+# Zulassung von Berechnungen nach geschätzten Kosten (Knoten × Intervalle × Eingaben):
+# über MABIS_CALC_MAX_COST 422 (0 = unbegrenzt), über MABIS_CALC_LARGE_COST
+# in die Warteschlange 'large' mit MABIS_CALC_LARGE_WORKERS Workern
+CALC_MAX_COST = int(os.environ.get('MABIS_CALC_MAX_COST', 0))
+CALC_LARGE_COST = int(os.environ.get('MABIS_CALC_LARGE_COST', 1_000_000))
+CALC_LARGE_WORKERS = int(os.environ.get('MABIS_CALC_LARGE_WORKERS', 1))
+# Höchstzahl Varianten je Szenario-Berechnung (POST /v1/calculations/scenarios)
+SCENARIO_MAX_VARIANTS = int(os.environ.get('MABIS_SCENARIO_MAX_VARIANTS', 1000))
+
+# Shared store process for multi-worker serving (see store.py)
+STORE_ADDRESS = os.environ.get('MABIS_STORE_ADDRESS')
+STORE_AUTHKEY = os.environ.get('MABIS_STORE_AUTHKEY', 'mabis').encode()
 
 
 # ==================== HELPER FUNCTIONS ====================
 
+def use_shared_store(address: Any, authkey: bytes):
+    """Replace the in-process collections with proxies to a shared store process"""
+    global time_series_store, formula_store, calculation_store, profile_store, valid_tokens, retention
+    global calculation_events, metering_point_index, metering_buffers
+    shared = connect_store(address, authkey)
+    time_series_store = shared['time_series']
+    formula_store = shared['formulas']
+    calculation_store = shared['calculations']
+    profile_store = shared['profiles']
+    metering_point_index = shared['metering_points']
+    metering_buffers = shared['metering_buffers']
+    valid_tokens = shared['tokens']
+    retention = shared['retention']
+    calculation_events = shared['events']
+
+
 def generate_id(prefix: str) -> str:
     """Generate unique ID"""
     return f"{prefix}-{uuid.uuid4().hex[:8]}"
 
 
 def validate_token(auth_header: Optional[str]) -> bool:
-    """Validate Bearer token"""
+    """Validate Bearer token against the issued, unexpired tokens"""
+    auth_checks.set(auth_checks.get() + 1)
     if not auth_header or not auth_header.startswith('Bearer '):
         return False
-    token = auth_header.replace('Bearer ', '')
-    # For demo: accept any token that looks like a token
-    return len(token) > 10
+    return valid_tokens.is_valid(auth_header[7:])
+
+
+def begin_auth_accounting():
+    """Reset the per-request auth check counter"""
+    auth_checks.set(0)
 
 
-def calculate_formula(formula: Dict[str, Any], input_data: Dict[str, List[Dict]]) -> List[Dict]:
+def finish_auth_accounting() -> int:
+    """Add the current request's auth checks to the totals and return them"""
+    checks = auth_checks.get()
+    with auth_check_lock:
+        auth_check_totals['requests'] += 1
+        auth_check_totals['checks'] += checks
+    return checks
+
+
+def compact_time_series(ts: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Execute formula calculation on input time series data
+    Drop the per-interval start/end strings of a regular time series
 
-    Args:
-        formula: Formula definition
-        input_data: Dictionary mapping time series IDs to their interval data
+    A series qualifies when its resolution has a fixed length and every interval
+    timestamp equals what materialize_time_series would generate, so the round trip
+    is exact. The timestamps are replaced by a '_timeline' entry holding the first
+    start instant and the step in seconds. Irregular series are returned unchanged.
+    """
+    step = RESOLUTION_SECONDS.get(ts.get('resolution'))
+    intervals = ts.get('intervals')
+    if not step or not intervals:
+        return ts
+
+    base = parse_utc_instant(intervals[0].get('start'))
+    if base is None:
+        return ts
+
+    boundaries = interval_timestamps(base, step, len(intervals))
+    for idx, interval in enumerate(intervals):
+        if (interval.get('position') != idx + 1
+                or interval.get('start') != boundaries[idx]
+                or interval.get('end') != boundaries[idx + 1]):
+            return ts
+
+    compact = dict(ts)
+    compact['intervals'] = [
+        {key: value for key, value in interval.items() if key not in ('start', 'end')}
+        for interval in intervals
+    ]
+    compact['_timeline'] = {'start': base, 'step': step}
+    return compact
+
+
+def materialize_time_series(ts: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the response representation of a stored series, generating interval timestamps"""
+    timeline = ts.get('_timeline')
+    if timeline is None:
+        return ts
+
+    boundaries = interval_timestamps(timeline['start'], timeline['step'], len(ts['intervals']))
+    materialized = {key: value for key, value in ts.items() if key != '_timeline'}
+    materialized['intervals'] = [
+        dict(interval, start=boundaries[idx], end=boundaries[idx + 1])
+        for idx, interval in enumerate(ts['intervals'])
+    ]
+    return materialized
+
+
+def estimate_record_bytes(record: Dict[str, Any]) -> int:
+    """Estimated JSON size of a stored record; interval lists are extrapolated from their first entry"""
+    intervals = record.get('intervals')
+    if not intervals:
+        return len(json.dumps(record))
+    head = {key: value for key, value in record.items() if key != 'intervals'}
+    return len(json.dumps(head)) + len(intervals) * (len(json.dumps(intervals[0])) + 2)
+
+
+def _spill_path(calculation_id: str) -> str:
+    # Hashed file name: calculation IDs are client-chosen
+    return os.path.join(SPILL_DIR, hashlib.sha1(str(calculation_id).encode('utf-8')).hexdigest() + '.json')
+
+
+def retain_calculation(calculation: Dict[str, Any], output_ts: Optional[Dict[str, Any]] = None):
+    """
+    Register a finished calculation with the retention policy and evict what it displaces
 
-    Returns:
-        List of calculated intervals
+    output_ts is the generated output series; it is evicted together with the record.
     """
-    expression = formula['expression']
-    function_name = expression['function']
-    parameters = expression['parameters']
+    size_bytes = 0
+    if MEASURE_RESULT_BYTES:
+        size_bytes = estimate_record_bytes(calculation) + (estimate_record_bytes(output_ts) if output_ts else 0)
 
-    # Get first input time series to determine number of intervals
-    first_ts_id = list(input_data.keys())[0]
-    num_intervals = len(input_data[first_ts_id])
+    output_ts_id = output_ts['timeSeriesId'] if output_ts else None
+    for victim_id, victim_output_id in retention.track(calculation['calculationId'], output_ts_id, size_bytes):
+        evict_calculation(victim_id, victim_output_id)
 
-    result_intervals = []
 
-    for i in range(num_intervals):
-        # Calculate value for this interval
-        calculated_value = execute_expression(expression, input_data, i)
+def expire_calculations():
+    """Evict calculations past MABIS_CALC_TTL_SECONDS; run on lookups and /health, not only on completions"""
+    for victim_id, victim_output_id in retention.expire():
+        evict_calculation(victim_id, victim_output_id)
 
-        # Use timestamp from first input series
-        first_interval = input_data[first_ts_id][i]
 
-        result_intervals.append({
-            'position': i + 1,
-            'start': first_interval['start'],
-            'end': first_interval['end'],
-            'quantity': f"{calculated_value:.3f}",
-            'quality': 'VALIDATED'
-        })
+def release_calculation_id(calculation_id: str):
+    """
+    Drop the retention entry of an earlier calculation whose ID is reused
 
-    return result_intervals
-
-
-def execute_expression(expr: Dict[str, Any], input_data: Dict[str, List[Dict]], interval_idx: int) -> float:
-    """Execute a formula expression for a specific interval"""
-    function_name = expr['function']
-    parameters = expr['parameters']
-
-    if function_name == 'Wenn_Dann':
-        # If-Then-Else logic
-        line_a = get_parameter_value(parameters[0], input_data, interval_idx)
-        comparator = parameters[1]['value']
-        line_b = get_parameter_value(parameters[2], input_data, interval_idx)
-        then_value = get_parameter_value(parameters[3], input_data, interval_idx)
-        else_value = get_parameter_value(parameters[4], input_data, interval_idx)
-
-        if comparator == '>':
-            return then_value if line_a > line_b else else_value
-        elif comparator == '<':
-            return then_value if line_a < line_b else else_value
-        elif comparator == '>=':
-            return then_value if line_a >= line_b else else_value
-        elif comparator == '<=':
-            return then_value if line_a <= line_b else else_value
-        elif comparator == '==':
-            return then_value if line_a == line_b else else_value
-        else:
-            return else_value
-
-    elif function_name == 'Grp_Sum':
-        # Sum multiple time series with optional scaling factors
-        total = 0.0
-        for param in parameters:
-            value = get_parameter_value(param, input_data, interval_idx)
-            total += value
-        return total
-
-    elif function_name == 'Anteil_Groesser_Als':
-        # Portion above threshold
-        zeitreihe_id = parameters[0]['value']
-        threshold = parameters[1]['value']
-
-        if zeitreihe_id in input_data:
-            value = float(input_data[zeitreihe_id][interval_idx]['quantity'])
-            return value if value > threshold else 0.0
-        return 0.0
-
-    elif function_name == 'Anteil_Kleiner_Als':
-        # Portion below threshold
-        zeitreihe_id = parameters[0]['value']
-        threshold = parameters[1]['value']
-
-        if zeitreihe_id in input_data:
-            value = float(input_data[zeitreihe_id][interval_idx]['quantity'])
-            return value if value < threshold else 0.0
-        return 0.0
-
-    elif function_name == 'Quer_Max':
-        # Maximum across series
-        values = [get_parameter_value(param, input_data, interval_idx) for param in parameters]
-        return max(values) if values else 0.0
-
-    elif function_name == 'Quer_Min':
-        # Minimum across series
-        values = [get_parameter_value(param, input_data, interval_idx) for param in parameters]
-        return min(values) if values else 0.0
+    Otherwise the old entry would later evict the new record while it is
+    still PENDING. The old generated output series goes with its record.
+    """
+    released = retention.untrack(calculation_id)
+    if released is not None and released[1]:
+        time_series_store.pop(released[1])
 
-    else:
-        # Default: return 0
-        return 0.0
 
+def evict_calculation(calculation_id: str, output_ts_id: Optional[str]):
+    """Remove a calculation, its generated output and its profile, spilling them to disk if configured"""
+    calculation = calculation_store.pop(calculation_id)
+    output_ts = time_series_store.pop(output_ts_id) if output_ts_id else None
+    profile = profile_store.pop(calculation_id)
 
-def get_parameter_value(param: Dict[str, Any], input_data: Dict[str, List[Dict]], interval_idx: int) -> float:
-    """Get parameter value for calculation"""
-    param_type = param.get('type', 'constant')
+    if SPILL_DIR and calculation is not None:
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        with open(_spill_path(calculation_id), 'w') as f:
+            json.dump({'calculation': calculation, 'outputTimeSeries': output_ts, 'profile': profile}, f)
 
-    if param_type == 'constant':
-        return float(param['value'])
 
-    elif param_type == 'timeseries_ref':
-        ts_id = param['value']
-        if ts_id in input_data and interval_idx < len(input_data[ts_id]):
-            value = float(input_data[ts_id][interval_idx]['quantity'])
-            # Apply scaling factor if present
-            scaling_factor = param.get('scalingFactor', 1.0)
-            return value * scaling_factor
-        return 0.0
+def restore_calculation(calculation_id: str) -> Optional[Dict[str, Any]]:
+    """Load an evicted calculation (and its output series) back from the spill directory"""
+    if not SPILL_DIR:
+        return None
 
-    elif param_type == 'expression':
-        # Nested expression
-        return execute_expression(param['value'], input_data, interval_idx)
+    path = _spill_path(calculation_id)
+    try:
+        with open(path) as f:
+            spilled = json.load(f)
+        os.remove(path)
+    except FileNotFoundError:
+        # Not spilled, or restored concurrently by another request
+        return calculation_store.get(calculation_id)
+
+    calculation = spilled['calculation']
+    output_ts = spilled['outputTimeSeries']
+    if output_ts is not None:
+        time_series_store.put(output_ts['timeSeriesId'], output_ts)
+    if spilled.get('profile') is not None:
+        profile_store.put(calculation_id, spilled['profile'])
+    calculation_store.put(calculation_id, calculation)
+    retain_calculation(calculation, output_ts)
+    return calculation
+
+
+def calculate_formula_with_stats(formula: Dict[str, Any], columns: List[List[float]], count: int,
+                                 profile: Optional[Dict[str, Any]] = None, bindings: Optional[List[str]] = None,
+                                 timestamps: Optional[List[Dict]] = None) -> Tuple[List[Dict], Dict[str, Any]]:
+    """
+    calculate_plan plus evaluation statistics for the metrics endpoint
 
-    elif param_type == 'string':
-        # String values (like comparators) are handled separately
-        return 0.0
+    formula['expression'] is the expression of a FormulaPlan and columns are
+    the input series bound to its slots (see bind_inputs); bindings names
+    the slots.
 
-    else:
-        return 0.0
+    Per-function timings are only collected when metrics are enabled or a
+    profile is requested; with a profile (see profile_source) the statistics
+    also carry the submitted expression annotated with the node statistics
+    (see build_profile). Runs in executor processes too, so the statistics
+    are returned rather than recorded.
+    """
+    timed = METRICS.enabled or profile is not None
+    evaluation = Evaluation(formula['expression'], timed=timed, shared=shared_nodes(formula['expression']))
+    started = time.perf_counter()
+    result_intervals = calculate_plan(formula['expression'], columns, count, evaluation, timestamps)
+    seconds = time.perf_counter() - started
+
+    stats = {
+        'seconds': seconds,
+        'intervals': len(result_intervals),
+        'functions': function_timings(formula['expression'], evaluation) if timed else None
+    }
+    if profile is not None:
+        stats['profile'] = {
+            'formulaId': formula['formulaId'],
+            'intervals': len(result_intervals),
+            'totalMs': round(seconds * 1000, 3),
+            'sharedSubtrees': len(set(evaluation.shared.values())),
+            'expression': build_profile(profile['expression'], profile['resolved'], profile['nodes'],
+                                        evaluation, columns, bindings)
+        }
+    return result_intervals, stats
 
 
-# ==================== OAUTH2 ENDPOINTS ====================
+# ==================== METRICS ====================
 
-@app.route('/oauth/token', methods=['POST'])
-def oauth_token():
-    """Mock OAuth2 token endpoint"""
-    grant_type = request.form.get('grant_type')
-    client_id = request.form.get('client_id')
-    client_secret = request.form.get('client_secret')
+def store_size_bytes() -> Dict[Tuple[str, ...], float]:
+    """Estimated store sizes, computed at scrape time"""
+    stores = (('time_series', time_series_store), ('formulas', formula_store),
+              ('calculations', calculation_store))
+    return {
+        (name,): float(sum(estimate_record_bytes(record) for record in store.values()))
+        for name, store in stores
+    }
+
+
+REQUEST_LATENCY = METRICS.histogram(
+    'mabis_http_request_duration_seconds', 'HTTP request latency per route', ('method', 'route', 'status'))
+CALCULATION_QUEUE_DEPTH = METRICS.gauge(
+    'mabis_calculation_queue_depth', 'Calculations accepted but not yet completed')
+# Labelled by the root function of the plan: formula IDs are client-chosen and
+# unbounded, the functions of a validated plan are the few the engine implements
+FORMULA_LATENCY = METRICS.histogram(
+    'mabis_formula_evaluation_seconds', 'Formula evaluation time per root function of the plan', ('function',))
+FUNCTION_SECONDS = METRICS.counter(
+    'mabis_function_evaluation_seconds_total',
+    'Inclusive evaluation time per function node (nested expressions included)', ('function',))
+FUNCTION_CALLS = METRICS.counter(
+    'mabis_function_evaluations_total',
+    'Function node evaluations per interval (reuses of shared subtrees excluded)', ('function',))
+INTERVALS_EVALUATED = METRICS.counter(
+    'mabis_intervals_evaluated_total', 'Calculated intervals; rate() gives intervals per second')
+CALCULATION_ADMISSIONS = METRICS.counter(
+    'mabis_calculation_admissions_total', 'Admission decisions by estimated cost', ('decision',))
+INTERVAL_THROUGHPUT = METRICS.gauge(
+    'mabis_last_calculation_intervals_per_second', 'Evaluation throughput of the most recent calculation')
+STORE_BYTES = METRICS.gauge(
+    'mabis_store_bytes', 'Estimated JSON size of the in-memory stores', ('store',), collect=store_size_bytes)
+
+
+def record_evaluation_metrics(root_function: str, stats: Dict[str, Any]):
+    """Record the statistics returned by calculate_formula_with_stats"""
+    FORMULA_LATENCY.observe(stats['seconds'], (root_function,))
+    INTERVALS_EVALUATED.inc(amount=stats['intervals'])
+    if stats['seconds'] > 0:
+        INTERVAL_THROUGHPUT.set(stats['intervals'] / stats['seconds'])
+    for function_name, (calls, seconds) in (stats['functions'] or {}).items():
+        FUNCTION_CALLS.inc((function_name,), calls)
+        FUNCTION_SECONDS.inc((function_name,), seconds)
+
+
+# ==================== API OPERATIONS ====================
+# Framework-independent request handling shared by the Flask routes below and
+# the asyncio server in asgi_api_server.py. Operations return (body, status)
+# and raise ApiError for error responses.
+
+class ApiError(Exception):
+    """Error response raised by an API operation"""
+
+    def __init__(self, status: int, body: Dict[str, Any]):
+        super().__init__(body.get('detail') or body.get('error'))
+        self.status = status
+        self.body = body
+
+
+def not_found_problem(title: str, detail: str) -> ApiError:
+    """RFC 7807 problem for a missing resource"""
+    return ApiError(404, {
+        'type': 'https://api.mabis-hub.de/problems/not-found',
+        'title': title,
+        'status': 404,
+        'detail': detail
+    })
+
+
+def require_token(auth_header: Optional[str]):
+    """Raise 401 unless the Authorization header carries a valid token"""
+    if not validate_token(auth_header):
+        raise ApiError(401, {'error': 'Unauthorized'})
+
+
+def utc_now_iso() -> str:
+    """Current time as ISO 8601 with 'Z' suffix"""
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def issue_token(form: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Mock OAuth2 client credentials grant"""
+    grant_type = form.get('grant_type')
+    client_id = form.get('client_id')
+    client_secret = form.get('client_secret')
 
     if grant_type != 'client_credentials':
-        return jsonify({'error': 'unsupported_grant_type'}), 400
+        return {'error': 'unsupported_grant_type'}, 400
 
     if not client_id or not client_secret:
-        return jsonify({'error': 'invalid_client'}), 401
+        return {'error': 'invalid_client'}, 401
 
     # Generate mock token
     token = f"mock_token_{uuid.uuid4().hex}"
-    valid_tokens.add(token)
+    valid_tokens.issue(token, TOKEN_EXPIRES_IN)
 
-    return jsonify({
+    return {
         'access_token': token,
         'token_type': 'Bearer',
-        'expires_in': 3600,
-        'scope': request.form.get('scope', 'timeseries.read timeseries.write formulas.read formulas.write calculations.read calculations.execute')
-    })
-
+        'expires_in': TOKEN_EXPIRES_IN,
+        'scope': form.get('scope', 'timeseries.read timeseries.write formulas.read formulas.write calculations.read calculations.execute')
+    }, 200
 
-# ==================== TIME SERIES ENDPOINTS ====================
-
-@app.route('/v1/time-series', methods=['POST'])
-def submit_time_series():
-    """Submit time series data"""
-    if not validate_token(request.headers.get('Authorization')):
-        return jsonify({'error': 'Unauthorized'}), 401
 
-    data = request.json
+def accept_time_series(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Store submitted time series"""
     message_id = data.get('messageId')
     time_series_list = data.get('timeSeries', [])
 
-    accepted_ids = []
+    accepted = {}
     for ts in time_series_list:
-        ts_id = ts['timeSeriesId']
-        time_series_store[ts_id] = ts
-        accepted_ids.append(ts_id)
+        accepted[ts['timeSeriesId']] = compact_time_series(ts)
+    time_series_store.put_many(accepted, version_field='version')
+    index_metering_series(accepted)
+    accepted_ids = list(accepted)
 
-    return jsonify({
+    return {
         'messageId': message_id,
-        'acceptanceTime': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        'acceptanceTime': utc_now_iso(),
         'status': 'ACCEPTED',
         'timeSeriesIds': accepted_ids
-    }), 201
+    }, 201
 
 
-@app.route('/v1/time-series', methods=['GET'])
-def query_time_series():
-    """Query time series data"""
-    if not validate_token(request.headers.get('Authorization')):
-        return jsonify({'error': 'Unauthorized'}), 401
+def series_span(ts: Dict[str, Any]) -> List[Optional[int]]:
+    """[start, end] of a stored series in UTC epoch seconds (None where unknown)"""
+    timeline = ts.get('_timeline')
+    if timeline is not None:
+        return [timeline['start'], timeline['start'] + len(ts['intervals']) * timeline['step']]
+    period = ts.get('period') or {}
+    return [parse_utc_instant(period.get('start')), parse_utc_instant(period.get('end'))]
+
+
+def index_metering_series(series: Dict[str, Dict[str, Any]]):
+    """Register stored series under their metering point and OBIS code"""
+    entries: Dict[str, Dict[str, List[Optional[int]]]] = {}
+    for ts_id, ts in series.items():
+        point_id = ts.get('meteringPointId') or (ts.get('meteringPoint') or {}).get('id')
+        if point_id:
+            entries.setdefault(metering_point_key(point_id, ts.get('obisCode')), {})[ts_id] = series_span(ts)
+    for key, candidates in entries.items():
+        metering_point_index.update(key, candidates, create=True)
 
-    # Simple filtering by marketLocationId
-    market_location_id = request.args.get('marketLocationId')
 
+def accept_metering_values(metering_point_id: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Append pushed metering values to the buffers of their metering point
+
+    Values are validated one by one; invalid ones are reported in
+    validationErrors and the rest accepted. Delivery days that roll over
+    are stored as time series of the metering point (see rolled_day_series).
+    """
+    values = data.get('values') if isinstance(data, dict) else None
+    if not isinstance(values, list):
+        raise ApiError(400, {
+            'type': 'https://api.mabis-hub.de/problems/validation-error',
+            'title': 'Validation Error',
+            'status': 400,
+            'detail': "Request body must contain a 'values' array"
+        })
+
+    errors = []
+    groups: Dict[Optional[str], List[Tuple[int, int, float, str]]] = {}
+    for idx, value in enumerate(values):
+        value = value if isinstance(value, dict) else {}
+        parsed = parse_metering_value(value)
+        if isinstance(parsed, dict):
+            errors.append((idx, dict(parsed, field=f"values[{idx}].{parsed['field']}")))
+            continue
+        instant, quantity, quality = parsed
+        groups.setdefault(value.get('obisCode'), []).append((idx, instant, quantity, quality))
+
+    rolled_series = {}
+    for obis_code, entries in groups.items():
+        entries.sort(key=lambda entry: entry[1])
+        rejected, rolled = metering_buffers.append(metering_point_key(metering_point_id, obis_code), entries)
+        for idx, reason in rejected:
+            errors.append((idx, {'code': 'VALUE_REJECTED', 'message': reason, 'field': f'values[{idx}].timestamp'}))
+        for day in rolled:
+            ts = rolled_day_series(metering_point_id, obis_code, day)
+            rolled_series[ts['timeSeriesId']] = ts
+    if rolled_series:
+        time_series_store.put_many(rolled_series, version_field='version')
+        index_metering_series(rolled_series)
+
+    errors.sort(key=lambda error: error[0])
+    return {
+        'messageId': data.get('messageId'),
+        'acceptanceTime': utc_now_iso(),
+        'acceptedCount': len(values) - len(errors),
+        'rejectedCount': len(errors),
+        'validationErrors': [error for _, error in errors],
+        'rolledTimeSeriesIds': list(rolled_series)
+    }, 201
+
+
+def parse_metering_value(value: Dict[str, Any]) -> Union[Tuple[int, float, str], Dict[str, str]]:
+    """(UTC epoch seconds, quantity in kWh, quality) of a pushed value, or its validation error"""
+    instant = parse_utc_instant(value.get('timestamp'))
+    if instant is None:
+        return {'code': 'INVALID_TIMESTAMP', 'message': 'Timestamp must be an ISO 8601 UTC instant',
+                'field': 'timestamp'}
+    try:
+        quantity = float(value.get('value'))
+    except (TypeError, ValueError):
+        quantity = math.nan
+    if not math.isfinite(quantity):
+        return {'code': 'INVALID_QUANTITY_FORMAT', 'message': 'Value must be a decimal string', 'field': 'value'}
+    factor = METERING_UNIT_FACTORS.get(value.get('unit', 'KWH'))
+    if factor is None:
+        return {'code': 'INVALID_UNIT', 'message': f"Unit must be one of {', '.join(METERING_UNIT_FACTORS)}",
+                'field': 'unit'}
+    quality = value.get('quality', 'METERED')
+    if quality not in BUFFER_QUALITIES[1:]:
+        return {'code': 'INVALID_QUALITY', 'message': f'Unknown quality indicator {quality!r}', 'field': 'quality'}
+    return instant, quantity * factor, quality
+
+
+def rolled_day_series(metering_point_id: str, obis_code: Optional[str], day: Dict[str, Any]) -> Dict[str, Any]:
+    """Stored (compact) time series of a delivery day rolled over by MeteringBuffers"""
+    count = len(day['quantities'])
+    suffix = f"-{obis_code}" if obis_code else ''
+    return {
+        'timeSeriesId': f"TS-{metering_point_id}{suffix}-{day['day'].replace('-', '')}",
+        'meteringPointId': metering_point_id,
+        'obisCode': obis_code,
+        'unit': 'KWH',
+        'resolution': day['resolution'],
+        'period': {
+            'start': format_utc_instant(day['start']),
+            'end': format_utc_instant(day['start'] + count * day['step'])
+        },
+        'intervals': [
+            {'position': idx + 1, 'quantity': f'{quantity:.3f}', 'quality': quality}
+            for idx, (quantity, quality) in enumerate(zip(day['quantities'], day['qualities']))
+        ],
+        '_timeline': {'start': day['start'], 'step': day['step']}
+    }
+
+
+def find_time_series(market_location_id: Optional[str]) -> Tuple[Dict[str, Any], int]:
+    """Query time series, optionally filtered by marketLocationId"""
+    expire_calculations()
     results = []
     for ts_id, ts_data in time_series_store.items():
         if not market_location_id or ts_data.get('marketLocationId') == market_location_id:
-            results.append(ts_data)
+            results.append(materialize_time_series(ts_data))
 
-    return jsonify({
+    return {
         'timeSeries': results,
         'pagination': {
             'pageSize': len(results),
             'nextPageToken': None,
             'totalCount': len(results)
         }
-    })
+    }, 200
 
 
-@app.route('/v1/time-series/<time_series_id>', methods=['GET'])
-def get_time_series(time_series_id):
-    """Get specific time series"""
-    if not validate_token(request.headers.get('Authorization')):
-        return jsonify({'error': 'Unauthorized'}), 401
+def lookup_time_series(time_series_id: str) -> Tuple[Dict[str, Any], int]:
+    """Get a single time series"""
+    expire_calculations()
+    ts_data = time_series_store.get(time_series_id)
+    if ts_data is None:
+        raise ApiError(404, {'error': 'Not found'})
 
-    if time_series_id not in time_series_store:
-        return jsonify({'error': 'Not found'}), 404
+    return materialize_time_series(ts_data), 200
 
-    return jsonify(time_series_store[time_series_id])
 
+def patch_problem(invalid_params: List[Dict[str, str]]) -> ApiError:
+    return ApiError(422, {
+        'type': 'https://api.mabis-hub.de/problems/validation-error',
+        'title': 'Validation Error',
+        'status': 422,
+        'detail': 'Interval update validation failed',
+        'invalidParams': invalid_params
+    })
 
-# ==================== FORMULA ENDPOINTS ====================
 
-@app.route('/v1/formulas', methods=['POST'])
-def submit_formula():
-    """Submit formula definition"""
-    if not validate_token(request.headers.get('Authorization')):
-        return jsonify({'error': 'Unauthorized'}), 401
+def interval_update_fields(update: Dict[str, Any]) -> Tuple[Dict[str, str], Optional[str]]:
+    """Interval fields set by one PATCH update, or the reason they are invalid"""
+    fields = {name: update[name] for name in ('quantity', 'quality', 'status') if name in update}
+    if not fields:
+        return fields, 'At least one of quantity, quality or status is required'
+    if 'quantity' in fields:
+        try:
+            valid = isinstance(fields['quantity'], str) and Decimal(fields['quantity']).is_finite()
+        except InvalidOperation:
+            valid = False
+        if not valid:
+            return fields, 'quantity must be a decimal string'
+        # Stored like the quantities the server writes, so repeats in another notation change nothing
+        fields['quantity'] = f"{Decimal(fields['quantity']):.3f}"
+    if 'quality' in fields and fields['quality'] not in BUFFER_QUALITIES[1:]:
+        return fields, f"Unknown quality indicator {fields['quality']!r}"
+    if 'status' in fields and fields['status'] not in INTERVAL_STATUSES:
+        return fields, f"status must be one of {', '.join(INTERVAL_STATUSES)}"
+    return fields, None
+
+
+def interval_range(head: Dict[str, Any], count: int, boundaries: Optional[List[int]],
+                   update: Dict[str, Any]) -> Tuple[Optional[range], Optional[str]]:
+    """
+    Interval indices selected by one PATCH update, or the reason it selects none
 
-    data = request.json
+    An update names a 1-based position or a start/end time range that must
+    begin and end on interval boundaries. boundaries holds the count + 1
+    interval boundaries of a series without '_timeline' (UTC epoch seconds,
+    None where an interval has no parsable start or end).
+    """
+    if 'position' in update:
+        position = update['position']
+        if not isinstance(position, int) or isinstance(position, bool) or not 1 <= position <= count:
+            return None, f'position must be between 1 and {count}'
+        return range(position - 1, position), None
+
+    start, end = parse_utc_instant(update.get('start')), parse_utc_instant(update.get('end'))
+    if start is None or end is None:
+        return None, 'Either position or start and end (UTC instants) are required'
+    if end <= start:
+        return None, 'end must be after start'
+
+    timeline = head.get('_timeline')
+    if timeline is not None:
+        first, first_offset = divmod(start - timeline['start'], timeline['step'])
+        stop, stop_offset = divmod(end - timeline['start'], timeline['step'])
+        aligned = not first_offset and not stop_offset and 0 <= first and stop <= count
+    elif not count:
+        return None, 'The series has no intervals'
+    elif None in boundaries:
+        return None, 'The series has intervals without parsable start/end timestamps; select them by position'
+    else:
+        first, stop = bisect.bisect_left(boundaries, start), bisect.bisect_left(boundaries, end)
+        aligned = stop <= count and boundaries[first] == start and boundaries[stop] == end
+    if not aligned:
+        return None, f"{update['start']} - {update['end']} does not match interval boundaries of the series"
+    return range(first, stop), None
+
+
+def changed_ranges(changed: List[int], head: Dict[str, Any], intervals: Optional[List[Dict]]) -> List[Dict]:
+    """Contiguous runs of changed interval indices with their positions and time range"""
+    runs = []
+    for index in changed:
+        if runs and runs[-1][1] == index:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+
+    timeline = head.get('_timeline')
+    ranges = []
+    for first, stop in runs:
+        if timeline is not None:
+            start = format_utc_instant(timeline['start'] + first * timeline['step'])
+            end = format_utc_instant(timeline['start'] + stop * timeline['step'])
+        else:
+            start, end = intervals[first].get('start'), intervals[stop - 1].get('end')
+        ranges.append({'startPosition': first + 1, 'endPosition': stop, 'start': start, 'end': end})
+    return ranges
+
+
+def patch_time_series(time_series_id: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Update selected intervals of a stored series without resubmitting it
+
+    Updates are applied in order (later ones win) to a copy-on-write version
+    of the series: only the touched intervals are rebuilt and, in
+    multi-worker mode, only the changes reach the store process. The series
+    version is bumped when any interval actually changed; with
+    expectedVersion the update is refused (409) if the series moved on.
+    """
+    updates = data.get('updates') if isinstance(data, dict) else None
+    if not isinstance(updates, list) or not updates:
+        raise patch_problem([{'name': 'updates', 'reason': "Request body must contain a non-empty 'updates' array"}])
+    expected_version = data.get('expectedVersion')
+    if expected_version is not None and (not isinstance(expected_version, int) or isinstance(expected_version, bool)):
+        raise patch_problem([{'name': 'expectedVersion', 'reason': 'expectedVersion must be an integer'}])
+
+    # Resolved against the series as read; if it is replaced before the changes
+    # are applied, resolve again (unless the client pinned expectedVersion)
+    while True:
+        summary = time_series_store.get_summary(time_series_id, 'intervals')
+        if summary is None:
+            raise not_found_problem('Time Series Not Found', f'Time series {time_series_id} does not exist')
+        head, count = summary
+
+        # Series without a regular timeline are resolved against their interval timestamps
+        intervals = boundaries = None
+        if head.get('_timeline') is None:
+            intervals = (time_series_store.get(time_series_id) or {}).get('intervals') or []
+            boundaries = [parse_utc_instant(interval.get('start')) for interval in intervals]
+            boundaries.append(parse_utc_instant(intervals[-1].get('end')) if intervals else None)
+            count = len(intervals)
+
+        invalid = []
+        changes: Dict[int, Dict[str, str]] = {}
+        for idx, update in enumerate(updates):
+            update = update if isinstance(update, dict) else {}
+            fields, reason = interval_update_fields(update)
+            selected = None
+            if reason is None:
+                selected, reason = interval_range(head, count, boundaries, update)
+            if reason is not None:
+                invalid.append({'name': f'updates[{idx}]', 'reason': reason})
+                continue
+            for index in selected:
+                changes.setdefault(index, {}).update(fields)
+        if invalid:
+            raise patch_problem(invalid)
+
+        version = head.get('version', 1)
+        if expected_version in (None, version):
+            result = time_series_store.update_items(time_series_id, 'intervals', changes, expected_version=version)
+            if result is None:
+                raise not_found_problem('Time Series Not Found', f'Time series {time_series_id} does not exist')
+            version, changed = result
+            if changed is not None:
+                break
+        if expected_version is not None:
+            raise ApiError(409, {
+                'type': 'https://api.mabis-hub.de/problems/version-conflict',
+                'title': 'Version Conflict',
+                'status': 409,
+                'detail': f'Time series {time_series_id} is at version {version}, not {expected_version}',
+                'version': version
+            })
+
+    return {
+        'timeSeriesId': time_series_id,
+        'messageId': data.get('messageId'),
+        'acceptanceTime': utc_now_iso(),
+        'version': version,
+        'changedIntervalCount': len(changed),
+        'changedRanges': changed_ranges(changed, head, intervals)
+    }, 200
+
+
+def accept_formulas(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Store submitted formula definitions"""
     message_id = data.get('messageId')
     formulas = data.get('formulas', [])
 
-    accepted_ids = []
+    accepted = {}
+    validation_results = {}
     for formula in formulas:
-        formula_id = formula['formulaId']
-        formula_store[formula_id] = formula
-        accepted_ids.append(formula_id)
-
-    return jsonify({
+        # Formulas of the same shape share one plan and its validation result
+        plan, bindings, problems = compile_formula(formula)
+        accepted[formula['formulaId']] = dict(formula, _plan={'key': plan.key, 'bindings': bindings,
+                                                              'problems': problems})
+        validation_results[formula['formulaId']] = validation_result(formula['formulaId'], plan, problems)
+    formula_store.put_many(accepted)
+    accepted_ids = list(accepted)
+
+    return {
         'messageId': message_id,
-        'acceptanceTime': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        'acceptanceTime': utc_now_iso(),
         'status': 'ACCEPTED',
         'formulaIds': accepted_ids,
-        'validationResults': [
-            {'formulaId': fid, 'valid': True} for fid in accepted_ids
-        ]
-    }), 201
+        'validationResults': list(validation_results.values())
+    }, 201
+
+
+def validation_result(formula_id: str, plan: FormulaPlan, problems: List[str] = ()) -> Dict[str, Any]:
+    errors = ([{'code': 'UNRESOLVED_PARAMETER', 'message': message} for message in problems]
+              + [{'code': 'INVALID_EXPRESSION', 'message': message} for message in plan.errors])
+    result = {'formulaId': formula_id, 'valid': not errors, 'planId': plan.key}
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+def invalid_formula_problem(result: Dict[str, Any]) -> ApiError:
+    """422 for a calculation of a formula whose validation result lists errors"""
+    return ApiError(422, {
+        'type': 'https://api.mabis-hub.de/problems/invalid-formula',
+        'title': 'Invalid Formula',
+        'status': 422,
+        'detail': (f"Formula {result['formulaId']} failed validation and cannot be calculated: "
+                   + '; '.join(error['message'] for error in result['errors'])),
+        'errors': result['errors']
+    })
 
 
-@app.route('/v1/formulas', methods=['GET'])
-def list_formulas():
-    """List all formulas"""
-    if not validate_token(request.headers.get('Authorization')):
-        return jsonify({'error': 'Unauthorized'}), 401
+def compile_formula(formula: Dict[str, Any],
+                    expression: Optional[Dict[str, Any]] = None) -> Tuple[FormulaPlan, List[str], List[str]]:
+    """
+    Plan, slot bindings and parameter problems of a formula (or of a variant of its expression)
+
+    Percentages, loss factors and metering point / OBIS references are
+    resolved against the formula's inputMeteringPoints and lossFactor first.
+    """
+    resolved, problems = resolve_parameters(formula['expression'] if expression is None else expression,
+                                            formula.get('inputMeteringPoints'), formula.get('lossFactor'))
+    plan, bindings = formula_plans.intern(resolved)
+    return plan, bindings, problems
+
+
+def profile_source(formula: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    What build_profile needs to annotate a formula as submitted
+
+    The submitted and the resolved expression, plus the plan node of each
+    function node. The nodes are the ones the plan evaluates, and they must
+    travel to an executor process in the same pickle as the plan expression.
+    """
+    resolved, _ = resolve_parameters(formula['expression'], formula.get('inputMeteringPoints'),
+                                     formula.get('lossFactor'))
+    _, _, nodes = formula_plans.trace(resolved)
+    return {'expression': formula['expression'], 'resolved': resolved, 'nodes': nodes}
+
+
+def formula_plan(formula: Dict[str, Any]) -> Tuple[FormulaPlan, List[str]]:
+    """Plan and slot bindings of a stored formula; workers that have not seen it compile it"""
+    stored = formula.get('_plan')
+    plan = formula_plans.get(stored['key']) if stored else None
+    if plan is None:
+        return compile_formula(formula)[:2]
+    return plan, stored['bindings']
+
+
+def public_formula(formula: Dict[str, Any]) -> Dict[str, Any]:
+    """Response representation of a stored formula (without its plan reference)"""
+    return {key: value for key, value in formula.items() if key != '_plan'}
 
-    formulas = list(formula_store.values())
 
-    return jsonify({
+def list_formula_definitions() -> Tuple[Dict[str, Any], int]:
+    """List all formulas"""
+    formulas = [public_formula(formula) for formula in formula_store.values()]
+
+    return {
         'formulas': formulas,
         'totalCount': len(formulas),
         'nextCursor': None
+    }, 200
+
+
+def lookup_formula(formula_id: str) -> Tuple[Dict[str, Any], int]:
+    """Get a single formula"""
+    formula = formula_store.get(formula_id)
+    if formula is None:
+        raise ApiError(404, {'error': 'Not found'})
+
+    return public_formula(formula), 200
+
+
+def parse_calculation_period(period: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """UTC epoch seconds of a calculation's period, None when the request has no period"""
+    if not period:
+        return None
+    start = parse_utc_instant(period.get('start'))
+    end = parse_utc_instant(period.get('end'))
+    if start is None or end is None:
+        raise ApiError(400, {
+            'type': 'https://api.mabis-hub.de/problems/bad-request',
+            'title': 'Bad Request',
+            'status': 400,
+            'detail': 'period needs ISO 8601 start and end timestamps with time zone'
+        })
+    return start, end
+
+
+def select_period(ts_data: Dict[str, Any], bounds: Optional[Tuple[int, int]]) -> Tuple[List[Dict], Optional[Dict[str, int]]]:
+    """
+    Intervals of a stored series within a calculation period, and their timeline
+
+    Regular series are sliced by index arithmetic on their timeline, so inputs
+    with different periods line up on the calculation period. Irregular series
+    (no timeline) are used as submitted.
+    """
+    timeline = ts_data.get('_timeline')
+    intervals = ts_data['intervals']
+    if timeline is None or bounds is None:
+        return intervals, timeline
+
+    try:
+        first, stop = period_indices(timeline['start'], timeline['step'], len(intervals), *bounds)
+    except ValueError as e:
+        raise ApiError(422, {
+            'type': 'https://api.mabis-hub.de/problems/period-not-covered',
+            'title': 'Period Not Covered',
+            'status': 422,
+            'detail': f"Time series {ts_data['timeSeriesId']}: {e}"
+        })
+    if first == 0 and stop == len(intervals):
+        return intervals, timeline
+    return intervals[first:stop], {'start': timeline['start'] + first * timeline['step'], 'step': timeline['step']}
+
+
+def unbound_problem(formula_id: str, unbound: List[str]) -> ApiError:
+    """422 for formula references without an entry in inputTimeSeries"""
+    return ApiError(422, {
+        'type': 'https://api.mabis-hub.de/problems/unbound-reference',
+        'title': 'Unbound Time Series Reference',
+        'status': 422,
+        'detail': (f"Formula {formula_id} references {', '.join(unbound)}, which neither inputTimeSeries "
+                   f"nor a submitted metering point series binds to a time series"),
+        'unbound': unbound
     })
 
 
-@app.route('/v1/formulas/<formula_id>', methods=['GET'])
-def get_formula(formula_id):
-    """Get specific formula"""
-    if not validate_token(request.headers.get('Authorization')):
-        return jsonify({'error': 'Unauthorized'}), 401
+def bind_input_series(formula_id: str, bindings: List[str], input_ts_map: Dict[str, str],
+                      bounds: Optional[Tuple[int, int]]) -> Dict[str, str]:
+    """
+    Time series ID per reference: inputTimeSeries first, then the metering point index
 
-    if formula_id not in formula_store:
-        return jsonify({'error': 'Not found'}), 404
+    References of metering_point_ref / obis_code parameters need no
+    inputTimeSeries entry; the index supplies the latest submitted series of
+    the metering point that covers the period. 422 for references bound to nothing.
+    """
+    resolved = dict(input_ts_map)
+    unbound = []
+    for name in bindings:
+        if name in resolved:
+            continue
+        candidates = metering_point_index.get(name)
+        if not candidates:
+            unbound.append(name)
+            continue
+        covering = [ts_id for ts_id, (start, end) in candidates.items()
+                    if bounds is None or (start is not None and end is not None
+                                          and start <= bounds[0] and bounds[1] <= end)]
+        resolved[name] = (covering or list(candidates))[-1]
+    if unbound:
+        raise unbound_problem(formula_id, unbound)
+    return resolved
+
+
+def admit_calculation(plan: FormulaPlan, intervals: int, inputs: int, variants: int = 1) -> Tuple[int, str]:
+    """
+    Estimated cost and queue of a calculation; 422 above MABIS_CALC_MAX_COST
 
-    return jsonify(formula_store[formula_id])
+    The cost is the formula's node count × intervals × input series (× variants
+    of a scenario sweep), a static bound on the work of evaluating and loading
+    the calculation.
+    """
+    nodes = plan.nodes
+    cost = nodes * intervals * max(inputs, 1) * variants
+    if CALC_MAX_COST and cost > CALC_MAX_COST:
+        if METRICS.enabled:
+            CALCULATION_ADMISSIONS.inc(('rejected',))
+        raise ApiError(422, {
+            'type': 'https://api.mabis-hub.de/problems/calculation-too-expensive',
+            'title': 'Calculation Too Expensive',
+            'status': 422,
+            'detail': (f"Estimated cost {cost} ({nodes} nodes × {intervals} intervals × {inputs} inputs"
+                       f"{f' × {variants} variants' if variants > 1 else ''}) exceeds the budget of "
+                       f"{CALC_MAX_COST}; split the period or simplify the formula"),
+            'estimatedCost': cost,
+            'budget': CALC_MAX_COST
+        })
+    queue = 'large' if cost > CALC_LARGE_COST else 'small'
+    if METRICS.enabled:
+        CALCULATION_ADMISSIONS.inc((queue,))
+    return cost, queue
 
 
-# ==================== CALCULATION ENDPOINTS ====================
+def load_calculation_inputs(input_ts_map: Dict[str, str], bounds: Optional[Tuple[int, int]]
+                            ) -> Tuple[Dict[str, List[Dict]], Optional[Dict[str, Any]], Optional[Dict[str, int]]]:
+    """Intervals of the input series within the period, the first input series and its timeline"""
+    input_data = {}
+    first_input_ts = None
+    timeline = None
+    for param_name, ts_id in input_ts_map.items():
+        ts_data = time_series_store.get(ts_id)
+        if ts_data is None:
+            raise not_found_problem('Time Series Not Found', f'Time series {ts_id} not found')
 
-@app.route('/v1/calculations', methods=['POST'])
-def execute_calculation():
-    """Execute calculation"""
-    if not validate_token(request.headers.get('Authorization')):
-        return jsonify({'error': 'Unauthorized'}), 401
+        intervals, ts_timeline = select_period(ts_data, bounds)
+        input_data[param_name] = intervals
+        if first_input_ts is None:
+            first_input_ts = ts_data
+            timeline = ts_timeline
+    return input_data, first_input_ts, timeline
+
+
+def prepare_calculation(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate a calculation request, load its inputs and register it as PENDING
 
-    data = request.json
+    Returns:
+        Calculation job passed on to calculate_plan and complete_calculation
+    """
     calculation_id = data.get('calculationId')
     formula_id = data.get('formulaId')
     input_ts_map = data.get('inputTimeSeries', {})
-    period = data.get('period', {})
-    output_ts_id = data.get('outputTimeSeriesId')
 
     # Get formula
-    if formula_id not in formula_store:
-        return jsonify({
-            'type': 'https://api.mabis-hub.de/problems/not-found',
-            'title': 'Formula Not Found',
-            'status': 404,
-            'detail': f'Formula {formula_id} not found'
-        }), 404
-
-    formula = formula_store[formula_id]
-
-    # Get input time series data
-    input_data = {}
-    for param_name, ts_id in input_ts_map.items():
-        if ts_id not in time_series_store:
-            return jsonify({
-                'type': 'https://api.mabis-hub.de/problems/not-found',
-                'title': 'Time Series Not Found',
-                'status': 404,
-                'detail': f'Time series {ts_id} not found'
-            }), 404
+    formula = formula_store.get(formula_id)
+    if formula is None:
+        raise not_found_problem('Formula Not Found', f'Formula {formula_id} not found')
+
+    plan, bindings = formula_plan(formula)
+    # Formulas are accepted with their validation errors; they are not evaluated
+    validation = validation_result(formula_id, plan, (formula.get('_plan') or {}).get('problems', []))
+    if not validation['valid']:
+        raise invalid_formula_problem(validation)
+    period = data.get('period') or {}
+    bounds = parse_calculation_period(period)
+
+    # Every reference needs an input series; checked before anything is loaded
+    input_ts_map = bind_input_series(formula_id, bindings, input_ts_map, bounds)
+
+    # Estimate from the period before any series is loaded; without a period
+    # the interval count is only known once the inputs are loaded
+    admission = None
+    if bounds is not None:
+        step = RESOLUTION_SECONDS.get(formula.get('outputResolution'), RESOLUTION_SECONDS['PT15M'])
+        admission = admit_calculation(plan, max(0, (bounds[1] - bounds[0]) // step), len(input_ts_map))
+
+    input_data, first_input_ts, timeline = load_calculation_inputs(input_ts_map, bounds)
+
+    # The first input determines the intervals of the output series
+    first_intervals = next(iter(input_data.values())) if input_data else []
+    count = len(first_intervals)
+    if admission is None:
+        admission = admit_calculation(plan, count, len(input_ts_map))
+    cost, queue = admission
+
+    if timeline is not None and not period:
+        period = {
+            'start': format_utc_instant(timeline['start']),
+            'end': format_utc_instant(timeline['start'] + count * timeline['step'])
+        }
 
-        ts_data = time_series_store[ts_id]
-        input_data[param_name] = ts_data['intervals']
+    # Resolve the slots once; evaluation only indexes float columns
+    columns = bind_inputs(bindings, input_data, count)
+    # Regular inputs carry no per-interval timestamps; the output shares their timeline
+    timestamps = first_intervals if first_intervals and 'start' in first_intervals[0] else None
 
     # Store calculation as pending
-    calculation_store[calculation_id] = {
+    calculation = {
         'calculationId': calculation_id,
         'formulaId': formula_id,
         'status': 'PENDING',
-        'acceptedAt': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+        'acceptedAt': utc_now_iso(),
+        'estimatedCost': cost,
+        'queue': queue
     }
+    release_calculation_id(calculation_id)
+    calculation_store.put(calculation_id, calculation)
+    publish_calculation_event(calculation)
+    if METRICS.enabled:
+        CALCULATION_QUEUE_DEPTH.inc()
 
-    # Execute calculation
-    try:
-        result_intervals = calculate_formula(formula, input_data)
+    return {
+        'calculationId': calculation_id,
+        'formula': dict(public_formula(formula), expression=plan.expression),
+        'columns': columns,
+        'count': count,
+        'timestamps': timestamps,
+        'bindings': bindings,
+        'first_input_ts': first_input_ts,
+        'timeline': timeline,
+        'period': period,
+        'output_ts_id': data.get('outputTimeSeriesId'),
+        'profile': profile_source(formula) if data.get('profile') else None,
+        'queue': queue,
+        'accepted': calculation
+    }
+
+
+def finish_calculation(job: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the outcome into the calculation record, recreating it if it was removed meanwhile"""
+    calculation = calculation_store.update(job['calculationId'], changes)
+    if calculation is None:
+        calculation = calculation_store.update(job['calculationId'], dict(job['accepted'], **changes), create=True)
+    return calculation
+
+
+def complete_calculation(job: Dict[str, Any], result_intervals: Optional[List[Dict]] = None,
+                         error: Optional[Exception] = None,
+                         stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Store the output series of a finished calculation and update its status"""
+    calculation_id = job['calculationId']
+    formula = job['formula']
+    first_input_ts = job['first_input_ts']
+
+    if METRICS.enabled:
+        CALCULATION_QUEUE_DEPTH.dec()
+        if stats is not None:
+            record_evaluation_metrics(formula['expression'].get('function'), stats)
+
+    if stats is not None and stats.get('profile') is not None:
+        profile_store.put(calculation_id, dict(stats['profile'], calculationId=calculation_id))
+
+    if error is not None:
+        calculation = finish_calculation(job, {
+            'status': 'FAILED',
+            'errors': [{'code': 'CALCULATION_ERROR', 'message': str(error)}]
+        })
+        retain_calculation(calculation)
+        publish_calculation_event(calculation)
+        return calculation
 
+    output_ts = None
+    try:
         # Create output time series
-        if not output_ts_id:
-            output_ts_id = generate_id('TS-CALC')
+        output_ts_id = job['output_ts_id'] or generate_id('TS-CALC')
 
         output_ts = {
             'timeSeriesId': output_ts_id,
-            'marketLocationId': list(time_series_store.values())[0].get('marketLocationId', 'CALCULATED'),
+            'marketLocationId': (first_input_ts or {}).get('marketLocationId', 'CALCULATED'),
             'measurementType': formula.get('outputUnit', 'KWH'),
             'unit': formula.get('outputUnit', 'KWH'),
             'resolution': formula.get('outputResolution', 'PT15M'),
-            'period': period,
+            'period': job['period'],
             'intervals': result_intervals,
             'metadata': {
-                'calculatedBy': formula_id,
+                'calculatedBy': formula['formulaId'],
                 'calculationId': calculation_id,
                 'formulaName': formula.get('name'),
-                'calculatedAt': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+                'calculatedAt': utc_now_iso()
             }
         }
 
-        time_series_store[output_ts_id] = output_ts
+        if job.get('timeline') is not None:
+            output_ts['_timeline'] = job['timeline']
+
+        # Swap in the fully built output series
+        time_series_store.put_many({output_ts_id: output_ts}, version_field='version')
 
         # Update calculation status
-        calculation_store[calculation_id].update({
+        calculation = finish_calculation(job, {
             'status': 'COMPLETED',
             'outputTimeSeriesId': output_ts_id,
-            'completedAt': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+            'completedAt': utc_now_iso()
         })
 
     except Exception as e:
-        calculation_store[calculation_id].update({
+        calculation = finish_calculation(job, {
             'status': 'FAILED',
             'errors': [{'code': 'CALCULATION_ERROR', 'message': str(e)}]
         })
 
-    return jsonify({
-        'calculationId': calculation_id,
-        'status': calculation_store[calculation_id]['status'],
-        'acceptedAt': calculation_store[calculation_id]['acceptedAt']
-    }), 202
+    # Only generated outputs (TS-CALC-*) are evicted with the record;
+    # a client-chosen outputTimeSeriesId is kept like any submitted series
+    generated_output = output_ts if output_ts is not None and not job['output_ts_id'] else None
+    retain_calculation(calculation, generated_output)
+    publish_calculation_event(calculation)
+    return calculation
 
 
-@app.route('/v1/calculations/<calculation_id>', methods=['GET'])
-def get_calculation(calculation_id):
-    """Get calculation result"""
-    if not validate_token(request.headers.get('Authorization')):
-        return jsonify({'error': 'Unauthorized'}), 401
+def publish_calculation_event(calculation: Dict[str, Any]):
+    """Announce a status transition to long-polling requests and event streams"""
+    fields = {key: calculation[key] for key in ('formulaId', 'outputTimeSeriesId') if key in calculation}
+    calculation_events.publish(calculation['calculationId'], calculation['status'], at=utc_now_iso(), **fields)
 
-    if calculation_id not in calculation_store:
-        return jsonify({'error': 'Not found'}), 404
 
-    return jsonify(calculation_store[calculation_id])
+def calculation_accepted(calculation: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """202 response for a submitted calculation"""
+    return {
+        'calculationId': calculation['calculationId'],
+        'status': calculation['status'],
+        'acceptedAt': calculation['acceptedAt'],
+        'estimatedCost': calculation.get('estimatedCost'),
+        'queue': calculation.get('queue')
+    }, 202
 
 
-# ==================== HEALTH CHECK ====================
+def evaluate_calculation(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluate a prepared calculation and store its outcome"""
+    try:
+        result_intervals, stats = calculate_formula_with_stats(job['formula'], job['columns'], job['count'],
+                                                               job['profile'], job['bindings'], job['timestamps'])
+    except Exception as e:
+        return complete_calculation(job, error=e)
+    return complete_calculation(job, result_intervals, stats=stats)
+
+
+def get_calculation_pool(queue: str = 'small') -> ThreadPoolExecutor:
+    """Pool of a calculation queue (created per worker process on first use)"""
+    with calculation_pool_lock:
+        pool = calculation_pools.get(queue)
+        if pool is None:
+            if queue == 'large':
+                workers = CALC_LARGE_WORKERS
+            else:
+                workers = int(os.environ.get('MABIS_CALC_WORKERS', 0)) or os.cpu_count() or 1
+            pool = calculation_pools[queue] = ThreadPoolExecutor(max_workers=workers,
+                                                                 thread_name_prefix=f'calc-{queue}')
+        return pool
+
+
+def run_calculation(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Execute a calculation synchronously, or in the background pool with MABIS_CALC_BACKGROUND=1"""
+    job = prepare_calculation(data)
+    if CALC_BACKGROUND:
+        get_calculation_pool(job['queue']).submit(evaluate_calculation, job)
+        return calculation_accepted(calculation_store.get(job['calculationId']))
+
+    if job['queue'] == 'large':
+        # Waiting clients of large calculations still share the bounded pool
+        return calculation_accepted(get_calculation_pool('large').submit(evaluate_calculation, job).result())
+    return calculation_accepted(evaluate_calculation(job))
+
+
+def scenario_problem(detail: str) -> ApiError:
+    return ApiError(422, {
+        'type': 'https://api.mabis-hub.de/problems/invalid-scenario',
+        'title': 'Invalid Scenario',
+        'status': 422,
+        'detail': detail
+    })
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
+
+def prepare_scenarios(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate a scenario sweep, intern its variant plans and bind the inputs once
+
+    Every variant is the stored formula with its parameter overrides applied.
+    The input series are loaded and parsed once for all variants; variants
+    whose plans bind the same slots form a group evaluated by calculate_sweep.
+
+    Returns:
+        Sweep job passed on to evaluate_scenarios and scenario_result
+    """
+    formula_id = data.get('formulaId')
+    input_ts_map = data.get('inputTimeSeries', {})
+    variants = data.get('variants')
+
+    formula = formula_store.get(formula_id)
+    if formula is None:
+        raise not_found_problem('Formula Not Found', f'Formula {formula_id} not found')
+    if not isinstance(variants, list) or not variants:
+        raise scenario_problem('variants must list at least one variant')
+    if len(variants) > SCENARIO_MAX_VARIANTS:
+        raise scenario_problem(f'{len(variants)} variants exceed the limit of {SCENARIO_MAX_VARIANTS}')
+
+    variant_results = []
+    plans = []
+    for index, variant in enumerate(variants, 1):
+        if not isinstance(variant, dict):
+            raise scenario_problem(f'Variant {index} must be an object')
+        variant_id = variant.get('variantId') or f'V{index}'
+        overrides = variant.get('overrides') or {}
+        try:
+            expression = apply_overrides(formula['expression'], overrides)
+        except ValueError as e:
+            raise scenario_problem(f'Variant {variant_id}: {e}')
+        plan, bindings, problems = compile_formula(formula, expression)
+        if problems or plan.errors:
+            raise scenario_problem(f"Variant {variant_id}: {'; '.join(problems + plan.errors)}")
+        plans.append((plan, bindings))
+        variant_results.append({'variantId': variant_id, 'planId': plan.key, 'overrides': overrides})
+    if len({variant['variantId'] for variant in variant_results}) < len(variant_results):
+        raise scenario_problem('variantId must be unique within a scenario')
+
+    period = data.get('period') or {}
+    bounds = parse_calculation_period(period)
+
+    # Overrides never change references, so all variants bind the same names
+    names = sorted({name for _, bindings in plans for name in bindings})
+    input_ts_map = bind_input_series(formula_id, names, input_ts_map, bounds)
+    admission = None
+    if bounds is not None:
+        step = RESOLUTION_SECONDS.get(formula.get('outputResolution'), RESOLUTION_SECONDS['PT15M'])
+        admission = admit_calculation(plans[0][0], max(0, (bounds[1] - bounds[0]) // step),
+                                      len(input_ts_map), len(plans))
+
+    input_data, first_input_ts, timeline = load_calculation_inputs(input_ts_map, bounds)
+    first_intervals = next(iter(input_data.values())) if input_data else []
+    count = len(first_intervals)
+    if admission is None:
+        admission = admit_calculation(plans[0][0], count, len(input_ts_map), len(plans))
+    cost, queue = admission
+
+    # Columnar time axis: count + 1 interval boundaries
+    if timeline is not None:
+        boundaries = list(interval_timestamps(timeline['start'], timeline['step'], count))
+        if not period:
+            period = {'start': boundaries[0], 'end': boundaries[-1]}
+    elif first_intervals and 'start' in first_intervals[0]:
+        boundaries = [interval['start'] for interval in first_intervals] + [first_intervals[-1]['end']]
+    else:
+        boundaries = None
+
+    # Each input series is parsed once; groups pick their columns in slot order
+    parsed = dict(zip(names, bind_inputs(names, input_data, count)))
+    groups: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    for index, (plan, bindings) in enumerate(plans):
+        group = groups.get(tuple(bindings))
+        if group is None:
+            group = groups[tuple(bindings)] = {
+                'variants': [], 'expressions': [], 'columns': [parsed[name] for name in bindings]}
+        group['variants'].append(index)
+        group['expressions'].append(plan.expression)
+
+    return {
+        'formulaId': formula_id,
+        'variants': variant_results,
+        'groups': list(groups.values()),
+        'count': count,
+        'boundaries': boundaries,
+        'period': period,
+        'resolution': (first_input_ts or {}).get('resolution') or formula.get('outputResolution'),
+        'unit': formula.get('outputUnit'),
+        'estimatedCost': cost,
+        'queue': queue
+    }
+
+
+def evaluate_scenarios(groups: List[Dict[str, Any]], count: int) -> List[List[str]]:
+    """Quantities of every variant (variants × intervals), formatted like calculation results"""
+    rows: List[List[str]] = [[] for _ in range(sum(len(group['variants']) for group in groups))]
+    for group in groups:
+        values = calculate_sweep(group['expressions'], group['columns'], count)
+        for index, row in zip(group['variants'], values):
+            rows[index] = [f"{value:.3f}" for value in row]
+    return rows
+
+
+def scenario_result(job: Dict[str, Any], quantities: List[List[str]]) -> Tuple[Dict[str, Any], int]:
+    """Columnar response of a scenario sweep: quantities[v][i] is interval i of variant v"""
+    return {
+        'formulaId': job['formulaId'],
+        'period': job['period'],
+        'resolution': job['resolution'],
+        'unit': job['unit'],
+        'intervalCount': job['count'],
+        'intervalBoundaries': job['boundaries'],
+        'variants': job['variants'],
+        'quantities': quantities,
+        'estimatedCost': job['estimatedCost'],
+        'queue': job['queue'],
+        'calculatedAt': utc_now_iso()
+    }, 200
+
+
+def run_scenarios(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Evaluate all variants of a scenario sweep; nothing is stored"""
+    job = prepare_scenarios(data)
+    if job['queue'] == 'large':
+        quantities = get_calculation_pool('large').submit(evaluate_scenarios, job['groups'], job['count']).result()
+    else:
+        quantities = evaluate_scenarios(job['groups'], job['count'])
+    return scenario_result(job, quantities)
+
+
+def parse_wait_seconds(value: Optional[str]) -> Optional[float]:
+    """Validate the ?wait= long-polling parameter; capped at MAX_WAIT_SECONDS"""
+    if value is None or value == '':
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = math.nan
+    if not 0 <= seconds < math.inf:
+        raise ApiError(400, {
+            'type': 'https://api.mabis-hub.de/problems/bad-request',
+            'title': 'Bad Request',
+            'status': 400,
+            'detail': f'wait must be a non-negative number of seconds, got {value!r}'
+        })
+    return min(seconds, MAX_WAIT_SECONDS)
+
+
+def lookup_calculation(calculation_id: str, wait: Optional[float] = None) -> Tuple[Dict[str, Any], int]:
+    """
+    Get calculation status and result
+
+    With wait, a calculation that is still PENDING is held for up to wait
+    seconds until it reaches COMPLETED or FAILED (long-polling).
+    """
+    expire_calculations()
+    calculation = calculation_store.get(calculation_id) or restore_calculation(calculation_id)
+    if calculation is None:
+        raise ApiError(404, {'error': 'Not found'})
+
+    if wait and calculation['status'] not in TERMINAL_CALCULATION_STATUSES:
+        if calculation_events.wait(calculation_id, wait):
+            calculation = calculation_store.get(calculation_id) or restore_calculation(calculation_id) or calculation
+
+    return calculation, 200
+
+
+def parse_event_cursor(value: Optional[str]) -> Optional[int]:
+    """Sequence number from a Last-Event-ID header or ?since= parameter"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(400, {
+            'type': 'https://api.mabis-hub.de/problems/bad-request',
+            'title': 'Bad Request',
+            'status': 400,
+            'detail': f'Event ID must be an integer, got {value!r}'
+        })
+
+
+def format_sse_event(event: Dict[str, Any]) -> str:
+    """Server-sent event for one calculation status transition"""
+    return f"id: {event['id']}\nevent: calculation\ndata: {json.dumps(event)}\n\n"
+
+
+def calculation_event_stream(since: Optional[int] = None,
+                             calculation_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Server-sent events of calculation status transitions
+
+    Starts after event since (Last-Event-ID on reconnect) or with the next
+    event, optionally only for one calculation. A comment line is sent as
+    keep-alive whenever no event arrived for EVENT_KEEPALIVE_SECONDS.
+    """
+    sequence = calculation_events.latest_sequence() if since is None else since
+    yield 'retry: 2000\n\n'
+    while True:
+        events = calculation_events.events_since(sequence, EVENT_KEEPALIVE_SECONDS)
+        if not events:
+            yield ': keep-alive\n\n'
+            continue
+        sequence = events[-1]['id']
+        chunk = ''.join(format_sse_event(event) for event in events
+                        if calculation_id is None or event['calculationId'] == calculation_id)
+        if chunk:
+            yield chunk
+
+
+def lookup_calculation_profile(calculation_id: str) -> Tuple[Dict[str, Any], int]:
+    """Get the per-node evaluation profile of a calculation"""
+    lookup_calculation(calculation_id)
+    profile = profile_store.get(calculation_id)
+    if profile is None:
+        raise not_found_problem('Profile Not Found',
+                                f'Calculation {calculation_id} was not submitted with "profile": true')
+
+    return profile, 200
+
+
+def health_status() -> Tuple[Dict[str, Any], int]:
+    """Health check with store sizes"""
+    expire_calculations()
+    return {
         'status': 'healthy',
         'timestamp': datetime.now(timezone.utc).isoformat(),
         'stats': {
             'time_series': len(time_series_store),
+            'metering_points': len(metering_point_index),
+            'metering_buffers': metering_buffers.stats(),
             'formulas': len(formula_store),
-            'calculations': len(calculation_store)
+            'calculations': len(calculation_store),
+            'formula_plans': len(formula_plans),
+            'active_tokens': len(valid_tokens),
+            'retention': retention.stats(),
+            'auth_checks': dict(auth_check_totals)
         }
-    })
+    }, 200
 
 
-@app.route('/', methods=['GET'])
-def root():
-    """Root endpoint with API info"""
-    return jsonify({
+def metrics_exposition() -> str:
+    """Prometheus text exposition of all metrics"""
+    if not METRICS.enabled:
+        raise ApiError(404, {'error': 'Metrics disabled (enable with MABIS_METRICS=1)'})
+    return METRICS.render()
+
+
+def api_info() -> Tuple[Dict[str, Any], int]:
+    """API info for the root endpoint"""
+    return {
         'name': 'MaBiS Time Series API - Mock Server',
         'version': '1.0.0',
         'description': 'Demo-Server für MaBiS Zeitreihen und Formel-API',
         'endpoints': {
             'oauth': '/oauth/token',
             'time-series': '/v1/time-series',
+            'metering-values': '/v1/metering-points/{meteringPointId}/values',
             'formulas': '/v1/formulas',
             'calculations': '/v1/calculations',
-            'health': '/health'
+            'calculation-events': '/v1/calculations/events',
+            'calculation-scenarios': '/v1/calculations/scenarios',
+            'health': '/health',
+            'metrics': '/metrics'
         },
         'documentation': 'See README.md and mabis-timeseries-api.yaml'
-    })
+    }, 200
+
+
+@app.errorhandler(ApiError)
+def handle_api_error(error: ApiError):
+    """Render ApiError raised by an operation"""
+    return jsonify(error.body), error.status
+
+
+@app.before_request
+def begin_request_accounting():
+    begin_auth_accounting()
+    if METRICS.enabled:
+        g.request_started = time.perf_counter()
+
+
+@app.after_request
+def finish_request_accounting(response):
+    response.headers['X-Auth-Checks'] = str(finish_auth_accounting())
+    if METRICS.enabled and 'request_started' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_started,
+                                (request.method, route, str(response.status_code)))
+    return response
+
+
+# ==================== OAUTH2 ENDPOINTS ====================
+
+@app.route('/oauth/token', methods=['POST'])
+def oauth_token():
+    """Mock OAuth2 token endpoint"""
+    body, status = issue_token(request.form)
+    return jsonify(body), status
+
+
+# ==================== TIME SERIES ENDPOINTS ====================
+
+@app.route('/v1/time-series', methods=['POST'])
+def submit_time_series():
+    """Submit time series data"""
+    require_token(request.headers.get('Authorization'))
+    body, status = accept_time_series(request.json)
+    return jsonify(body), status
+
+
+@app.route('/v1/time-series', methods=['GET'])
+def query_time_series():
+    """Query time series data"""
+    require_token(request.headers.get('Authorization'))
+    body, status = find_time_series(request.args.get('marketLocationId'))
+    return jsonify(body), status
+
+
+@app.route('/v1/time-series/<time_series_id>', methods=['GET'])
+def get_time_series(time_series_id):
+    """Get specific time series"""
+    require_token(request.headers.get('Authorization'))
+    body, status = lookup_time_series(time_series_id)
+    return jsonify(body), status
+
+
+@app.route('/v1/time-series/<time_series_id>', methods=['PATCH'])
+def update_time_series_intervals(time_series_id):
+    """Update selected intervals of a time series"""
+    require_token(request.headers.get('Authorization'))
+    body, status = patch_time_series(time_series_id, request.get_json(silent=True))
+    return jsonify(body), status
+
+
+# ==================== METERING VALUES ENDPOINTS ====================
+
+@app.route('/v1/metering-points/<metering_point_id>/values', methods=['POST'])
+def submit_metering_values(metering_point_id):
+    """Append metering values of one metering point"""
+    require_token(request.headers.get('Authorization'))
+    body, status = accept_metering_values(metering_point_id, request.get_json(silent=True))
+    return jsonify(body), status
+
+
+# ==================== FORMULA ENDPOINTS ====================
+
+@app.route('/v1/formulas', methods=['POST'])
+def submit_formula():
+    """Submit formula definition"""
+    require_token(request.headers.get('Authorization'))
+    body, status = accept_formulas(request.json)
+    return jsonify(body), status
+
+
+@app.route('/v1/formulas', methods=['GET'])
+def list_formulas():
+    """List all formulas"""
+    require_token(request.headers.get('Authorization'))
+    body, status = list_formula_definitions()
+    return jsonify(body), status
+
+
+@app.route('/v1/formulas/<formula_id>', methods=['GET'])
+def get_formula(formula_id):
+    """Get specific formula"""
+    require_token(request.headers.get('Authorization'))
+    body, status = lookup_formula(formula_id)
+    return jsonify(body), status
+
+
+# ==================== CALCULATION ENDPOINTS ====================
+
+@app.route('/v1/calculations', methods=['POST'])
+def execute_calculation():
+    """Execute calculation"""
+    require_token(request.headers.get('Authorization'))
+    body, status = run_calculation(request.json)
+    return jsonify(body), status
+
+
+@app.route('/v1/calculations/scenarios', methods=['POST'])
+def execute_scenarios():
+    """Evaluate one formula for many parameter variants (what-if sweep)"""
+    require_token(request.headers.get('Authorization'))
+    body, status = run_scenarios(request.json)
+    return jsonify(body), status
+
+
+@app.route('/v1/calculations/<calculation_id>/profile', methods=['GET'])
+def get_calculation_profile(calculation_id):
+    """Get the evaluation profile of a calculation (EXPLAIN ANALYZE)"""
+    require_token(request.headers.get('Authorization'))
+    body, status = lookup_calculation_profile(calculation_id)
+    return jsonify(body), status
+
+
+@app.route('/v1/calculations/events', methods=['GET'])
+def calculation_events_stream():
+    """Stream calculation status transitions as server-sent events"""
+    require_token(request.headers.get('Authorization'))
+    since = parse_event_cursor(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    stream = calculation_event_stream(since, request.args.get('calculationId'))
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/v1/calculations/<calculation_id>', methods=['GET'])
+def get_calculation(calculation_id):
+    """Get calculation result (?wait=<seconds> waits for completion)"""
+    require_token(request.headers.get('Authorization'))
+    body, status = lookup_calculation(calculation_id, parse_wait_seconds(request.args.get('wait')))
+    return jsonify(body), status
+
+
+# ==================== HEALTH CHECK ====================
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    body, status = health_status()
+    return jsonify(body), status
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(metrics_exposition(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/', methods=['GET'])
+def root():
+    """Root endpoint with API info"""
+    body, status = api_info()
+    return jsonify(body), status
+
+
+# Connect to an external store process (e.g. under gunicorn with several workers)
+if STORE_ADDRESS:
+    use_shared_store(parse_store_address(STORE_ADDRESS), STORE_AUTHKEY)
+
+
+# ==================== MULTI-PROCESS SERVING ====================
+
+def _serve_worker(listen_fd: int, host: str, port: int, store_address: Any, authkey: bytes):
+    """Worker process: accept requests on the inherited listening socket"""
+    from werkzeug.serving import make_server
+
+    use_shared_store(store_address, authkey)
+    make_server(host, port, app, threaded=True, fd=listen_fd).serve_forever()
+
+
+def run_workers(host: str, port: int, workers: int):
+    """
+    Serve the API from several processes sharing one store process
+
+    The parent starts the store process, binds the listening socket once and
+    forks the workers, which all accept connections on that socket.
+    """
+    context = multiprocessing.get_context('fork')
+    store_address = ('127.0.0.1', 0)
+    manager = start_store_process(store_address, STORE_AUTHKEY)
+
+    listener = socket.create_server((host, port), backlog=1024)
+    processes = [
+        context.Process(target=_serve_worker,
+                        args=(listener.fileno(), host, port, manager.address, STORE_AUTHKEY),
+                        daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        manager.shutdown()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MaBiS Time Series API - Mock Server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Anzahl Worker-Prozesse (>1 startet einen gemeinsamen Store-Prozess)')
+    args = parser.parse_args()
+
     print("=" * 60)
     print("MaBiS Time Series API - Mock Server")
     print("=" * 60)
     print()
-    print("Server startet auf: http://localhost:8000")
+    print(f"Server startet auf: http://localhost:{args.port}")
+    if args.workers > 1:
+        print(f"Worker-Prozesse: {args.workers} (gemeinsamer Store-Prozess)")
+    if CALC_BACKGROUND:
+        print("Berechnungen laufen im Hintergrund (MABIS_CALC_BACKGROUND=1)")
+    if CALC_MAX_COST:
+        print(f"Kostenbudget je Berechnung: {CALC_MAX_COST} (MABIS_CALC_MAX_COST)")
     print()
     print("Verfügbare Endpunkte:")
     print("  POST   /oauth/token           - OAuth2 Token abrufen")
     print("  POST   /v1/time-series        - Zeitreihen übermitteln")
     print("  GET    /v1/time-series        - Zeitreihen abfragen")
     print("  GET    /v1/time-series/{id}   - Bestimmte Zeitreihe abrufen")
+    print("  PATCH  /v1/time-series/{id}   - Einzelne Intervalle korrigieren (Version +1)")
+    print("  POST   /v1/metering-points/{id}/values - Messwerte anhängen (Tagespuffer)")
     print("  POST   /v1/formulas           - Formel übermitteln")
     print("  GET    /v1/formulas           - Formeln auflisten")
     print("  GET    /v1/formulas/{id}      - Bestimmte Formel abrufen")
     print("  POST   /v1/calculations       - Berechnung ausführen")
-    print("  GET    /v1/calculations/{id}  - Berechnungsergebnis abrufen")
+    print("  POST   /v1/calculations/scenarios - Formel für viele Parameter-Varianten auswerten")
+    print("  GET    /v1/calculations/{id}  - Berechnungsergebnis abrufen (?wait=<s> wartet)")
+    print("  GET    /v1/calculations/events - Statusänderungen als Server-Sent Events")
+    print("  GET    /v1/calculations/{id}/profile - Auswertungsprofil (profile: true)")
     print("  GET    /health                - Health Check")
+    print("  GET    /metrics               - Prometheus-Metriken (MABIS_METRICS=1)")
     print()
     print("Test mit: python demo_client.py")
     print("=" * 60)
     print()
 
-    app.run(debug=True, host='0.0.0.0', port=8000)
+    if args.workers > 1:
+        run_workers(args.host, args.port, args.workers)
+    else:
+        app.run(debug=True, host=args.host, port=args.port)
@@ -8,22 +8,50 @@ to submit and execute calculation formulas on time series data.
 
 from __future__ import annotations
 
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional, Union
-from dataclasses import dataclass, asdict, field
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
+from dataclasses import dataclass, field, fields, is_dataclass
 from decimal import Decimal
 from enum import Enum
+from json.encoder import encode_basestring_ascii
+
+try:
+    import httpx  # Only needed for AsyncMaBiSAPIClient
+except ImportError:
+    httpx = None
+
+try:
+    import formula_engine  # Server evaluation engine, ships next to this file; needed for evaluate_formula_locally
+except ImportError:
+    formula_engine = None
+
+try:
+    import interval_calendar  # Shared interval timestamp tables (ships next to this file)
+except ImportError:
+    interval_calendar = None
 
+# Slot-based model classes where supported (dataclass slots need Python 3.10)
+DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(**DATACLASS_OPTIONS)
 class MarketParticipant:
     id: str  # EDIFACT ID (GLN)
     role: str  # MSB, NB, LF, BKV, BA, MV
     name: str = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class Interval:
     position: int
     start: str  # ISO 8601 timestamp
@@ -33,7 +61,7 @@ class Interval:
     status: str = "CONFIRMED"
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class TimeSeries:
     timeSeriesId: str
     marketLocationId: str
@@ -41,12 +69,13 @@ class TimeSeries:
     unit: str  # KWH, MWH
     resolution: str  # PT15M, PT1H, P1D
     period: Dict[str, str]
-    intervals: List[Dict[str, Any]]
+    intervals: List[Union[Interval, Dict[str, Any]]]
     meteringPointId: str = None
     metadata: Dict[str, Any] = None
+    obisCode: str = None  # With meteringPointId, binds metering_point_ref / obis_code parameters
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class TimeSeriesSubmission:
     messageId: str
     messageDate: str
@@ -94,7 +123,7 @@ class FormulaCategory(str, Enum):
     AGGREGATION = "AGGREGATION"
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class MeteringPoint:
     """Metering point with OBIS code"""
     meteringPointId: str
@@ -103,7 +132,7 @@ class MeteringPoint:
     description: Optional[str] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class FormulaParameter:
     """Parameter for a formula function"""
     name: str
@@ -114,7 +143,7 @@ class FormulaParameter:
     scalingFactor: Optional[float] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class FormulaExpression:
     """
     Represents a formula expression that can be applied to time series data.
@@ -127,7 +156,7 @@ class FormulaExpression:
     description: Optional[str] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class Formula:
     """
     A complete formula definition with metadata
@@ -149,7 +178,7 @@ class Formula:
     metadata: Optional[Dict[str, Any]] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class FormulaSubmission:
     """Submit a new formula definition"""
     messageId: str
@@ -158,7 +187,7 @@ class FormulaSubmission:
     formulas: List[Formula]
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class CalculationRequest:
     """
     Request to execute a formula on time series data
@@ -173,7 +202,7 @@ class CalculationRequest:
     metadata: Optional[Dict[str, Any]] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class CalculationResult:
     """Result of a formula calculation"""
     calculationId: str
@@ -184,22 +213,286 @@ class CalculationResult:
     errors: Optional[List[Dict[str, str]]] = None
 
 
+# ==================== FAST SERIALIZATION ====================
+
+# Per-class encoders, generated on first use
+_ENCODERS: Dict[type, Callable[[Any], str]] = {}
+
+
+def _encode_float(value: float) -> str:
+    if value != value or value in (float('inf'), float('-inf')):
+        raise ValueError(f"Out of range float values are not JSON compliant: {value!r}")
+    return float.__repr__(value)
+
+
+def _encode_value(value: Any) -> str:
+    """JSON text of a value, identical to json.dumps(asdict(...)) for dataclasses"""
+    value_type = type(value)
+    if value_type is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    if value_type is bool:
+        return 'true' if value else 'false'
+    if value_type is int:
+        return int.__repr__(value)
+    if value_type is float:
+        return _encode_float(value)
+
+    encoder = _ENCODERS.get(value_type)
+    if encoder is None and is_dataclass(value):
+        encoder = _compile_encoder(value_type)
+    if encoder is not None:
+        return encoder(value)
+    if value_type in (list, tuple):
+        return '[' + ', '.join([_encode_value(item) for item in value]) + ']'
+    if value_type is dict and all(type(key) is str for key in value):
+        return '{' + ', '.join([
+            encode_basestring_ascii(key) + ': ' + _encode_value(item) for key, item in value.items()
+        ]) + '}'
+    # Enums, str/int subclasses, Decimal-free plain containers: the C encoder handles them
+    return json.dumps(value, allow_nan=False, default=_json_default)
+
+
+def _json_default(value: Any) -> Any:
+    if is_dataclass(value):
+        return json.loads(_encode_value(value))
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _compile_encoder(cls: type) -> Callable[[Any], str]:
+    """
+    Generate an encoder for a dataclass: one attribute read and one string
+    piece per field, without building an intermediate dict
+    """
+    names = [f.name for f in fields(cls)]
+    lines = ['def encode(obj):']
+    pieces = []
+    for idx, name in enumerate(names):
+        lines.append(f'    v{idx} = obj.{name}')
+        prefix = ('{' if idx == 0 else ', ') + encode_basestring_ascii(name) + ': '
+        pieces.append(repr(prefix))
+        pieces.append(f'_s(v{idx}) if type(v{idx}) is str else _v(v{idx})')
+    pieces.append(repr('}') if names else repr('{}'))
+    lines.append('    return "".join((' + ', '.join(pieces) + ',))')
+
+    namespace = {'_s': encode_basestring_ascii, '_v': _encode_value}
+    exec('\n'.join(lines), namespace)
+    encoder = namespace['encode']
+    _ENCODERS[cls] = encoder
+    return encoder
+
+
+def encode_json(obj: Any) -> str:
+    """Serialize a model object (dataclasses, lists, dicts) to JSON text"""
+    return _encode_value(obj)
+
+
+def encode_json_bytes(obj: Any) -> bytes:
+    """Serialize a model object to a JSON request body; same bytes as json.dumps(asdict(obj))"""
+    return _encode_value(obj).encode('ascii')
+
+
+def dataclass_to_dict(obj: Any) -> Any:
+    """asdict() replacement that copies containers but not leaf values"""
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: dataclass_to_dict(getattr(obj, f.name)) for f in fields(obj)}
+    if type(obj) in (list, tuple):
+        return [dataclass_to_dict(item) for item in obj]
+    if type(obj) is dict:
+        return {key: dataclass_to_dict(item) for key, item in obj.items()}
+    return obj
+
+
+def serialize_expression(expr: FormulaExpression) -> Dict[str, Any]:
+    """Serialize a FormulaExpression recursively; nested expressions stay bare dicts"""
+    result = {
+        'function': expr.function,
+        'parameters': []
+    }
+
+    for param in expr.parameters:
+        if isinstance(param, FormulaExpression):
+            # Nested expression - recurse
+            result['parameters'].append(serialize_expression(param))
+        else:
+            # Regular parameter
+            result['parameters'].append(dataclass_to_dict(param))
+
+    if expr.description:
+        result['description'] = expr.description
+
+    return result
+
+
+def serialize_formula(formula: Formula) -> Dict[str, Any]:
+    """Serialize a Formula as submitted to POST /formulas"""
+    formula_dict = {
+        'formulaId': formula.formulaId,
+        'name': formula.name,
+        'description': formula.description,
+        'expression': serialize_expression(formula.expression),
+        'inputTimeSeries': formula.inputTimeSeries,
+        'outputUnit': formula.outputUnit,
+        'outputResolution': formula.outputResolution
+    }
+
+    if formula.createdBy:
+        formula_dict['createdBy'] = formula.createdBy
+    if formula.createdAt:
+        formula_dict['createdAt'] = formula.createdAt
+    if formula.version:
+        formula_dict['version'] = formula.version
+    if formula.inputMeteringPoints:
+        # Binds obis_code / metering_point_ref parameters (see formula_engine.resolve_parameters)
+        formula_dict['inputMeteringPoints'] = dataclass_to_dict(formula.inputMeteringPoints)
+    if formula.lossFactor is not None:
+        formula_dict['lossFactor'] = formula.lossFactor
+    if formula.metadata:
+        formula_dict['metadata'] = formula.metadata
+
+    return formula_dict
+
+
+# ==================== CHUNKED UPLOADS ====================
+
+class ChunkUploadError(Exception):
+    """
+    Some chunks of a split time series submission failed after all retries
+
+    Attributes:
+        accepted: Merged acceptance response of the chunks that were accepted
+        failed: (chunk body, exception) pairs; a chunk body can be resubmitted
+            on its own with MaBiSAPIClient.submit_time_series_payload
+    """
+
+    def __init__(self, accepted: Dict[str, Any], failed: List[tuple]):
+        super().__init__(f"{len(failed)} chunk(s) failed, {len(accepted['timeSeriesIds'])} time series accepted")
+        self.accepted = accepted
+        self.failed = failed
+
+
+def encode_time_series_chunks(submission: TimeSeriesSubmission, max_bytes: int, max_series: int) -> List[bytes]:
+    """
+    Serialize a TimeSeriesSubmission into request bodies split by JSON size and series count
+
+    Every series is encoded once; chunks are assembled from the encoded text.
+    Series keep their order. A single series larger than max_bytes becomes a
+    chunk of its own (series are never split). With more than one chunk each
+    chunk gets the messageId '<messageId>-<n>' (n from 1).
+    """
+    series_texts = [encode_json(ts) for ts in submission.timeSeries]
+    head_fields = [f.name for f in fields(submission) if f.name != 'timeSeries']
+
+    def envelope(message_id: str) -> str:
+        values = {name: getattr(submission, name) for name in head_fields}
+        values['messageId'] = message_id
+        return '{' + ''.join(
+            encode_basestring_ascii(name) + ': ' + encode_json(value) + ', ' for name, value in values.items()
+        ) + '"timeSeries": ['
+
+    envelope_bytes = len(envelope(submission.messageId)) + 2
+    groups: List[List[str]] = []
+    current: List[str] = []
+    current_bytes = envelope_bytes
+    for text in series_texts:
+        # ', ' separator between list items
+        series_bytes = len(text) + 2
+        if current and (len(current) >= max_series or current_bytes + series_bytes > max_bytes):
+            groups.append(current)
+            current = []
+            current_bytes = envelope_bytes
+        current.append(text)
+        current_bytes += series_bytes
+    if current or not groups:
+        groups.append(current)
+
+    if len(groups) == 1:
+        return [(envelope(submission.messageId) + ', '.join(groups[0]) + ']}').encode('ascii')]
+    return [
+        (envelope(f"{submission.messageId}-{idx}") + ', '.join(group) + ']}').encode('ascii')
+        for idx, group in enumerate(groups, start=1)
+    ]
+
+
+def merge_acceptance_responses(message_id: str, responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the acceptance responses of all chunks into one, timeSeriesIds in chunk order"""
+    return {
+        'messageId': message_id,
+        'status': 'ACCEPTED' if all(r.get('status') == 'ACCEPTED' for r in responses) else 'PARTIALLY_ACCEPTED',
+        'acceptanceTime': max((r.get('acceptanceTime', '') for r in responses), default=None),
+        'timeSeriesIds': [ts_id for r in responses for ts_id in r.get('timeSeriesIds', [])],
+        'chunks': [
+            {'messageId': r.get('messageId'), 'status': r.get('status'), 'timeSeriesIds': r.get('timeSeriesIds', [])}
+            for r in responses
+        ]
+    }
+
+
 class MaBiSAPIClient:
-    """Client for interacting with MaBiS Time Series REST API"""
-    
-    def __init__(self, base_url: str, client_id: str, client_secret: str):
+    """
+    Client for interacting with MaBiS Time Series REST API
+
+    All calls go through one pooled requests.Session, so connections (and TLS
+    sessions) are kept alive and reused. The client is thread-safe: the access
+    token is refreshed refresh_margin seconds before it expires, and concurrent
+    callers share a single refresh.
+
+    Args:
+        base_url: API base URL including /v1
+        client_id: OAuth client ID
+        client_secret: OAuth client secret
+        pool_size: Maximum number of pooled connections per host; use at least
+            the number of threads sharing the client
+        max_retries: Connection-level retries of the underlying adapter
+        timeout: Timeout per request in seconds
+        refresh_margin: Seconds before expiry at which the token is refreshed
+        chunk_max_bytes: Maximum JSON size of one time series upload request
+        chunk_max_series: Maximum number of series in one upload request
+        upload_workers: Chunks uploaded in parallel (keep <= pool_size)
+        chunk_retries: Retries of a single chunk on 429, 5xx or connection errors
+    """
+
+    def __init__(self, base_url: str, client_id: str, client_secret: str, pool_size: int = 10,
+                 max_retries: int = 0, timeout: float = 30.0, refresh_margin: float = 60.0,
+                 chunk_max_bytes: int = 4 * 1024 * 1024, chunk_max_series: int = 500,
+                 upload_workers: int = 4, chunk_retries: int = 2):
         self.base_url = base_url
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token = None
-        
+        self.token_expires_at = 0.0
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self.chunk_max_bytes = chunk_max_bytes
+        self.chunk_max_series = chunk_max_series
+        self.upload_workers = upload_workers
+        self.chunk_retries = chunk_retries
+        self._token_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Connection'] = 'keep-alive'
+
+    def __enter__(self) -> 'MaBiSAPIClient':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
     def authenticate(self) -> str:
         """
         Get OAuth 2.0 access token using client credentials flow
         """
         token_url = self.base_url.replace('/v1', '/oauth/token')
         
-        response = requests.post(
+        response = self.session.post(
             token_url,
             data={
                 'grant_type': 'client_credentials',
@@ -207,43 +500,122 @@ class MaBiSAPIClient:
                 'client_secret': self.client_secret,
                 'scope': 'timeseries.write'
             },
-            headers={'Content-Type': 'application/x-www-form-urlencoded'}
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=self.timeout
         )
         
         response.raise_for_status()
         token_data = response.json()
         self.access_token = token_data['access_token']
+        self.token_expires_at = time.monotonic() + token_data.get('expires_in', 3600)
         return self.access_token
-    
+
+    def _token_is_fresh(self) -> bool:
+        remaining = self.token_expires_at - time.monotonic()
+        return self.access_token is not None and remaining > self.refresh_margin
+
+    def _ensure_token(self, stale_token: Optional[str] = None) -> str:
+        """
+        Return a valid access token, refreshing it ahead of expiry
+
+        Only one thread refreshes; the others wait for the lock and then see the
+        new token. stale_token forces a refresh unless another thread already
+        replaced that token (used after a 401).
+        """
+        token = self.access_token
+        if token != stale_token and self._token_is_fresh():
+            return token
+
+        with self._token_lock:
+            if self.access_token != stale_token and self._token_is_fresh():
+                return self.access_token
+            return self.authenticate()
+
     def _get_headers(self) -> Dict[str, str]:
         """Get HTTP headers with authentication"""
-        if not self.access_token:
-            self.authenticate()
-            
+        return self._auth_headers(self._ensure_token())
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Authenticated request on the pooled session; a 401 refreshes the token once and retries"""
+        kwargs.setdefault('timeout', self.timeout)
+        token = self._ensure_token()
+        response = self.session.request(method, url, headers=self._auth_headers(token), **kwargs)
+        if response.status_code == 401:
+            token = self._ensure_token(stale_token=token)
+            response = self.session.request(method, url, headers=self._auth_headers(token), **kwargs)
+        return response
+
+    @staticmethod
+    def _auth_headers(token: str) -> Dict[str, str]:
         return {
-            'Authorization': f'Bearer {self.access_token}',
+            'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
         }
     
     def submit_time_series(self, submission: TimeSeriesSubmission) -> Dict[str, Any]:
         """
         Submit time series data to MaBiS-Hub
+
+        Submissions above chunk_max_bytes or chunk_max_series are split into
+        chunks that are uploaded in parallel; each chunk is retried on its own.
         
         Args:
             submission: TimeSeriesSubmission object containing the data
             
         Returns:
-            Acceptance response from the API
+            Acceptance response from the API (merged over all chunks, with a
+            'chunks' entry, if the submission was split)
+
+        Raises:
+            ValueError: A chunk failed validation
+            ChunkUploadError: Chunks still failed after chunk_retries
         """
+        # Serialize straight to JSON bytes, one request body per chunk
+        chunks = encode_time_series_chunks(submission, self.chunk_max_bytes, self.chunk_max_series)
+        if len(chunks) == 1:
+            return self.submit_time_series_payload(chunks[0])
+
+        with ThreadPoolExecutor(max_workers=min(self.upload_workers, len(chunks))) as executor:
+            futures = [executor.submit(self._submit_chunk, chunk) for chunk in chunks]
+
+        responses = []
+        failed = []
+        for chunk, future in zip(chunks, futures):
+            error = future.exception()
+            if isinstance(error, ValueError):
+                raise error
+            if error is not None:
+                failed.append((chunk, error))
+            else:
+                responses.append(future.result())
+
+        merged = merge_acceptance_responses(submission.messageId, responses)
+        if failed:
+            raise ChunkUploadError(merged, failed)
+        return merged
+
+    def _submit_chunk(self, chunk: bytes) -> Dict[str, Any]:
+        """Upload one chunk, retrying 429, 5xx and connection errors with backoff"""
+        for attempt in range(self.chunk_retries + 1):
+            try:
+                return self.submit_time_series_payload(chunk)
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else 0
+                if (status != 429 and status < 500) or attempt == self.chunk_retries:
+                    raise
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.chunk_retries:
+                    raise
+            time.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+    def submit_time_series_payload(self, payload: Union[bytes, Dict[str, Any]]) -> Dict[str, Any]:
+        """Submit an already serialized TimeSeriesSubmission (JSON bytes or dict) as a single request"""
         url = f'{self.base_url}/time-series'
-        
-        # Convert dataclass to dict, handling nested objects
-        payload = asdict(submission)
-        
-        response = requests.post(
+
+        response = self._request(
+            'POST',
             url,
-            json=payload,
-            headers=self._get_headers()
+            **({'data': payload} if isinstance(payload, bytes) else {'json': payload})
         )
         
         if response.status_code == 201:
@@ -282,10 +654,10 @@ class MaBiSAPIClient:
         if resolution:
             params['resolution'] = resolution
         
-        response = requests.get(
+        response = self._request(
+            'GET',
             url,
-            params=params,
-            headers=self._get_headers()
+            params=params
         )
         
         response.raise_for_status()
@@ -295,10 +667,38 @@ class MaBiSAPIClient:
         """Retrieve a specific time series by ID"""
         url = f'{self.base_url}/time-series/{time_series_id}'
         
-        response = requests.get(url, headers=self._get_headers())
+        response = self._request('GET', url)
         response.raise_for_status()
         return response.json()
     
+    def patch_time_series(self, time_series_id: str, updates: List[Dict[str, Any]],
+                          expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Correct individual intervals of a stored time series without resubmitting it
+
+        Args:
+            time_series_id: ID of the time series
+            updates: [{'position': 5, 'quantity': '2.5', 'quality': 'SUBSTITUTE'}] or
+                [{'start': ..., 'end': ..., 'quality': ...}] for a time range
+            expected_version: Only apply if the series is still at this version
+
+        Returns:
+            New version and the changed ranges (changedRanges)
+        """
+        url = f'{self.base_url}/time-series/{time_series_id}'
+
+        payload = {'updates': updates}
+        if expected_version is not None:
+            payload['expectedVersion'] = expected_version
+
+        response = self._request('PATCH', url, data=encode_json_bytes(payload))
+
+        if response.status_code in [409, 422]:
+            problem = response.json()
+            raise ValueError(f"Time series update failed: {problem['detail']}")
+        response.raise_for_status()
+        return response.json()
+
     def get_balancing_group_aggregation(
         self,
         balancing_group_id: str,
@@ -315,10 +715,10 @@ class MaBiSAPIClient:
             'aggregationType': aggregation_type
         }
 
-        response = requests.get(
+        response = self._request(
+            'GET',
             url,
-            params=params,
-            headers=self._get_headers()
+            params=params
         )
 
         response.raise_for_status()
@@ -341,10 +741,10 @@ class MaBiSAPIClient:
         # Custom serialization for nested dataclasses
         payload = self._serialize_formula_submission(submission)
 
-        response = requests.post(
+        response = self._request(
+            'POST',
             url,
-            json=payload,
-            headers=self._get_headers()
+            json=payload
         )
 
         if response.status_code == 201:
@@ -359,7 +759,7 @@ class MaBiSAPIClient:
         """Retrieve a formula definition by ID"""
         url = f'{self.base_url}/formulas/{formula_id}'
 
-        response = requests.get(url, headers=self._get_headers())
+        response = self._request('GET', url)
         response.raise_for_status()
         return response.json()
 
@@ -378,7 +778,7 @@ class MaBiSAPIClient:
         if created_by:
             params['createdBy'] = created_by
 
-        response = requests.get(url, params=params, headers=self._get_headers())
+        response = self._request('GET', url, params=params)
         response.raise_for_status()
         return response.json()
 
@@ -394,12 +794,12 @@ class MaBiSAPIClient:
         """
         url = f'{self.base_url}/calculations'
 
-        payload = asdict(request)
+        payload = encode_json_bytes(request)
 
-        response = requests.post(
+        response = self._request(
+            'POST',
             url,
-            json=payload,
-            headers=self._get_headers()
+            data=payload
         )
 
         if response.status_code == 202:  # Accepted for processing
@@ -410,94 +810,463 @@ class MaBiSAPIClient:
         else:
             response.raise_for_status()
 
-    def get_calculation_result(self, calculation_id: str) -> Dict[str, Any]:
+    def execute_scenarios(self, formula_id: str, input_time_series: Dict[str, str],
+                          variants: List[Dict[str, Any]],
+                          period: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Evaluate one formula for many parameter variants in one call (what-if sweep)
+
+        Args:
+            formula_id: ID of a submitted formula
+            input_time_series: Parameter name -> time series ID (as in CalculationRequest)
+            variants: [{'variantId': ..., 'overrides': {parameterName: {'value': ..., 'scalingFactor': ...}}}]
+            period: Optional period (default: period of the first input)
+
+        Returns:
+            Columnar result; quantities[v][i] is interval i of variants[v]
+        """
+        url = f'{self.base_url}/calculations/scenarios'
+
+        payload = {'formulaId': formula_id, 'inputTimeSeries': input_time_series, 'variants': variants}
+        if period:
+            payload['period'] = period
+
+        response = self._request('POST', url, data=encode_json_bytes(payload))
+
+        if response.status_code in [400, 422]:
+            problem = response.json()
+            raise ValueError(f"Scenario request failed: {problem['detail']}")
+        response.raise_for_status()
+        return response.json()
+
+    def get_calculation_result(self, calculation_id: str, wait: Optional[float] = None) -> Dict[str, Any]:
         """
         Get the result of a calculation
 
         Args:
             calculation_id: ID of the calculation to retrieve
+            wait: Long-poll up to this many seconds while the calculation is
+                still PENDING (the server caps the wait)
 
         Returns:
             Calculation result including status and output time series ID
         """
         url = f'{self.base_url}/calculations/{calculation_id}'
 
-        response = requests.get(url, headers=self._get_headers())
+        if wait:
+            response = self._request('GET', url, params={'wait': wait}, timeout=self.timeout + wait)
+        else:
+            response = self._request('GET', url)
         response.raise_for_status()
         return response.json()
 
     def _serialize_formula_submission(self, submission: FormulaSubmission) -> Dict[str, Any]:
         """Helper to serialize FormulaSubmission with nested expressions"""
-        result = {
+        return {
             'messageId': submission.messageId,
             'messageDate': submission.messageDate,
-            'sender': asdict(submission.sender),
-            'formulas': []
+            'sender': dataclass_to_dict(submission.sender),
+            'formulas': [serialize_formula(formula) for formula in submission.formulas]
         }
 
-        for formula in submission.formulas:
-            formula_dict = {
-                'formulaId': formula.formulaId,
-                'name': formula.name,
-                'description': formula.description,
-                'expression': self._serialize_expression(formula.expression),
-                'inputTimeSeries': formula.inputTimeSeries,
-                'outputUnit': formula.outputUnit,
-                'outputResolution': formula.outputResolution
-            }
-
-            if formula.createdBy:
-                formula_dict['createdBy'] = formula.createdBy
-            if formula.createdAt:
-                formula_dict['createdAt'] = formula.createdAt
-            if formula.version:
-                formula_dict['version'] = formula.version
-            if formula.metadata:
-                formula_dict['metadata'] = formula.metadata
-
-            result['formulas'].append(formula_dict)
-
-        return result
-
     def _serialize_expression(self, expr: FormulaExpression) -> Dict[str, Any]:
         """Helper to serialize FormulaExpression recursively"""
-        result = {
-            'function': expr.function,
-            'parameters': []
-        }
+        return serialize_expression(expr)
 
-        for param in expr.parameters:
-            if isinstance(param, FormulaExpression):
-                # Nested expression - recurse
-                result['parameters'].append(self._serialize_expression(param))
-            else:
-                # Regular parameter
-                result['parameters'].append(asdict(param))
 
-        if expr.description:
-            result['description'] = expr.description
+# ==================== ASYNC CLIENT ====================
+
+class AsyncMaBiSAPIClient:
+    """
+    Asyncio counterpart of MaBiSAPIClient for mass uploads and calculations
+
+    Same methods as the blocking client, as coroutines. A semaphore bounds the
+    number of requests in flight, so callers can simply asyncio.gather()
+    thousands of calls. Responses with 429 or 503 (and connection errors) are
+    retried with exponential backoff and full jitter, honouring Retry-After.
+    Requires httpx (pip install httpx; for HTTP/2: pip install 'httpx[http2]').
+
+    Args:
+        base_url: API base URL including /v1
+        client_id: OAuth client ID
+        client_secret: OAuth client secret
+        max_concurrency: Maximum number of requests in flight
+        http2: Negotiate HTTP/2, multiplexing all requests over few connections
+        max_retries: Retries per request on 429/503 and connection errors
+        backoff_base: First backoff in seconds, doubled per retry (with jitter)
+        backoff_max: Upper bound of a single backoff in seconds
+        timeout: Timeout per request in seconds
+        refresh_margin: Seconds before expiry at which the token is refreshed
+    """
+
+    RETRY_STATUS = (429, 503)
+
+    def __init__(self, base_url: str, client_id: str, client_secret: str, max_concurrency: int = 100,
+                 http2: bool = False, max_retries: int = 5, backoff_base: float = 0.2,
+                 backoff_max: float = 10.0, timeout: float = 30.0, refresh_margin: float = 60.0):
+        if httpx is None:
+            raise ImportError("AsyncMaBiSAPIClient requires httpx: pip install httpx")
+
+        self.base_url = base_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.access_token = None
+        self.token_expires_at = 0.0
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._token_lock = asyncio.Lock()
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+
+    async def __aenter__(self) -> 'AsyncMaBiSAPIClient':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close all pooled connections"""
+        await self._client.aclose()
+
+    # Payload serialization is shared with the blocking client
+    _serialize_formula_submission = MaBiSAPIClient._serialize_formula_submission
+    _serialize_expression = MaBiSAPIClient._serialize_expression
+
+    async def authenticate(self) -> str:
+        """
+        Get OAuth 2.0 access token using client credentials flow
+        """
+        token_url = self.base_url.replace('/v1', '/oauth/token')
+
+        response = await self._send_with_retry('POST', token_url, data={
+            'grant_type': 'client_credentials',
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'scope': 'timeseries.write'
+        })
+
+        response.raise_for_status()
+        token_data = response.json()
+        self.access_token = token_data['access_token']
+        self.token_expires_at = time.monotonic() + token_data.get('expires_in', 3600)
+        return self.access_token
+
+    def _token_is_fresh(self) -> bool:
+        remaining = self.token_expires_at - time.monotonic()
+        return self.access_token is not None and remaining > self.refresh_margin
+
+    async def _ensure_token(self, stale_token: Optional[str] = None) -> str:
+        """Return a valid access token; concurrent callers share one refresh"""
+        token = self.access_token
+        if token != stale_token and self._token_is_fresh():
+            return token
+
+        async with self._token_lock:
+            if self.access_token != stale_token and self._token_is_fresh():
+                return self.access_token
+            return await self.authenticate()
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Full-jitter exponential backoff; a Retry-After header (in seconds) takes precedence"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _send_with_retry(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send one request inside the concurrency limit, retrying 429/503 and connection errors"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code not in self.RETRY_STATUS or attempt == self.max_retries:
+                return response
+            # Sleep outside the semaphore so waiting retries do not block other requests
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Authenticated request; a 401 refreshes the token once and retries"""
+        token = await self._ensure_token()
+        response = await self._send_with_retry(method, url, headers=MaBiSAPIClient._auth_headers(token), **kwargs)
+        if response.status_code == 401:
+            token = await self._ensure_token(stale_token=token)
+            response = await self._send_with_retry(method, url, headers=MaBiSAPIClient._auth_headers(token),
+                                                   **kwargs)
+        return response
+
+    async def submit_time_series(self, submission: TimeSeriesSubmission) -> Dict[str, Any]:
+        """Submit time series data to MaBiS-Hub"""
+        response = await self._request('POST', f'{self.base_url}/time-series',
+                                       content=encode_json_bytes(submission))
 
-        return result
+        if response.status_code == 201:
+            return response.json()
+        elif response.status_code in [400, 422]:
+            problem = response.json()
+            raise ValueError(f"Validation failed: {problem['detail']}")
+        else:
+            response.raise_for_status()
+
+    async def query_time_series(
+        self,
+        market_location_id: str = None,
+        period_start: str = None,
+        period_end: str = None,
+        measurement_type: str = None,
+        resolution: str = None,
+        page_size: int = 100
+    ) -> Dict[str, Any]:
+        """Query time series data with filters"""
+        params = {'pageSize': page_size}
+        if market_location_id:
+            params['marketLocationId'] = market_location_id
+        if period_start:
+            params['periodStart'] = period_start
+        if period_end:
+            params['periodEnd'] = period_end
+        if measurement_type:
+            params['measurementType'] = measurement_type
+        if resolution:
+            params['resolution'] = resolution
+
+        response = await self._request('GET', f'{self.base_url}/time-series', params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_time_series_by_id(self, time_series_id: str) -> Dict[str, Any]:
+        """Retrieve a specific time series by ID"""
+        response = await self._request('GET', f'{self.base_url}/time-series/{time_series_id}')
+        response.raise_for_status()
+        return response.json()
+
+    async def submit_formula(self, submission: FormulaSubmission) -> Dict[str, Any]:
+        """Submit a formula definition to the API"""
+        payload = self._serialize_formula_submission(submission)
+        response = await self._request('POST', f'{self.base_url}/formulas', json=payload)
+
+        if response.status_code == 201:
+            return response.json()
+        elif response.status_code in [400, 422]:
+            problem = response.json()
+            raise ValueError(f"Formula validation failed: {problem['detail']}")
+        else:
+            response.raise_for_status()
+
+    async def execute_calculation(self, request: CalculationRequest) -> Dict[str, Any]:
+        """Execute a calculation using a formula on time series data"""
+        response = await self._request('POST', f'{self.base_url}/calculations',
+                                       content=encode_json_bytes(request))
+
+        if response.status_code == 202:  # Accepted for processing
+            return response.json()
+        elif response.status_code in [400, 422]:
+            problem = response.json()
+            raise ValueError(f"Calculation request failed: {problem['detail']}")
+        else:
+            response.raise_for_status()
+
+    async def get_calculation_result(self, calculation_id: str, wait: Optional[float] = None) -> Dict[str, Any]:
+        """Get the result of a calculation, long-polling up to wait seconds while it is PENDING"""
+        url = f'{self.base_url}/calculations/{calculation_id}'
+        if wait:
+            response = await self._request('GET', url, params={'wait': wait}, timeout=self.timeout + wait)
+        else:
+            response = await self._request('GET', url)
+        response.raise_for_status()
+        return response.json()
+
+
+# ==================== LOCAL EVALUATION ====================
+
+def _local_timeline(ts: TimeSeries, intervals: List[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    """(start, step) of a series whose intervals lie on a regular timeline, else None (like the server)"""
+    step = interval_calendar.RESOLUTION_SECONDS.get(ts.resolution)
+    if not step or not intervals:
+        return None
+    start = interval_calendar.parse_utc_instant(intervals[0].get('start'))
+    if start is None:
+        return None
+    boundaries = interval_calendar.interval_timestamps(start, step, len(intervals))
+    for idx, interval in enumerate(intervals):
+        if (interval.get('position') != idx + 1 or interval.get('start') != boundaries[idx]
+                or interval.get('end') != boundaries[idx + 1]):
+            return None
+    return start, step
+
+
+def _local_span(ts: TimeSeries, intervals: List[Dict[str, Any]]) -> Tuple[Optional[int], Optional[int]]:
+    """[start, end] of an input series in UTC epoch seconds (None where unknown)"""
+    timeline = _local_timeline(ts, intervals)
+    if timeline is not None:
+        return timeline[0], timeline[0] + len(intervals) * timeline[1]
+    period = ts.period or {}
+    return (interval_calendar.parse_utc_instant(period.get('start')),
+            interval_calendar.parse_utc_instant(period.get('end')))
+
+
+def _local_period_intervals(ts: TimeSeries, intervals: List[Dict[str, Any]],
+                            bounds: Optional[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    """Intervals of an input series within the period, sliced like the server's select_period"""
+    timeline = _local_timeline(ts, intervals) if bounds is not None else None
+    if timeline is None:
+        return intervals
+    try:
+        first, stop = interval_calendar.period_indices(timeline[0], timeline[1], len(intervals), *bounds)
+    except ValueError as e:
+        raise ValueError(f"Time series {ts.timeSeriesId}: {e}")
+    return intervals[first:stop]
+
+
+def _bind_local_inputs(bindings: List[str], inputs: Dict[str, TimeSeries],
+                       intervals: Dict[str, List[Dict[str, Any]]],
+                       bounds: Optional[Tuple[int, int]]) -> Dict[str, str]:
+    """
+    Key in inputs per reference, bound like the server's bind_input_series
+
+    Parameter names bind to inputs of that name first. Metering point
+    references bind to the last input of that metering point and OBIS code
+    that covers the period (the last one at all if none covers it).
+    """
+    resolved = {name: name for name in inputs}
+    unbound = []
+    for name in bindings:
+        if name in resolved:
+            continue
+        candidates = [key for key, ts in inputs.items() if ts.meteringPointId
+                      and formula_engine.metering_point_key(ts.meteringPointId, ts.obisCode) == name]
+        if not candidates:
+            unbound.append(name)
+            continue
+        covering = []
+        for key in candidates:
+            start, end = _local_span(inputs[key], intervals[key])
+            if bounds is None or (start is not None and end is not None
+                                  and start <= bounds[0] and bounds[1] <= end):
+                covering.append(key)
+        resolved[name] = (covering or candidates)[-1]
+    if unbound:
+        raise ValueError(f"No input series binds {', '.join(unbound)}")
+    return resolved
+
+
+def evaluate_formula_locally(formula: Formula, inputs: Dict[str, TimeSeries],
+                             output_time_series_id: Optional[str] = None,
+                             period: Optional[Dict[str, str]] = None) -> TimeSeries:
+    """
+    Evaluate a Formula in-process, without submitting it
+
+    Uses the server's engine (formula_engine.py), so the output intervals are
+    identical to those of a calculation with the same inputs. Use it to try
+    out formula definitions before submitting them.
+
+    Args:
+        formula: Formula to evaluate
+        inputs: Parameter name -> input TimeSeries (like CalculationRequest.inputTimeSeries,
+            with the series instead of their IDs). Metering point references without
+            an entry bind to an input of that metering point and OBIS code.
+        output_time_series_id: ID of the returned series (default: LOCAL-<formulaId>)
+        period: Calculation period; regular inputs are sliced to it like on the server
+            (default: all intervals, period of the first input)
+
+    Returns:
+        Output TimeSeries with the server's interval representation
+        (position, quantity with 3 decimals, quality VALIDATED, start, end)
+
+    Raises:
+        ValueError: inputs is empty, lacks a series the formula references, an input
+            does not cover the period or a parameter cannot be resolved
+            (see formula_engine.resolve_parameters)
+        ImportError: formula_engine.py or interval_calendar.py is not available
+    """
+    if formula_engine is None or interval_calendar is None:
+        raise ImportError("evaluate_formula_locally requires formula_engine.py and interval_calendar.py "
+                          "next to this client")
+    if not inputs:
+        raise ValueError("At least one input time series is required")
+
+    bounds = None
+    if period:
+        bounds = (interval_calendar.parse_utc_instant(period.get('start')),
+                  interval_calendar.parse_utc_instant(period.get('end')))
+        if None in bounds:
+            raise ValueError("period needs ISO 8601 start and end timestamps with time zone")
+
+    intervals = {
+        name: [interval if isinstance(interval, dict) else dataclass_to_dict(interval) for interval in ts.intervals]
+        for name, ts in inputs.items()
+    }
+    # Same path as the server: resolve typed parameters, intern the plan, bind its slots, evaluate the columns
+    expression, problems = formula_engine.resolve_parameters(
+        serialize_expression(formula.expression),
+        [dataclass_to_dict(point) for point in formula.inputMeteringPoints or []], formula.lossFactor)
+    if problems:
+        raise ValueError('; '.join(problems))
+    plan, bindings = formula_engine.PlanRegistry().intern(expression)
+    bound = _bind_local_inputs(bindings, inputs, intervals, bounds)
+    input_data = {name: _local_period_intervals(inputs[key], intervals[key], bounds) for name, key in bound.items()}
+
+    # The first bound input determines the intervals of the output series
+    first_input = inputs[next(iter(bound.values()))]
+    first_intervals = next(iter(input_data.values()))
+    count = len(first_intervals)
+    columns = formula_engine.bind_inputs(bindings, input_data, count)
+    timestamps = first_intervals if first_intervals and 'start' in first_intervals[0] else None
+    result_intervals = formula_engine.calculate_plan(plan.expression, columns, count, timestamps=timestamps)
+
+    return TimeSeries(
+        timeSeriesId=output_time_series_id or f"LOCAL-{formula.formulaId}",
+        marketLocationId=first_input.marketLocationId,
+        measurementType=formula.outputUnit,
+        unit=formula.outputUnit,
+        resolution=formula.outputResolution,
+        period=period or first_input.period,
+        intervals=result_intervals,
+        metadata={'calculatedBy': formula.formulaId, 'formulaName': formula.name, 'calculatedLocally': True}
+    )
 
 
 def generate_15min_intervals(date: datetime, market_location_id: str) -> List[Interval]:
     """
-    Generate 96 intervals (15-minute resolution) for a full day
+    Generate the 15-minute intervals of one day starting at date
     Simulates metering data
+
+    With a local time zone (e.g. ZoneInfo("Europe/Berlin")) the day runs from
+    local midnight to local midnight: 92 intervals on the spring and 100 on
+    the autumn DST switch, otherwise 96. Timestamps are sent in UTC.
     """
+    day_start = date.astimezone(timezone.utc)
+    # Aware arithmetic adds wall-clock time, so this is the next local midnight
+    day_end = (date + timedelta(days=1)).astimezone(timezone.utc)
+    count = int((day_end - day_start) / timedelta(minutes=15))
+    if interval_calendar is not None:
+        boundaries = interval_calendar.interval_timestamps(int(day_start.timestamp()), 900, count)
+    else:
+        boundaries = [(day_start + timedelta(minutes=15 * idx)).isoformat().replace('+00:00', 'Z')
+                      for idx in range(count + 1)]
     intervals = []
     
-    for position in range(1, 97):  # 96 intervals per day
-        interval_start = date + timedelta(minutes=(position - 1) * 15)
-        interval_end = interval_start + timedelta(minutes=15)
-        
+    for position in range(1, count + 1):
         # Simulate consumption value (2-3 kWh per 15min)
         quantity = f"{2.0 + (position % 10) * 0.123456:.6f}"
         
         intervals.append(Interval(
             position=position,
-            start=interval_start.isoformat().replace('+00:00', 'Z'),
-            end=interval_end.isoformat().replace('+00:00', 'Z'),
+            start=boundaries[position - 1],
+            end=boundaries[position],
             quantity=quantity,
             quality="METERED"
         ))
@@ -554,7 +1323,7 @@ def example_submit_metering_data():
             'start': yesterday.isoformat().replace('+00:00', 'Z'),
             'end': (yesterday + timedelta(days=1)).isoformat().replace('+00:00', 'Z')
         },
-        intervals=[asdict(interval) for interval in intervals]
+        intervals=intervals
     )
     
     # Create submission
@@ -835,14 +1604,12 @@ def example_execute_calculation():
         print(f"   Calculation ID: {result.get('calculationId')}")
         print(f"   Status: {result.get('status')}")
 
-        # Poll for result
+        # Long-poll for result: the server answers as soon as the calculation finishes
         calc_id = result.get('calculationId')
         if calc_id:
-            print("\nPolling for calculation result...")
-            import time
-            for i in range(5):  # Poll up to 5 times
-                time.sleep(2)
-                calc_result = client.get_calculation_result(calc_id)
+            print("\nWaiting for calculation result...")
+            for i in range(5):  # Up to 5 long-polls
+                calc_result = client.get_calculation_result(calc_id, wait=10)
                 status = calc_result.get('status')
                 print(f"   Attempt {i+1}: Status = {status}")
 
@@ -1067,6 +1834,19 @@ def example_pv_loss_factor():
         print(f"   Scaling Factor: {0.9951}")
     except ValueError as e:
         print(f"❌ Error: {e}")
+        return
+
+    # Loss-factor study: the same formula with loss factors from 0.3% to 0.7%
+    variants = [
+        {'variantId': f'LOSS-{loss:.2f}', 'overrides': {'pv_feedin': {'scalingFactor': round(1 - loss / 100, 6)}}}
+        for loss in (0.3, 0.4, 0.49, 0.6, 0.7)
+    ]
+    try:
+        sweep = client.execute_scenarios(formula.formulaId, {'W-3.5.7': 'TS-PV-357-20251202'}, variants)
+        for variant, quantities in zip(sweep['variants'], sweep['quantities']):
+            print(f"   {variant['variantId']}: {sum(float(q) for q in quantities):.3f} KWH")
+    except (ValueError, requests.HTTPError) as e:
+        print(f"❌ Scenario sweep failed: {e}")
 
 
 def example_selfconsumption_aggregation():
@@ -1162,3 +1942,178 @@ def example_selfconsumption_aggregation():
         print(f"   TSO: {formula.metadata.get('tsoOperator')}")
     except ValueError as e:
         print(f"❌ Error: {e}")
+
+
+async def example_async_mass_upload(count: int = 1000):
+    """Example: upload many time series concurrently with the asyncio client"""
+    sender = MarketParticipant(id="9900123456789", role="MSB", name="Stadtwerke Musterstadt")
+    receiver = MarketParticipant(id="9900987654321", role="BKV", name="MaBiS-Hub")
+    date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def submission(idx: int) -> TimeSeriesSubmission:
+        market_location_id = f"DE{idx:031d}"
+        return TimeSeriesSubmission(
+            messageId=f"MSG-ASYNC-{idx:06d}",
+            messageDate=datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            sender=sender,
+            receiver=receiver,
+            timeSeries=[TimeSeries(
+                timeSeriesId=f"TS-ASYNC-{idx:06d}",
+                marketLocationId=market_location_id,
+                measurementType="CONSUMPTION",
+                unit="KWH",
+                resolution="PT15M",
+                period={
+                    "start": date.isoformat().replace('+00:00', 'Z'),
+                    "end": (date + timedelta(days=1)).isoformat().replace('+00:00', 'Z')
+                },
+                intervals=generate_15min_intervals(date, market_location_id)
+            )]
+        )
+
+    async with AsyncMaBiSAPIClient(
+        base_url="https://api.mabis-hub.de/v1",
+        client_id="your-client-id",
+        client_secret="your-client-secret",
+        max_concurrency=200
+    ) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(client.submit_time_series(submission(idx)) for idx in range(count)),
+                                       return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+    failed = [result for result in results if isinstance(result, Exception)]
+    print(f"✅ {count - len(failed)} of {count} time series submitted in {elapsed:.1f}s")
+    if failed:
+        print(f"❌ First error: {failed[0]}")
+
+
+def example_local_formula_evaluation():
+    """Example: try out a Wenn_Dann formula locally before submitting it"""
+    date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    period = {
+        "start": date.isoformat().replace('+00:00', 'Z'),
+        "end": (date + timedelta(days=1)).isoformat().replace('+00:00', 'Z')
+    }
+
+    def series(ts_id: str, market_location_id: str) -> TimeSeries:
+        return TimeSeries(timeSeriesId=ts_id, marketLocationId=market_location_id, measurementType="CONSUMPTION",
+                          unit="KWH", resolution="PT15M", period=period,
+                          intervals=generate_15min_intervals(date, market_location_id))
+
+    # Wenn_Dann: If TS1 > TS2 - 0.1, return TS1, else 0
+    formula = Formula(
+        formulaId="FORM-LOCAL-001",
+        name="Bedingter Vergleich (lokal)",
+        description="Gibt TS1 zurück wenn größer als TS2 - 0,1, sonst 0",
+        expression=FormulaExpression(
+            function=FormulaFunction.WENN_DANN.value,
+            parameters=[
+                FormulaParameter(name="linieA", value="TS1", type="timeseries_ref"),
+                FormulaParameter(name="komparator", value=">", type="string"),
+                FormulaExpression(
+                    function=FormulaFunction.GRP_SUM.value,
+                    parameters=[
+                        FormulaParameter(name="basis", value="TS2", type="timeseries_ref"),
+                        FormulaParameter(name="toleranz", value=-0.1, type="constant")
+                    ]
+                ),
+                FormulaParameter(name="dann", value="TS1", type="timeseries_ref"),
+                FormulaParameter(name="sonst", value=0, type="constant")
+            ]
+        ),
+        inputTimeSeries=["TS1", "TS2"],
+        outputUnit="KWH",
+        outputResolution="PT15M"
+    )
+
+    started = time.perf_counter()
+    result = evaluate_formula_locally(formula, {
+        "TS1": series("TS-LOCAL-1", "DE00000000001"),
+        "TS2": series("TS-LOCAL-2", "DE00000000002"),
+    })
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    total = sum(float(interval['quantity']) for interval in result.intervals)
+    print(f"✅ Evaluated {len(result.intervals)} intervals locally in {elapsed_ms:.1f} ms")
+    print(f"   Sum: {total:.3f} {result.unit}")
+
+
+def example_local_server_parity():
+    """
+    Example: check that a formula with OBIS references and a loss factor
+    evaluates to the same intervals locally and on the server
+    """
+    client = MaBiSAPIClient(
+        base_url='https://api-test.mabis-hub.de/v1',
+        client_id='YOUR_CLIENT_ID',
+        client_secret='YOUR_CLIENT_SECRET'
+    )
+
+    sender = MarketParticipant(id='DE0212345678901', role='MSB')
+    receiver = MarketParticipant(id='DE0087654321098', role='NB')
+    date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    period = {
+        "start": date.isoformat().replace('+00:00', 'Z'),
+        "end": (date + timedelta(days=1)).isoformat().replace('+00:00', 'Z')
+    }
+    tag = date.strftime('%Y%m%d')
+
+    def series(ts_id: str, metering_point_id: str, obis_code: str) -> TimeSeries:
+        return TimeSeries(timeSeriesId=ts_id, marketLocationId="DE00000000357", measurementType="GENERATION",
+                          unit="KWH", resolution="PT15M", period=period,
+                          intervals=generate_15min_intervals(date, metering_point_id),
+                          meteringPointId=metering_point_id, obisCode=obis_code)
+
+    pv_feedin = series(f"TS-PARITY-PV-{tag}", "ZP_3.5.7", "1-1:2.29.0")
+    pv_demand = series(f"TS-PARITY-EV-{tag}", "ZP_3.5.8", "1-1:1.29.0")
+
+    # W−3.5.7 * (1 - fVerluste) - W+3.5.8: the OBIS reference and the loss factor
+    # without a value are resolved against inputMeteringPoints and lossFactor
+    formula = Formula(
+        formulaId="FORM-PARITY-PV-LOSSES",
+        name="PV-Einspeisung mit Verlusten abzüglich Bezug",
+        description="W−3.5.7 * (1 - fVerluste) - W+3.5.8",
+        expression=FormulaExpression(
+            function=FormulaFunction.GRP_SUM.value,
+            parameters=[
+                FormulaParameter(name="pv_feedin", value="1-1:2.29.0", type="obis_code"),
+                FormulaParameter(name="fVerluste", value=None, type="loss_factor"),
+                FormulaParameter(name="pv_demand", value="ZP_3.5.8", type="metering_point_ref", scalingFactor=-1.0)
+            ]
+        ),
+        inputTimeSeries=[],
+        outputUnit="KWH",
+        outputResolution="PT15M",
+        inputMeteringPoints=[
+            MeteringPoint("ZP_3.5.7", "1-1:2.29.0", "FEED_IN", "PV-Park feed-in meter"),
+            MeteringPoint("ZP_3.5.8", "1-1:1.29.0", "CONSUMPTION", "PV-Park demand meter")
+        ],
+        lossFactor=0.0049
+    )
+
+    try:
+        client.submit_time_series(TimeSeriesSubmission(
+            f"TS-MSG-PARITY-{tag}", period["start"], sender, receiver, [pv_feedin, pv_demand]))
+        client.submit_formula(FormulaSubmission(
+            f"FORM-MSG-PARITY-{tag}", period["start"], sender, [formula]))
+        client.execute_calculation(CalculationRequest(
+            calculationId=f"CALC-PARITY-{tag}", requestDate=period["start"], formulaId=formula.formulaId,
+            inputTimeSeries={}, period=period, requestedBy=sender,
+            outputTimeSeriesId=f"TS-PARITY-OUT-{tag}"))
+        calculation = client.get_calculation_result(f"CALC-PARITY-{tag}", wait=30)
+        if calculation.get('status') != 'COMPLETED':
+            print(f"❌ Calculation ended as {calculation.get('status')}: {calculation.get('errors')}")
+            return
+        server_intervals = client.get_time_series_by_id(calculation['outputTimeSeriesId'])['intervals']
+    except (ValueError, requests.HTTPError) as e:
+        print(f"❌ Error: {e}")
+        return
+
+    local_intervals = evaluate_formula_locally(formula, {"pv_feedin": pv_feedin, "pv_demand": pv_demand},
+                                               period=period).intervals
+    mismatches = [server for server, local in zip(server_intervals, local_intervals) if server != local]
+    if len(server_intervals) != len(local_intervals) or mismatches:
+        print(f"❌ Local and server results differ ({len(mismatches)} intervals)")
+    else:
+        print(f"✅ {len(local_intervals)} intervals identical locally and on the server")
@@ -0,0 +1,662 @@
+"""
+MaBiS Time Series API - Thread-safe In-Memory Store
+
+Collections used by the mock server (time series, formulas, calculations,
+metering point index), the registry of issued OAuth tokens, the retention
+bookkeeping for calculation results, the registry of calculation status events
+and the append buffers of pushed metering values.
+Each collection is guarded by its own readers-writer lock: lookups on different
+collections never contend, and concurrent reads of one collection run in parallel.
+
+Records are treated as immutable once stored. Writers build a new record and
+swap it in under the write lock, so a reader may serialize a record it obtained
+without holding any lock while other requests keep updating the collection.
+
+For multi-process serving the collections can live in a single store process
+(StoreManager) that all worker processes reach through multiprocessing proxies.
+
+Verwendung (eigenständiger Store-Prozess):
+    python store.py --address /tmp/mabis-store.sock
+    MABIS_STORE_ADDRESS=/tmp/mabis-store.sock gunicorn -w 4 -b :8000 mock_api_server:app
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date
+from functools import partial
+from multiprocessing.managers import BaseManager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from interval_calendar import DEFAULT_TIMEZONE, Span, format_utc_instant, local_date, local_day
+
+
+class RWLock:
+    """Readers-writer lock with writer preference (not reentrant)"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class LockedCollection:
+    """Keyed collection of immutable records guarded by a readers-writer lock"""
+
+    def __init__(self):
+        self._items: Dict[str, Any] = {}
+        self._lock = RWLock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock.read():
+            return self._items.get(key, default)
+
+    def put(self, key: str, record: Any) -> None:
+        """Swap in a fully built record"""
+        with self._lock.write():
+            self._items[key] = record
+
+    def put_many(self, records: Dict[str, Any], version_field: Optional[str] = None) -> Dict[str, int]:
+        """
+        Swap in several records at once; readers see all or none of them
+
+        With version_field, each record gets that field set to one more than
+        the record it replaces (1 for new keys; a replaced record without the
+        field counts as version 1).
+
+        Returns:
+            Mapping of key to the assigned version (empty without version_field)
+        """
+        versions = {}
+        with self._lock.write():
+            if version_field:
+                for key in records:
+                    current = self._items.get(key)
+                    versions[key] = current.get(version_field, 1) + 1 if current is not None else 1
+                records = {key: dict(record, **{version_field: versions[key]}) for key, record in records.items()}
+            self._items.update(records)
+        return versions
+
+    def update(self, key: str, changes: Dict[str, Any], create: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Merge changes into a stored record (copy-on-write)
+
+        With create=True a missing record is created from changes.
+
+        Returns:
+            The new record, or None if the key does not exist
+        """
+        with self._lock.write():
+            current = self._items.get(key)
+            if current is None:
+                if not create:
+                    return None
+                current = {}
+            updated = dict(current)
+            updated.update(changes)
+            self._items[key] = updated
+            return updated
+
+    def get_summary(self, key: str, field: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        """The record without its list field plus that list's length, or None if the key does not exist"""
+        with self._lock.read():
+            current = self._items.get(key)
+            if current is None:
+                return None
+            return {name: value for name, value in current.items() if name != field}, len(current.get(field) or ())
+
+    def update_items(self, key: str, field: str, changes: Dict[int, Dict[str, Any]], version_field: str = 'version',
+                     expected_version: Optional[int] = None) -> Optional[Tuple[int, Optional[List[int]]]]:
+        """
+        Merge changes into entries of a list field of a stored record (copy-on-write)
+
+        changes maps list index to the fields to merge into that entry. The
+        list is copied shallowly and only the entries whose fields actually
+        change are rebuilt; if any did, version_field is incremented (a
+        record without it counts as version 1).
+
+        Returns:
+            None if the key does not exist, (current version, None) if
+            expected_version does not match, otherwise (new version, sorted
+            indices of the entries that changed)
+        """
+        with self._lock.write():
+            current = self._items.get(key)
+            if current is None:
+                return None
+            version = current.get(version_field, 1)
+            if expected_version is not None and expected_version != version:
+                return version, None
+
+            entries = list(current[field])
+            changed = []
+            for index in sorted(changes):
+                entry = entries[index]
+                if any(entry.get(name) != value for name, value in changes[index].items()):
+                    entries[index] = dict(entry, **changes[index])
+                    changed.append(index)
+            if changed:
+                version += 1
+                self._items[key] = dict(current, **{field: entries, version_field: version})
+            return version, changed
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock.write():
+            return self._items.pop(key, default)
+
+    def values(self) -> List[Any]:
+        """Snapshot of all records"""
+        with self._lock.read():
+            return list(self._items.values())
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Snapshot of all (key, record) pairs"""
+        with self._lock.read():
+            return list(self._items.items())
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock.read():
+            return key in self._items
+
+    def __len__(self) -> int:
+        with self._lock.read():
+            return len(self._items)
+
+
+class TokenRegistry:
+    """
+    Issued OAuth tokens with expiry
+
+    Validation is a single dict lookup plus an expiry comparison. Expired tokens
+    are evicted through time buckets: each token sits in the bucket of its expiry
+    second // bucket_seconds, and a min-heap of bucket numbers lets issue() drop
+    every bucket that lies completely in the past. Each token is evicted once, so
+    eviction is O(1) amortized per token. max_tokens bounds memory even before
+    tokens expire by evicting the soonest-expiring ones first.
+    """
+
+    def __init__(self, bucket_seconds: int = 60, max_tokens: int = 100_000):
+        self.bucket_seconds = bucket_seconds
+        self.max_tokens = max_tokens
+        self._expires_at: Dict[str, float] = {}
+        self._buckets: Dict[int, Deque[str]] = {}
+        self._bucket_heap: List[int] = []
+        self._lock = threading.Lock()
+
+    def issue(self, token: str, expires_in: float) -> float:
+        """Register a token; returns its expiry as epoch seconds"""
+        now = time.time()
+        expires_at = now + expires_in
+        bucket = int(expires_at // self.bucket_seconds)
+        with self._lock:
+            self._evict_expired(now)
+            self._expires_at[token] = expires_at
+            if bucket not in self._buckets:
+                self._buckets[bucket] = deque()
+                heapq.heappush(self._bucket_heap, bucket)
+            self._buckets[bucket].append(token)
+            while len(self._expires_at) > self.max_tokens:
+                self._evict_soonest()
+        return expires_at
+
+    def is_valid(self, token: str) -> bool:
+        """One hash lookup; dict.get is atomic, so no lock is taken"""
+        expires_at = self._expires_at.get(token)
+        return expires_at is not None and expires_at > time.time()
+
+    def revoke(self, token: str) -> None:
+        # The bucket entry stays behind and is skipped when its bucket is evicted
+        with self._lock:
+            self._expires_at.pop(token, None)
+
+    def _evict_expired(self, now: float):
+        current_bucket = int(now // self.bucket_seconds)
+        while self._bucket_heap and self._bucket_heap[0] < current_bucket:
+            for token in self._buckets.pop(heapq.heappop(self._bucket_heap)):
+                self._expires_at.pop(token, None)
+
+    def _evict_soonest(self):
+        bucket = self._bucket_heap[0]
+        tokens = self._buckets[bucket]
+        self._expires_at.pop(tokens.popleft(), None)
+        if not tokens:
+            del self._buckets[bucket]
+            heapq.heappop(self._bucket_heap)
+
+    def __len__(self) -> int:
+        return len(self._expires_at)
+
+
+class RetentionTracker:
+    """
+    Retention bookkeeping for calculation records and their generated outputs
+
+    Entries are kept in completion order. track() registers a finished
+    calculation and returns the entries that now exceed the configured TTL,
+    maximum count or maximum bytes, oldest first; the caller removes (and
+    optionally spills) them. expire() returns the entries past the TTL
+    without a new completion, so results also age out on an idle server.
+    Unset limits are not enforced.
+
+    Configuration (from_env):
+        MABIS_CALC_TTL_SECONDS   maximum age of a calculation result
+        MABIS_CALC_MAX_COUNT     maximum number of retained calculations
+        MABIS_CALC_MAX_BYTES     maximum estimated size of retained results
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_count: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        # calculation_id -> (completed_at, output_ts_id, size_bytes)
+        self._entries: 'OrderedDict[str, Tuple[float, Optional[str], int]]' = OrderedDict()
+        self._bytes = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RetentionTracker':
+        def env_number(name, convert):
+            value = os.environ.get(name)
+            return convert(value) if value else None
+
+        return cls(ttl_seconds=env_number('MABIS_CALC_TTL_SECONDS', float),
+                   max_count=env_number('MABIS_CALC_MAX_COUNT', int),
+                   max_bytes=env_number('MABIS_CALC_MAX_BYTES', int))
+
+    def track(self, calculation_id: str, output_ts_id: Optional[str] = None,
+              size_bytes: int = 0) -> List[Tuple[str, Optional[str]]]:
+        """
+        Register a finished calculation
+
+        Returns:
+            (calculation_id, output_ts_id) pairs to evict, oldest first
+        """
+        now = time.time()
+        with self._lock:
+            previous = self._entries.pop(calculation_id, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[calculation_id] = (now, output_ts_id, size_bytes)
+            self._bytes += size_bytes
+            return self._pop_while(lambda: self._over_limit(now))
+
+    def expire(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        Entries older than the TTL
+
+        Returns:
+            (calculation_id, output_ts_id) pairs to evict, oldest first
+        """
+        if self.ttl_seconds is None:
+            return []
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            return self._pop_while(lambda: next(iter(self._entries.values()))[0] < cutoff)
+
+    def _pop_while(self, condition: Callable[[], bool]) -> List[Tuple[str, Optional[str]]]:
+        victims = []
+        while self._entries and condition():
+            victim_id, (_, victim_output, victim_size) = self._entries.popitem(last=False)
+            self._bytes -= victim_size
+            victims.append((victim_id, victim_output))
+        self._evicted += len(victims)
+        return victims
+
+    def untrack(self, calculation_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Forget a calculation, e.g. when its ID is reused for a new calculation
+
+        Returns:
+            (calculation_id, output_ts_id) of the dropped entry, None if it was not tracked
+        """
+        with self._lock:
+            entry = self._entries.pop(calculation_id, None)
+            if entry is None:
+                return None
+            self._bytes -= entry[2]
+            return calculation_id, entry[1]
+
+    def _over_limit(self, now: float) -> bool:
+        oldest_completed_at = next(iter(self._entries.values()))[0]
+        return ((self.ttl_seconds is not None and now - oldest_completed_at > self.ttl_seconds)
+                or (self.max_count is not None and len(self._entries) > self.max_count)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'retained': len(self._entries), 'bytes': self._bytes, 'evicted': self._evicted}
+
+
+TERMINAL_CALCULATION_STATUSES = ('COMPLETED', 'FAILED')
+
+
+class CalculationEvents:
+    """
+    Status transitions of calculations, for long-polling and event streams
+
+    publish() appends an event with a sequence number to a bounded history.
+    Long-polling waits on one threading.Event per calculation, created on
+    demand and set when the calculation reaches a terminal status, so a
+    completion wakes only the requests waiting for it. Event streams wait on
+    a condition for events newer than the last sequence number they saw.
+
+    Terminal calculation IDs are remembered (bounded by history) so a waiter
+    registering just after the completion returns immediately instead of
+    missing the wakeup. Callers publish only after the calculation record is
+    updated in the store.
+    """
+
+    def __init__(self, history: int = 10_000):
+        self.history = history
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._sequence = 0
+        self._finished: 'OrderedDict[str, None]' = OrderedDict()
+        self._waiters: Dict[str, threading.Event] = {}
+        self._cond = threading.Condition(threading.Lock())
+
+    def publish(self, calculation_id: str, status: str, **fields: Any) -> int:
+        """Record a status transition and wake its waiters; returns the sequence number"""
+        with self._cond:
+            self._sequence += 1
+            sequence = self._sequence
+            self._events.append(dict(fields, id=sequence, calculationId=calculation_id, status=status))
+            waiter = None
+            if status in TERMINAL_CALCULATION_STATUSES:
+                self._finished[calculation_id] = None
+                while len(self._finished) > self.history:
+                    self._finished.popitem(last=False)
+                waiter = self._waiters.pop(calculation_id, None)
+            else:
+                # A reused calculation ID is running again
+                self._finished.pop(calculation_id, None)
+            self._cond.notify_all()
+        if waiter is not None:
+            waiter.set()
+        return sequence
+
+    def wait(self, calculation_id: str, timeout: float) -> bool:
+        """Block until the calculation reaches a terminal status; False on timeout"""
+        with self._cond:
+            if calculation_id in self._finished:
+                return True
+            waiter = self._waiters.get(calculation_id)
+            if waiter is None:
+                waiter = self._waiters[calculation_id] = threading.Event()
+        if waiter.wait(timeout):
+            return True
+        with self._cond:
+            # Drop the waiter of an abandoned calculation, unless it finished meanwhile
+            if not waiter.is_set() and self._waiters.get(calculation_id) is waiter:
+                del self._waiters[calculation_id]
+            return waiter.is_set()
+
+    def events_since(self, sequence: int, timeout: float) -> List[Dict[str, Any]]:
+        """
+        Events newer than sequence, blocking up to timeout until there is one
+
+        Events that already dropped out of the history are skipped.
+        """
+        with self._cond:
+            if self._sequence <= sequence:
+                self._cond.wait_for(lambda: self._sequence > sequence, timeout)
+            return [event for event in self._events if event['id'] > sequence]
+
+    def latest_sequence(self) -> int:
+        with self._cond:
+            return self._sequence
+
+
+# Quality codes of buffered values; 0 marks an interval without a value
+BUFFER_QUALITIES = ('MISSING', 'METERED', 'ESTIMATED', 'SUBSTITUTE', 'FORECASTED', 'VALIDATED')
+
+
+class DayBuffer:
+    """Preallocated values of one metering point and OBIS code for one local day"""
+
+    __slots__ = ('span', 'values', 'qualities', 'filled')
+
+    def __init__(self, span: Span):
+        self.span = span
+        self.values = array('d', bytes(8 * span.count))
+        self.qualities = bytearray(span.count)
+        self.filled = 0
+
+
+class MeteringBuffers:
+    """
+    Append buffers for metering values pushed per metering point
+
+    Every key (metering point and OBIS code) has one preallocated array per
+    open local delivery day (92/96/100 intervals, see interval_calendar), so
+    appending a value is an index computation and two array writes; stored
+    series are not touched. A day rolls over when its last interval is filled
+    or a value of a later day arrives: append() returns it for the caller to
+    store as a time series, unfilled intervals marked MISSING. Values of a
+    day that has rolled over are rejected.
+    """
+
+    def __init__(self, resolution: str = 'PT15M', tz_name: str = DEFAULT_TIMEZONE):
+        self.resolution = resolution
+        self.tz_name = tz_name
+        self._buffers: Dict[str, Dict[date, DayBuffer]] = {}
+        # key -> last rolled day
+        self._rolled: Dict[str, date] = {}
+        self._rolled_days = 0
+        self._lock = threading.Lock()
+
+    def append(self, key: str, values: List[Tuple[int, int, float, str]]
+               ) -> Tuple[List[Tuple[int, str]], List[Dict[str, Any]]]:
+        """
+        Buffer (index, UTC epoch seconds of the interval start, quantity, quality) values
+
+        Returns:
+            (rejected (index, reason) pairs, rolled days as dicts with day,
+            resolution, start, step, quantities and qualities)
+        """
+        rejected = []
+        rolled = []
+        with self._lock:
+            days = self._buffers.setdefault(key, {})
+            for index, instant, quantity, quality in values:
+                day = local_date(instant, self.tz_name)
+                closed = self._rolled.get(key)
+                if closed is not None and day <= closed:
+                    rejected.append((index, f'Delivery day {day.isoformat()} has already been closed'))
+                    continue
+                buffer = days.get(day)
+                if buffer is None:
+                    buffer = days[day] = DayBuffer(local_day(day, self.resolution, self.tz_name))
+                position, offset = divmod(instant - buffer.span.start, buffer.span.step)
+                if offset:
+                    if not buffer.filled:
+                        del days[day]
+                    rejected.append((index, f'{format_utc_instant(instant)} is not an interval start '
+                                            f'of resolution {self.resolution}'))
+                    continue
+                if not buffer.qualities[position]:
+                    buffer.filled += 1
+                buffer.values[position] = quantity
+                buffer.qualities[position] = BUFFER_QUALITIES.index(quality)
+
+                # Earlier days are complete once a later one starts
+                for open_day in sorted(days):
+                    if open_day < day or (open_day == day and buffer.filled == buffer.span.count):
+                        rolled.append(self._roll(key, open_day, days.pop(open_day)))
+            if not days:
+                del self._buffers[key]
+        return rejected, rolled
+
+    def _roll(self, key: str, day: date, buffer: DayBuffer) -> Dict[str, Any]:
+        self._rolled[key] = day
+        self._rolled_days += 1
+        return {
+            'day': day.isoformat(),
+            'resolution': self.resolution,
+            'start': buffer.span.start,
+            'step': buffer.span.step,
+            'quantities': buffer.values.tolist(),
+            'qualities': [BUFFER_QUALITIES[code] for code in buffer.qualities]
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'open_days': sum(len(days) for days in self._buffers.values()),
+                'buffered_values': sum(buffer.filled for days in self._buffers.values() for buffer in days.values()),
+                'rolled_days': self._rolled_days
+            }
+
+
+# ==================== SHARED STORE PROCESS ====================
+
+SHARED_COLLECTIONS = ('time_series', 'formulas', 'calculations', 'profiles', 'metering_points')
+
+COLLECTION_METHODS = (
+    'get', 'put', 'put_many', 'update', 'get_summary', 'update_items', 'pop', 'values', 'items', '__contains__', '__len__'
+)
+
+# Collections owned by the store process, created on first request
+_shared_collections: Dict[str, LockedCollection] = {}
+
+
+_shared_token_registry = TokenRegistry()
+_shared_retention = RetentionTracker.from_env()
+
+
+def _shared_collection(name: str) -> LockedCollection:
+    """Return the store-process instance of a collection"""
+    return _shared_collections.setdefault(name, LockedCollection())
+
+
+def _shared_tokens() -> TokenRegistry:
+    return _shared_token_registry
+
+
+def _shared_retention_tracker() -> RetentionTracker:
+    return _shared_retention
+
+
+_shared_calculation_events = CalculationEvents()
+
+
+def _shared_events() -> CalculationEvents:
+    return _shared_calculation_events
+
+
+_shared_metering_buffers = MeteringBuffers()
+
+
+def _shared_buffers() -> MeteringBuffers:
+    return _shared_metering_buffers
+
+
+class StoreManager(BaseManager):
+    """Serves the store collections from one local process to all worker processes"""
+
+
+for _name in SHARED_COLLECTIONS:
+    StoreManager.register(_name, callable=partial(_shared_collection, _name), exposed=COLLECTION_METHODS)
+StoreManager.register('tokens', callable=_shared_tokens, exposed=('issue', 'is_valid', 'revoke', '__len__'))
+StoreManager.register('retention', callable=_shared_retention_tracker, exposed=('track', 'untrack', 'expire', 'stats'))
+StoreManager.register('events', callable=_shared_events,
+                      exposed=('publish', 'wait', 'events_since', 'latest_sequence'))
+StoreManager.register('metering_buffers', callable=_shared_buffers, exposed=('append', 'stats'))
+
+
+def parse_store_address(value: str) -> Union[str, Tuple[str, int]]:
+    """Parse 'host:port' into a TCP address; anything else is a Unix socket path"""
+    host, sep, port = value.rpartition(':')
+    if sep and port.isdigit():
+        return host or '127.0.0.1', int(port)
+    return value
+
+
+def start_store_process(address: Union[str, Tuple[str, int]], authkey: bytes) -> StoreManager:
+    """Start the store in a child process and return its (already running) manager"""
+    manager = StoreManager(address=address, authkey=authkey)
+    manager.start()
+    return manager
+
+
+def connect_store(address: Union[str, Tuple[str, int]], authkey: bytes) -> Dict[str, Any]:
+    """
+    Connect to a running store process
+
+    Returns:
+        Mapping of collection name to a proxy with the LockedCollection interface,
+        plus 'tokens' for the shared TokenRegistry, 'retention' for the
+        shared RetentionTracker, 'events' for the shared CalculationEvents and
+        'metering_buffers' for the shared MeteringBuffers
+    """
+    manager = StoreManager(address=address, authkey=authkey)
+    manager.connect()
+    shared = {name: getattr(manager, name)() for name in SHARED_COLLECTIONS}
+    shared['tokens'] = manager.tokens()
+    shared['retention'] = manager.retention()
+    shared['events'] = manager.events()
+    shared['metering_buffers'] = manager.metering_buffers()
+    return shared
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MaBiS shared store process')
+    parser.add_argument('--address', default='/tmp/mabis-store.sock',
+                        help="Unix socket path or host:port (default: %(default)s)")
+    parser.add_argument('--authkey', default='mabis', help='Shared secret for worker connections')
+    args = parser.parse_args()
+
+    print(f"MaBiS Store-Prozess läuft auf: {args.address}")
+    server = StoreManager(address=parse_store_address(args.address),
+                          authkey=args.authkey.encode()).get_server()
+    server.serve_forever()
@@ -0,0 +1,128 @@
+"""
+Tests für formula_engine.py
+
+    python -m pytest -q test_formula_engine.py
+"""
+
+from formula_engine import (Evaluation, PlanRegistry, bind_inputs, build_profile, calculate_plan,
+                            iter_expressions, shared_nodes)
+
+
+def ref(name, scaling_factor=None):
+    param = {'type': 'timeseries_ref', 'value': name}
+    if scaling_factor is not None:
+        param['scalingFactor'] = scaling_factor
+    return param
+
+
+def constant(value):
+    return {'type': 'constant', 'value': value}
+
+
+def nested(expression):
+    return {'type': 'expression', 'value': expression}
+
+
+def surplus(a, b, c):
+    """Wenn_Dann(Grp_Sum(a, b) > 10, Quer_Max(a, c), 0)"""
+    return {'function': 'Wenn_Dann', 'parameters': [
+        nested({'function': 'Grp_Sum', 'parameters': [ref(a), ref(b)]}),
+        {'type': 'string', 'value': '>'},
+        constant(10),
+        nested({'function': 'Quer_Max', 'parameters': [ref(a), ref(c)]}),
+        constant(0)
+    ]}
+
+
+def evaluate(plan, bindings, series, count):
+    columns = bind_inputs(bindings, {name: [{'quantity': str(value)} for value in values]
+                                     for name, values in series.items()}, count)
+    evaluation = Evaluation(plan.expression, shared=shared_nodes(plan.expression))
+    return [interval['quantity'] for interval in calculate_plan(plan.expression, columns, count, evaluation)]
+
+
+# ==================== PLAN INTERNING (user-045) ====================
+
+def test_formulas_of_one_shape_share_a_plan():
+    plans = PlanRegistry()
+    plan_a, bindings_a = plans.intern(surplus('MALO-1-PV', 'MALO-1-LOAD', 'MALO-1-BESS'))
+    plan_b, bindings_b = plans.intern(surplus('MALO-2-PV', 'MALO-2-LOAD', 'MALO-2-BESS'))
+
+    assert plan_a is plan_b
+    assert len(plans) == 1
+    assert plans.get(plan_a.key) is plan_a
+    assert bindings_a == ['MALO-1-PV', 'MALO-1-LOAD', 'MALO-1-BESS']
+    assert bindings_b == ['MALO-2-PV', 'MALO-2-LOAD', 'MALO-2-BESS']
+    assert plan_a.slots == 3 and plan_a.errors == []
+
+
+def test_commutative_arguments_are_sorted_before_interning():
+    plans = PlanRegistry()
+    scaled = {'function': 'Grp_Sum', 'parameters': [ref('A', 0.5), ref('B')]}
+    swapped = {'function': 'Grp_Sum', 'parameters': [ref('D'), ref('C', 0.5)]}
+
+    plan, bindings = plans.intern(scaled)
+    swapped_plan, swapped_bindings = plans.intern(swapped)
+    assert swapped_plan is plan
+    # The slots follow the sorted arguments, so each name keeps its scaling factor
+    assert (bindings, swapped_bindings) == (['A', 'B'], ['C', 'D'])
+    assert evaluate(plan, swapped_bindings, {'C': [4], 'D': [1]}, 1) == ['3.000']
+
+
+def test_argument_order_matters_outside_commutative_functions():
+    plans = PlanRegistry()
+    plan, _ = plans.intern(surplus('A', 'B', 'C'))
+    reordered, _ = plans.intern({'function': 'Wenn_Dann', 'parameters': [
+        constant(10), {'type': 'string', 'value': '<'},
+        nested({'function': 'Grp_Sum', 'parameters': [ref('A'), ref('B')]}),
+        nested({'function': 'Quer_Max', 'parameters': [ref('A'), ref('C')]}),
+        constant(0)
+    ]})
+
+    assert reordered is not plan
+    assert plans.intern(surplus('A', 'B', 'C'))[0] is plan
+    changed_constant = surplus('A', 'B', 'C')
+    changed_constant['parameters'][2] = constant(20)
+    assert plans.intern(changed_constant)[0] is not plan
+    assert len(plans) == 3
+
+
+def test_identical_subtrees_are_one_node_across_plans():
+    plans = PlanRegistry()
+    grp = {'function': 'Grp_Sum', 'parameters': [ref('A'), ref('B')]}
+    twice, _ = plans.intern({'function': 'Quer_Max', 'parameters': [nested(grp), nested(dict(grp))]})
+    other, _ = plans.intern({'function': 'Quer_Min', 'parameters': [nested(grp), constant(1)]})
+
+    first, second = (param['value'] for param in twice.expression['parameters'])
+    assert first is second
+    assert list(shared_nodes(twice.expression)) == [id(first)]
+    assert any(node is first for node in iter_expressions(other.expression))
+
+
+def test_shared_plan_evaluates_each_formulas_inputs():
+    plans = PlanRegistry()
+    plan, bindings_1 = plans.intern(surplus('PV-1', 'LOAD-1', 'BESS-1'))
+    _, bindings_2 = plans.intern(surplus('PV-2', 'LOAD-2', 'BESS-2'))
+
+    assert evaluate(plan, bindings_1, {'PV-1': [8, 2], 'LOAD-1': [4, 4], 'BESS-1': [1, 9]}, 2) == ['8.000', '0.000']
+    assert evaluate(plan, bindings_2, {'PV-2': [1, 7], 'LOAD-2': [1, 7], 'BESS-2': [3, 5]}, 2) == ['0.000', '7.000']
+
+
+# ==================== PROFILES (user-033) ====================
+
+def test_profile_reports_a_shared_subtree_once():
+    plans = PlanRegistry()
+    grp = {'function': 'Grp_Sum', 'parameters': [ref('A'), ref('B')]}
+    expression = {'function': 'Quer_Max', 'parameters': [nested(grp), nested(dict(grp))]}
+    plan, bindings, nodes = plans.trace(expression)
+    columns = bind_inputs(bindings, {'A': [{'quantity': '1'}] * 8, 'B': [{'quantity': '2'}] * 8}, 8)
+    evaluation = Evaluation(plan.expression, timed=True)
+    calculate_plan(plan.expression, columns, 8, evaluation)
+
+    profile = build_profile(expression, expression, nodes, evaluation, columns, bindings)
+
+    first, second = (param['value']['profile'] for param in profile['parameters'])
+    assert (first['calls'], first['evaluations'], first['sharedHits']) == (16, 8, 8)
+    assert second == {'sharedReference': True}
+    assert profile['profile']['calls'] == 8
+    assert profile['profile']['selfMs'] == round(profile['profile']['totalMs'] - first['totalMs'], 3)
@@ -0,0 +1,77 @@
+"""
+Tests für interval_calendar.py
+
+    python -m pytest -q test_interval_calendar.py
+"""
+
+from datetime import date, datetime, timezone
+
+import pytest
+
+from interval_calendar import (interval_timestamps, local_date, local_day, local_month, parse_utc_instant,
+                               period_indices)
+
+
+def iso(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+# ==================== TIMESTAMPS ====================
+
+@pytest.mark.parametrize('start, step, count', [
+    (parse_utc_instant('2024-06-03T22:00:00Z'), 900, 96),
+    # Crosses several UTC days and starts off the day grid
+    (parse_utc_instant('2024-12-30T23:45:00Z'), 900, 400),
+    (parse_utc_instant('2024-03-30T23:07:00Z'), 3600, 50),
+    # Steps that do not divide a day are formatted one by one
+    (parse_utc_instant('2024-06-03T22:00:00Z'), 7 * 60, 500),
+    (parse_utc_instant('2024-06-03T22:00:00Z'), 900, 0),
+])
+def test_interval_timestamps_match_per_instant_formatting(start, step, count):
+    assert interval_timestamps(start, step, count) == tuple(iso(start + idx * step) for idx in range(count + 1))
+
+
+def test_parse_utc_instant_requires_time_zone():
+    assert parse_utc_instant('2024-06-03T22:00:00Z') == parse_utc_instant('2024-06-04T00:00:00+02:00')
+    assert parse_utc_instant('2024-06-03T22:00:00') is None
+    assert parse_utc_instant(None) is None
+
+
+# ==================== PERIODS ====================
+
+def test_period_indices_on_boundaries():
+    start = parse_utc_instant('2024-06-03T22:00:00Z')
+    assert period_indices(start, 900, 96, start + 4 * 900, start + 8 * 900) == (4, 8)
+
+
+@pytest.mark.parametrize('first, stop', [
+    (0, 0),             # empty
+    (60, 8 * 900),      # not an interval boundary
+    (0, 97 * 900),      # beyond the series
+    (8 * 900, 4 * 900)  # reversed
+])
+def test_period_indices_rejects_periods_off_the_timeline(first, stop):
+    start = parse_utc_instant('2024-06-03T22:00:00Z')
+    with pytest.raises(ValueError):
+        period_indices(start, 900, 96, start + first, start + stop)
+
+
+# ==================== LOCAL DAYS (user-049) ====================
+
+@pytest.mark.parametrize('day, count, start', [
+    (date(2024, 3, 31), 92, '2024-03-30T23:00:00Z'),   # Umstellung auf Sommerzeit
+    (date(2024, 6, 4), 96, '2024-06-03T22:00:00Z'),
+    (date(2024, 10, 27), 100, '2024-10-26T22:00:00Z'),  # Umstellung auf Winterzeit
+])
+def test_local_day_length_follows_dst(day, count, start):
+    span = local_day(day)
+    assert (span.count, span.start) == (count, parse_utc_instant(start))
+    assert span.end == span.start + count * 900
+    assert local_date(span.start) == day and local_date(span.end - 1) == day
+
+
+def test_local_month_lists_days_with_positions():
+    month = local_month(2025, 3)
+    assert (month.count, len(month.days)) == (2972, 31)
+    assert (month.days[29].count, month.days[29].positions()) == (92, range(2785, 2877))
+    assert month.days[30].start == month.days[29].end
@@ -0,0 +1,383 @@
+"""
+Tests der API-Operationen von mock_api_server.py
+
+Die Operationen werden direkt aufgerufen (ohne HTTP), jeder Test mit leeren
+Collections:
+
+    python -m pytest -q test_mock_api_server.py
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import mock_api_server as api
+import store
+from interval_calendar import interval_timestamps, parse_utc_instant
+from store import CalculationEvents, LockedCollection, MeteringBuffers, RetentionTracker
+
+DAY_START = '2024-06-03T22:00:00Z'
+
+
+@pytest.fixture(autouse=True)
+def empty_store(monkeypatch):
+    for name in ('time_series_store', 'formula_store', 'calculation_store', 'profile_store',
+                 'metering_point_index'):
+        monkeypatch.setattr(api, name, LockedCollection())
+    monkeypatch.setattr(api, 'metering_buffers', MeteringBuffers())
+    monkeypatch.setattr(api, 'calculation_events', CalculationEvents())
+    monkeypatch.setattr(api, 'retention', RetentionTracker())
+
+
+def day_series(ts_id, quantities, start=DAY_START, **fields):
+    """Submitted PT15M series with one interval per quantity"""
+    boundaries = interval_timestamps(parse_utc_instant(start), 900, len(quantities))
+    return dict({
+        'timeSeriesId': ts_id,
+        'marketLocationId': 'MALO-1',
+        'unit': 'KWH',
+        'resolution': 'PT15M',
+        'period': {'start': boundaries[0], 'end': boundaries[-1]},
+        'intervals': [
+            {'position': idx + 1, 'start': boundaries[idx], 'end': boundaries[idx + 1], 'quantity': quantity}
+            for idx, quantity in enumerate(quantities)
+        ]
+    }, **fields)
+
+
+def submit_series(*series):
+    api.accept_time_series({'messageId': 'MSG-TS', 'timeSeries': list(series)})
+
+
+def submit_formula(formula_id, expression, **fields):
+    return api.accept_formulas({'messageId': 'MSG-F', 'formulas': [
+        dict({'formulaId': formula_id, 'name': formula_id, 'expression': expression,
+              'outputUnit': 'KWH', 'outputResolution': 'PT15M'}, **fields)
+    ]})[0]
+
+
+def ref(name):
+    return {'type': 'timeseries_ref', 'value': name}
+
+
+def group_sum(*names):
+    return {'function': 'Grp_Sum', 'parameters': [ref(name) for name in names]}
+
+
+def calculate(calculation_id, formula_id, inputs, **fields):
+    return api.run_calculation(dict({'calculationId': calculation_id, 'formulaId': formula_id,
+                                     'inputTimeSeries': inputs}, **fields))
+
+
+# ==================== COMPACT TIME SERIES (user-026) ====================
+
+def test_regular_series_is_stored_without_timestamps_and_materialized_exactly():
+    submitted = day_series('TS-A', ['1.000'] * 96)
+    submit_series(submitted)
+
+    stored = api.time_series_store.get('TS-A')
+    assert stored['_timeline'] == {'start': parse_utc_instant(DAY_START), 'step': 900}
+    assert all('start' not in interval and 'end' not in interval for interval in stored['intervals'])
+
+    body, status = api.lookup_time_series('TS-A')
+    assert status == 200
+    assert '_timeline' not in body
+    assert body['intervals'] == submitted['intervals']
+
+
+@pytest.mark.parametrize('irregular', [
+    lambda ts: ts['intervals'][5].update(start='2024-06-04T23:00:00Z'),  # gap
+    lambda ts: ts['intervals'][5].update(position=7),                    # position out of order
+    lambda ts: ts.update(resolution='P1M'),                               # no fixed length
+])
+def test_irregular_series_keeps_its_timestamps(irregular):
+    submitted = day_series('TS-A', ['1.000'] * 8)
+    irregular(submitted)
+
+    assert api.compact_time_series(submitted) is submitted
+    submit_series(submitted)
+    assert '_timeline' not in api.time_series_store.get('TS-A')
+    assert api.lookup_time_series('TS-A')[0]['intervals'] == submitted['intervals']
+
+
+def test_calculation_output_shares_the_input_timeline():
+    submit_series(day_series('TS-A', ['1.000'] * 96), day_series('TS-B', ['2.500'] * 96))
+    submit_formula('F-SUM', group_sum('A', 'B'))
+
+    body, status = calculate('C-1', 'F-SUM', {'A': 'TS-A', 'B': 'TS-B'}, outputTimeSeriesId='TS-OUT')
+    assert (status, body['status']) == (202, 'COMPLETED')
+
+    assert '_timeline' in api.time_series_store.get('TS-OUT')
+    output = api.lookup_time_series('TS-OUT')[0]
+    inputs = api.lookup_time_series('TS-A')[0]
+    assert ([(interval['start'], interval['end']) for interval in output['intervals']]
+            == [(interval['start'], interval['end']) for interval in inputs['intervals']])
+    assert {interval['quantity'] for interval in output['intervals']} == {'3.500'}
+
+
+# ==================== RETENTION (user-031) ====================
+
+def test_evicted_calculation_is_spilled_and_restored(monkeypatch, tmp_path):
+    monkeypatch.setattr(api, 'retention', RetentionTracker(max_count=1))
+    monkeypatch.setattr(api, 'SPILL_DIR', str(tmp_path))
+    submit_series(day_series('TS-A', ['1.000'] * 4))
+    submit_formula('F-SUM', group_sum('A'))
+
+    calculate('C-1', 'F-SUM', {'A': 'TS-A'})
+    first = api.calculation_store.get('C-1')
+    calculate('C-2', 'F-SUM', {'A': 'TS-A'})
+
+    # The generated output goes with its record
+    assert api.calculation_store.get('C-1') is None
+    assert api.time_series_store.get(first['outputTimeSeriesId']) is None
+    assert len(list(tmp_path.iterdir())) == 1
+
+    body, status = api.lookup_calculation('C-1')
+    assert status == 200 and body == first
+    assert api.lookup_time_series(first['outputTimeSeriesId'])[0]['intervals'][0]['quantity'] == '1.000'
+    # Restoring counts as a new completion and displaces C-2
+    assert api.calculation_store.get('C-2') is None
+    assert api.lookup_calculation('C-2')[0]['status'] == 'COMPLETED'
+
+
+def test_evicted_calculation_without_spill_dir_is_gone(monkeypatch):
+    monkeypatch.setattr(api, 'retention', RetentionTracker(max_count=1))
+    monkeypatch.setattr(api, 'SPILL_DIR', None)
+    submit_series(day_series('TS-A', ['1.000'] * 4))
+    submit_formula('F-SUM', group_sum('A'))
+
+    calculate('C-1', 'F-SUM', {'A': 'TS-A'})
+    calculate('C-2', 'F-SUM', {'A': 'TS-A'})
+
+    with pytest.raises(api.ApiError) as raised:
+        api.lookup_calculation('C-1')
+    assert raised.value.status == 404
+
+
+def test_reused_calculation_id_is_not_evicted_by_its_old_entry(monkeypatch):
+    monkeypatch.setattr(api, 'retention', RetentionTracker(max_count=1))
+    submit_series(day_series('TS-A', ['1.000'] * 4))
+    submit_formula('F-SUM', group_sum('A'))
+
+    calculate('C-1', 'F-SUM', {'A': 'TS-A'})
+    old_output = api.calculation_store.get('C-1')['outputTimeSeriesId']
+    body, _ = calculate('C-1', 'F-SUM', {'A': 'TS-A'})
+
+    assert body['status'] == 'COMPLETED'
+    assert api.lookup_calculation('C-1')[0]['outputTimeSeriesId'] != old_output
+    assert api.time_series_store.get(old_output) is None
+
+
+def test_expired_calculations_are_evicted_on_health_check(monkeypatch):
+    now = SimpleNamespace(value=1_700_000_000.0)
+    monkeypatch.setattr(store, 'time', SimpleNamespace(time=lambda: now.value))
+    monkeypatch.setattr(api, 'retention', RetentionTracker(ttl_seconds=60))
+    submit_series(day_series('TS-A', ['1.000'] * 4))
+    submit_formula('F-SUM', group_sum('A'))
+    calculate('C-1', 'F-SUM', {'A': 'TS-A'})
+
+    assert api.health_status()[0]['stats']['calculations'] == 1
+    now.value += 61
+    stats = api.health_status()[0]['stats']
+    assert stats['calculations'] == 0
+    assert stats['retention']['evicted'] == 1
+
+
+# ==================== ADMISSION (user-044) ====================
+
+DAY_PERIOD = {'start': DAY_START, 'end': '2024-06-04T22:00:00Z'}
+
+
+def test_calculation_over_budget_is_rejected_before_inputs_are_loaded(monkeypatch):
+    monkeypatch.setattr(api, 'CALC_MAX_COST', 500)
+    submit_formula('F-SUM', group_sum('A', 'B'))
+
+    # The input series do not exist: a 404 would mean they were looked up
+    with pytest.raises(api.ApiError) as raised:
+        calculate('C-1', 'F-SUM', {'A': 'TS-MISSING-A', 'B': 'TS-MISSING-B'}, period=DAY_PERIOD)
+
+    assert raised.value.status == 422
+    problem = raised.value.body
+    # 3 nodes × 96 intervals × 2 inputs
+    assert problem['type'] == 'https://api.mabis-hub.de/problems/calculation-too-expensive'
+    assert (problem['estimatedCost'], problem['budget']) == (576, 500)
+    assert api.calculation_store.get('C-1') is None
+
+
+def test_calculation_without_period_is_admitted_on_its_loaded_length(monkeypatch):
+    monkeypatch.setattr(api, 'CALC_MAX_COST', 500)
+    submit_series(day_series('TS-A', ['1.000'] * 96), day_series('TS-B', ['1.000'] * 96))
+    submit_formula('F-SUM', group_sum('A', 'B'))
+
+    with pytest.raises(api.ApiError) as raised:
+        calculate('C-1', 'F-SUM', {'A': 'TS-A', 'B': 'TS-B'})
+    assert raised.value.body['estimatedCost'] == 576
+
+    body, _ = calculate('C-2', 'F-SUM', {'A': 'TS-A', 'B': 'TS-B'},
+                        period={'start': DAY_START, 'end': '2024-06-04T10:00:00Z'})
+    assert (body['status'], body['estimatedCost']) == ('COMPLETED', 288)
+
+
+def test_calculations_are_queued_by_estimated_cost(monkeypatch):
+    monkeypatch.setattr(api, 'CALC_LARGE_COST', 300)
+    submit_series(day_series('TS-A', ['1.000'] * 96), day_series('TS-B', ['1.000'] * 96))
+    submit_formula('F-ONE', group_sum('A'))
+    submit_formula('F-SUM', group_sum('A', 'B'))
+
+    small, _ = calculate('C-1', 'F-ONE', {'A': 'TS-A'}, period=DAY_PERIOD)
+    large, _ = calculate('C-2', 'F-SUM', {'A': 'TS-A', 'B': 'TS-B'}, period=DAY_PERIOD)
+
+    assert (small['queue'], small['estimatedCost']) == ('small', 192)
+    assert (large['queue'], large['status']) == ('large', 'COMPLETED')
+    assert api.lookup_calculation('C-2')[0]['queue'] == 'large'
+
+
+# ==================== PLAN INTERNING (user-045) ====================
+
+def test_formulas_of_one_shape_report_one_plan():
+    plans_before = api.health_status()[0]['stats']['formula_plans']
+    first = submit_formula('F-MALO-1', group_sum('TS-MALO-1-PV', 'TS-MALO-1-LOAD'))
+    second = submit_formula('F-MALO-2', group_sum('TS-MALO-2-LOAD', 'TS-MALO-2-PV'))
+
+    assert first['validationResults'][0]['planId'] == second['validationResults'][0]['planId']
+    assert api.health_status()[0]['stats']['formula_plans'] <= plans_before + 1
+    # The plan reference stays internal
+    assert '_plan' not in api.lookup_formula('F-MALO-2')[0]
+
+
+def test_formulas_sharing_a_plan_calculate_their_own_inputs():
+    submit_series(day_series('TS-1', ['1.000'] * 4), day_series('TS-2', ['2.000'] * 4),
+                  day_series('TS-3', ['5.000'] * 4))
+    submit_formula('F-A', group_sum('A', 'B'))
+    submit_formula('F-B', group_sum('C', 'D'))
+
+    calculate('C-A', 'F-A', {'A': 'TS-1', 'B': 'TS-2'}, outputTimeSeriesId='TS-OUT-A')
+    calculate('C-B', 'F-B', {'C': 'TS-2', 'D': 'TS-3'}, outputTimeSeriesId='TS-OUT-B')
+
+    assert api.time_series_store.get('TS-OUT-A')['intervals'][0]['quantity'] == '3.000'
+    assert api.time_series_store.get('TS-OUT-B')['intervals'][0]['quantity'] == '7.000'
+
+
+# ==================== METERING VALUES (user-049) ====================
+
+def metering_values(first_start, count, quantity='1.5', **fields):
+    start = parse_utc_instant(first_start)
+    return [dict({'timestamp': timestamp, 'value': quantity, 'obisCode': '1-0:1.8.0'}, **fields)
+            for timestamp in interval_timestamps(start, 900, count)[:count]]
+
+
+def test_pushed_values_of_a_dst_day_roll_into_a_100_interval_series():
+    # 27.10.2024 (Umstellung auf Winterzeit): 00:00 Ortszeit = 22:00 UTC des Vortags
+    body, status = api.accept_metering_values('MP-1', {'messageId': 'MSG-1',
+                                                       'values': metering_values('2024-10-26T22:00:00Z', 99)})
+    assert (status, body['acceptedCount'], body['rolledTimeSeriesIds']) == (201, 99, [])
+
+    body, _ = api.accept_metering_values('MP-1', {'values': metering_values('2024-10-27T22:45:00Z', 1,
+                                                                            quantity='0.5', unit='MWH')})
+    assert body['rolledTimeSeriesIds'] == ['TS-MP-1-1-0:1.8.0-20241027']
+
+    series = api.lookup_time_series('TS-MP-1-1-0:1.8.0-20241027')[0]
+    assert len(series['intervals']) == 100
+    assert series['period'] == {'start': '2024-10-26T22:00:00Z', 'end': '2024-10-27T23:00:00Z'}
+    assert series['intervals'][-1] == {'position': 100, 'quantity': '500.000', 'quality': 'METERED',
+                                       'start': '2024-10-27T22:45:00Z', 'end': '2024-10-27T23:00:00Z'}
+    assert 'TS-MP-1-1-0:1.8.0-20241027' in api.metering_point_index.get(api.metering_point_key('MP-1', '1-0:1.8.0'))
+
+
+def test_invalid_and_late_pushed_values_are_reported_individually():
+    api.accept_metering_values('MP-1', {'values': metering_values('2024-03-30T23:00:00Z', 92)})
+    values = metering_values('2024-03-30T23:00:00Z', 1) + [
+        {'timestamp': 'yesterday', 'value': '1.0'},
+        {'timestamp': '2024-03-31T23:00:00Z', 'value': 'n/a'},
+        {'timestamp': '2024-03-31T23:00:00Z', 'value': '1.0', 'quality': 'GUESSED'},
+    ]
+    body, _ = api.accept_metering_values('MP-1', {'values': values})
+
+    assert (body['acceptedCount'], body['rejectedCount']) == (0, 4)
+    assert [error['code'] for error in body['validationErrors']] == [
+        'VALUE_REJECTED', 'INVALID_TIMESTAMP', 'INVALID_QUANTITY_FORMAT', 'INVALID_QUALITY']
+    assert body['validationErrors'][0]['field'] == 'values[0].timestamp'
+
+
+# ==================== PATCH INTERVALS (user-050) ====================
+
+def patch(time_series_id, *updates, **fields):
+    return api.patch_time_series(time_series_id, dict({'updates': list(updates)}, **fields))[0]
+
+
+def test_patch_updates_positions_and_ranges_and_bumps_the_version():
+    submit_series(day_series('TS-A', ['1.000'] * 96))
+    assert api.time_series_store.get('TS-A')['version'] == 1
+
+    body = patch('TS-A', {'position': 2, 'quantity': '7', 'quality': 'SUBSTITUTE'},
+                 {'start': '2024-06-04T00:00:00Z', 'end': '2024-06-04T00:45:00Z', 'status': 'CORRECTED'},
+                 expectedVersion=1)
+
+    assert (body['version'], body['changedIntervalCount']) == (2, 4)
+    assert body['changedRanges'] == [
+        {'startPosition': 2, 'endPosition': 2, 'start': '2024-06-03T22:15:00Z', 'end': '2024-06-03T22:30:00Z'},
+        {'startPosition': 9, 'endPosition': 11, 'start': '2024-06-04T00:00:00Z', 'end': '2024-06-04T00:45:00Z'}
+    ]
+    intervals = api.lookup_time_series('TS-A')[0]['intervals']
+    assert (intervals[1]['quantity'], intervals[1]['quality']) == ('7.000', 'SUBSTITUTE')
+    assert [interval.get('status') for interval in intervals[7:12]] == [None, 'CORRECTED', 'CORRECTED',
+                                                                        'CORRECTED', None]
+    # Untouched intervals keep their timeline
+    assert intervals[0]['start'] == DAY_START and '_timeline' in api.time_series_store.get('TS-A')
+
+
+def test_patch_with_stale_expected_version_conflicts():
+    submit_series(day_series('TS-A', ['1.000'] * 4))
+    patch('TS-A', {'position': 1, 'quantity': '2.000'})
+
+    with pytest.raises(api.ApiError) as raised:
+        patch('TS-A', {'position': 1, 'quantity': '3.000'}, expectedVersion=1)
+
+    assert raised.value.status == 409
+    assert raised.value.body['type'] == 'https://api.mabis-hub.de/problems/version-conflict'
+    assert raised.value.body['version'] == 2
+    assert api.time_series_store.get('TS-A')['intervals'][0]['quantity'] == '2.000'
+
+
+def test_resubmitted_series_conflicts_with_the_version_it_replaced():
+    submit_series(day_series('TS-A', ['1.000'] * 4))
+    submit_series(day_series('TS-A', ['5.000'] * 4))
+
+    with pytest.raises(api.ApiError) as raised:
+        patch('TS-A', {'position': 1, 'quantity': '3.000'}, expectedVersion=1)
+    assert (raised.value.status, raised.value.body['version']) == (409, 2)
+
+
+def test_patch_repeating_stored_values_changes_nothing():
+    submit_series(day_series('TS-A', ['2.500'] * 4))
+
+    body = patch('TS-A', {'position': 1, 'quantity': '25e-1'}, {'position': 2, 'quantity': '2.5'})
+    assert (body['version'], body['changedIntervalCount'], body['changedRanges']) == (1, 0, [])
+
+
+def test_patch_of_an_irregular_series_selects_by_its_timestamps():
+    submitted = day_series('TS-A', ['1.000'] * 4)
+    submitted['intervals'][3].update(start='2024-06-03T23:00:00Z', end='2024-06-03T23:15:00Z')
+    submit_series(submitted)
+
+    body = patch('TS-A', {'start': '2024-06-03T23:00:00Z', 'end': '2024-06-03T23:15:00Z', 'quantity': '4'})
+    assert body['changedRanges'] == [{'startPosition': 4, 'endPosition': 4, 'start': '2024-06-03T23:00:00Z',
+                                      'end': '2024-06-03T23:15:00Z'}]
+
+
+@pytest.mark.parametrize('update, reason', [
+    ({'position': 5, 'quantity': '1'}, 'position must be between 1 and 4'),
+    ({'position': 1}, 'At least one of quantity, quality or status is required'),
+    ({'position': 1, 'quantity': 1.5}, 'quantity must be a decimal string'),
+    ({'start': '2024-06-03T22:05:00Z', 'end': '2024-06-03T22:30:00Z', 'quantity': '1'}, 'does not match'),
+])
+def test_invalid_patch_is_rejected_without_changes(update, reason):
+    submit_series(day_series('TS-A', ['1.000'] * 4))
+
+    with pytest.raises(api.ApiError) as raised:
+        patch('TS-A', {'position': 1, 'quantity': '9'}, update)
+
+    assert raised.value.status == 422
+    assert raised.value.body['invalidParams'][0]['name'] == 'updates[1]'
+    assert reason in raised.value.body['invalidParams'][0]['reason']
+    assert api.time_series_store.get('TS-A')['version'] == 1
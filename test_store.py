@@ -0,0 +1,123 @@
+"""
+Tests für store.py
+
+    python -m pytest -q test_store.py
+"""
+
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+import store
+from interval_calendar import local_day
+from store import MeteringBuffers, RetentionTracker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() of the store module"""
+    now = SimpleNamespace(value=1_700_000_000.0)
+    monkeypatch.setattr(store, 'time', SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+# ==================== RETENTION (user-031) ====================
+
+def test_retention_evicts_oldest_over_max_count():
+    retention = RetentionTracker(max_count=2)
+    assert retention.track('C-1', 'TS-CALC-1') == []
+    assert retention.track('C-2') == []
+    assert retention.track('C-3', 'TS-CALC-3') == [('C-1', 'TS-CALC-1')]
+    assert retention.stats() == {'retained': 2, 'bytes': 0, 'evicted': 1}
+
+
+def test_retention_evicts_until_under_max_bytes():
+    retention = RetentionTracker(max_bytes=100)
+    retention.track('C-1', size_bytes=40)
+    retention.track('C-2', size_bytes=40)
+    assert retention.track('C-3', size_bytes=90) == [('C-1', None), ('C-2', None)]
+    assert retention.stats()['bytes'] == 90
+
+
+def test_retracking_a_calculation_replaces_its_entry():
+    retention = RetentionTracker(max_count=2, max_bytes=100)
+    retention.track('C-1', size_bytes=60)
+    retention.track('C-2', size_bytes=10)
+    # C-1 moves to the end with its new size instead of counting twice
+    assert retention.track('C-1', size_bytes=20) == []
+    assert retention.stats() == {'retained': 2, 'bytes': 30, 'evicted': 0}
+    assert retention.track('C-3') == [('C-2', None)]
+
+
+def test_retention_expires_without_new_completions(clock):
+    retention = RetentionTracker(ttl_seconds=60)
+    retention.track('C-1', 'TS-CALC-1')
+    clock.value += 30
+    retention.track('C-2')
+
+    clock.value += 31
+    assert retention.expire() == [('C-1', 'TS-CALC-1')]
+    clock.value += 30
+    assert retention.expire() == [('C-2', None)]
+    assert retention.expire() == []
+
+
+def test_untracked_calculation_is_not_evicted_later():
+    retention = RetentionTracker(max_count=1)
+    retention.track('C-1', 'TS-CALC-1', size_bytes=5)
+    assert retention.untrack('C-1') == ('C-1', 'TS-CALC-1')
+    assert retention.untrack('C-1') is None
+    assert retention.track('C-2') == []
+    assert retention.stats() == {'retained': 1, 'bytes': 0, 'evicted': 0}
+
+
+# ==================== METERING BUFFERS (user-049) ====================
+
+def day_values(day, quantities, first_index=0):
+    """(index, interval start, quantity, quality) entries from the first interval of a local day"""
+    span = local_day(day)
+    return [(first_index + idx, span.start + idx * span.step, quantity, 'METERED')
+            for idx, quantity in enumerate(quantities)]
+
+
+@pytest.mark.parametrize('day, count', [(date(2024, 3, 31), 92), (date(2024, 10, 27), 100)])
+def test_dst_day_rolls_over_when_its_last_interval_is_filled(day, count):
+    buffers = MeteringBuffers()
+    rejected, rolled = buffers.append('MP-1', day_values(day, [1.0] * (count - 1)))
+    assert (rejected, rolled) == ([], [])
+    assert buffers.stats() == {'open_days': 1, 'buffered_values': count - 1, 'rolled_days': 0}
+
+    rejected, rolled = buffers.append('MP-1', day_values(day, [2.0] * count)[-1:])
+    assert rejected == []
+    assert [(roll['day'], len(roll['quantities'])) for roll in rolled] == [(day.isoformat(), count)]
+    assert rolled[0]['start'] == local_day(day).start
+    assert rolled[0]['quantities'][-2:] == [1.0, 2.0]
+    assert buffers.stats() == {'open_days': 0, 'buffered_values': 0, 'rolled_days': 1}
+
+
+def test_later_day_rolls_over_earlier_day_with_gaps_missing():
+    buffers = MeteringBuffers()
+    buffers.append('MP-1', day_values(date(2024, 10, 27), [1.0, 2.0]))
+    _, rolled = buffers.append('MP-1', day_values(date(2024, 10, 28), [3.0]))
+
+    assert [roll['day'] for roll in rolled] == ['2024-10-27']
+    qualities = rolled[0]['qualities']
+    assert len(qualities) == 100
+    assert qualities[:2] == ['METERED', 'METERED'] and set(qualities[2:]) == {'MISSING'}
+    assert buffers.stats()['open_days'] == 1
+
+
+def test_values_of_a_closed_day_or_off_the_grid_are_rejected():
+    buffers = MeteringBuffers()
+    buffers.append('MP-1', day_values(date(2024, 10, 27), [1.0]))
+    buffers.append('MP-1', day_values(date(2024, 10, 28), [1.0]))
+
+    late = day_values(date(2024, 10, 27), [5.0], first_index=7)
+    start = local_day(date(2024, 10, 28)).start
+    rejected, rolled = buffers.append('MP-1', late + [(8, start + 60, 1.0, 'METERED')])
+    assert rolled == []
+    assert [index for index, _ in rejected] == [7, 8]
+    assert 'already been closed' in rejected[0][1]
+    # Other keys keep their own days
+    assert buffers.append('MP-2', late) == ([], [])